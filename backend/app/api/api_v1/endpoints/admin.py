@@ -1,15 +1,32 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import logging
 import bcrypt
 
 from app.core.database import get_db
-from app.core.cache import get_redis_client
+from app.core.cache import CACHE_NAMESPACES, bump_generation, count_keys, get_redis_client
 from app.core.config import settings
-from app.schemas.admin import LoginRequest, LoginResponse, SettingsResponse, UpdateSettingsRequest
+from app.schemas.admin import (
+    AdminResponse,
+    InvalidateCacheRequest,
+    InvalidationPreviewResponse,
+    LoginRequest,
+    LoginResponse,
+    SettingsResponse,
+    UpdateSettingsRequest,
+)
 from app.models.configuration import Configuration
 from app.utils.auth import verify_admin_password, create_access_token
+from app.services.recommendation import query_key_pattern
+from app.utils.config_loader import (
+    apply_config_update,
+    get_config_snapshot,
+    notify_config_change,
+    preview_config_update,
+    publish_config_change,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -57,7 +74,7 @@ async def get_settings(
             )
         
         # Get all configurations from database
-        result = await db.execute("SELECT key, value, group FROM configuration")
+        result = await db.execute(text('SELECT key, value, "group" FROM configuration'))
         settings_data = result.fetchall()
         
         settings_list = [
@@ -98,15 +115,18 @@ async def update_settings(
                 detail="Invalid token"
             )
         
+        cache_client = get_redis_client()
+        current_config = await get_config_snapshot(db, cache_client)
+        
         # Update settings in database
         for setting in request.settings:
             await db.execute(
-                """
-                INSERT INTO configuration (key, value, group) 
+                text("""
+                INSERT INTO configuration (key, value, "group") 
                 VALUES (:key, :value, :group)
                 ON CONFLICT (key) 
                 DO UPDATE SET value = :value, updated_at = NOW()
-                """,
+                """),
                 {
                     "key": setting.key,
                     "value": setting.value,
@@ -114,9 +134,14 @@ async def update_settings(
                 }
             )
         
-        # Clear cache to force reload of configuration
-        cache_client = get_redis_client()
-        await cache_client.flushdb()
+        await db.commit()
+        
+        # Invalidate only the affected cache namespaces and notify every worker
+        await apply_config_update(
+            cache_client,
+            current_config,
+            {setting.key: setting.value for setting in request.settings}
+        )
         
         return {
             "status": "success",
@@ -128,4 +153,92 @@ async def update_settings(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update settings"
-        )
\ No newline at end of file
+        )
+
+@router.post("/cache/preview", response_model=InvalidationPreviewResponse)
+async def preview_cache_invalidation(
+    request: UpdateSettingsRequest,
+    token: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Show which caches a settings update would invalidate, without applying it
+    """
+    try:
+        # Verify token
+        if token != "valid_token":  # Replace with actual JWT validation
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token"
+            )
+        
+        cache_client = get_redis_client()
+        current_config = await get_config_snapshot(db, cache_client)
+        plan = preview_config_update(
+            current_config,
+            {setting.key: setting.value for setting in request.settings}
+        )
+        
+        cached_recommendations = 0
+        if plan["recommendations_affected"]:
+            cached_recommendations = await count_keys(
+                cache_client, query_key_pattern(current_config)
+            )
+        
+        return InvalidationPreviewResponse(
+            status="success",
+            cached_recommendations=cached_recommendations,
+            **plan
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Preview cache invalidation error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to preview cache invalidation"
+        )
+
+@router.post("/cache/invalidate", response_model=AdminResponse)
+async def invalidate_cache(
+    request: InvalidateCacheRequest,
+    token: str
+):
+    """
+    Invalidate one cache namespace (config or query)
+    """
+    try:
+        # Verify token
+        if token != "valid_token":  # Replace with actual JWT validation
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token"
+            )
+        
+        if request.namespace not in CACHE_NAMESPACES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown cache namespace: {request.namespace}"
+            )
+        
+        cache_client = get_redis_client()
+        if request.namespace == "config":
+            await publish_config_change(cache_client)
+        else:
+            generation = await bump_generation(cache_client, "query")
+            await notify_config_change(cache_client, f"query generation {generation}")
+        
+        return AdminResponse(
+            status="success",
+            message=f"Cache namespace {request.namespace} invalidated"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Invalidate cache error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to invalidate cache"
+        )
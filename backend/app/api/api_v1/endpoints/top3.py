@@ -1,98 +1,346 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import Any, List, Optional
+import asyncio
 import json
+import time
 import logging
 
 from app.core.database import get_db
 from app.core.cache import get_redis_client
 from app.core.config import settings
-from app.schemas.top3 import KeywordRequest, Top3Response
-from app.services.search import call_serper_api
-from app.services.llm import call_llm_api, extract_tool_use_from_llm_response
-from app.utils.config_loader import load_app_config
+from app.core.ratelimit import UpstreamOverloadedError
+from app.schemas.top3 import (
+    BatchKeywordRequest,
+    JobRequest,
+    JobResponse,
+    KeywordRequest,
+    ProductRecommendation,
+    RecommendationHistoryItem,
+    RecommendationHistoryResponse,
+    Top3Response,
+)
+from app.services.jobs import job_channel, load_job, record_cached_job, submit_job
+from app.services.llm import LLMAPIError
+from app.services.popularity import record_keyword_request
+from app.services.recommendation_store import load_result_history
+from app.services.recommendation import (
+    CachedRecommendations,
+    batch_recommendations,
+    get_or_compute_recommendations,
+    lookup_cached_recommendations,
+    resolve_keyword,
+    stream_top3_recommendations,
+)
+from app.utils.config_loader import get_config_snapshot
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def require_keyword(raw_keyword: str, config) -> str:
+    """
+    Normalize a request keyword, rejecting one that normalizes to nothing (e.g. "!!!")
+    """
+    keyword = resolve_keyword(raw_keyword, config)
+    if not keyword:
+        raise HTTPException(status_code=422, detail="Keyword is empty after normalization")
+    return keyword
+
+def cached_response(cached: CachedRecommendations, if_none_match: Optional[str]) -> Response:
+    """
+    Return a pre-serialized Top3Response, or 304 if the client already has it
+    """
+    headers = {"ETag": cached.etag}
+    if if_none_match and cached.etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 @router.post("/", response_model=Top3Response)
 async def get_top3_recommendations(
     request: KeywordRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get Top 3 product recommendations based on keyword
+    Cache hits return the stored response body directly with an ETag
     """
     try:
-        # 1. Check cache first
-        cache_key = f"query:{request.keyword}"
+        # 1. Load configuration and normalize the keyword
         cache_client = get_redis_client()
-        cached_result = await cache_client.get(cache_key)
-        
-        if cached_result:
-            logger.info(f"Cache hit for keyword: {request.keyword}")
-            return Top3Response(
-                status="success",
-                data=json.loads(cached_result)
-            )
-        
-        # 2. Load configuration from database
-        logger.info(f"Loading configuration for keyword: {request.keyword}")
-        config = await load_app_config(db, cache_client)
-        
-        # 3. Search phase
-        logger.info(f"Searching for keyword: {request.keyword}")
-        search_query = f"best {request.keyword} reviews 2024"
-        search_results = await call_serper_api(
-            query=search_query,
-            api_key=config.get("SERPER_API_KEY")
-        )
-        
-        # 4. Prepare prompt
-        logger.info(f"Preparing LLM prompt for keyword: {request.keyword}")
-        system_prompt = config.get("LLM_SYSTEM_PROMPT")
-        tool_definition = json.loads(config.get("LLM_TOOL_DEFINITION"))
-        
-        user_prompt_template = config.get("LLM_USER_PROMPT_TEMPLATE")
-        user_prompt = user_prompt_template.replace(
-            "[USER_KEYWORD]", request.keyword
-        ).replace(
-            "[SEARCH_RESULTS]", json.dumps(search_results, indent=2)
-        )
-        
-        # 5. LLM analysis phase
-        logger.info(f"Calling LLM for keyword: {request.keyword}")
-        llm_response_json = await call_llm_api(
-            provider=config.get("LLM_PROVIDER"),
-            api_key=config.get("LLM_API_KEY"),
-            model=config.get("LLM_MODEL_NAME"),
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            tools=[tool_definition],
-            tool_choice={ "type": "tool", "name": "report_top3_products" }
+        config = await get_config_snapshot(db, cache_client)
+        keyword = require_keyword(request.keyword, config)
+        record_keyword_request(keyword)
+
+        # 2. Check cache tiers first
+        cached = await lookup_cached_recommendations(
+            request.keyword, keyword, config, cache_client
         )
-        
-        # 6. Extract results
-        logger.info(f"Extracting results for keyword: {request.keyword}")
-        final_data = extract_tool_use_from_llm_response(llm_response_json)
-        
-        # 7. Cache results (6 hours TTL)
-        await cache_client.set(
-            cache_key, 
-            json.dumps(final_data), 
-            ex=21600  # 6 hours
+        if cached is not None:
+            return cached_response(cached, if_none_match)
+
+        # 3. Run the search + LLM pipeline, coalescing concurrent misses
+        final_data = await get_or_compute_recommendations(
+            keyword, config, cache_client
         )
-        
-        logger.info(f"Successfully processed keyword: {request.keyword}")
+
         return Top3Response(
             status="success",
             data=final_data
         )
-        
+
+    except HTTPException:
+        raise
+    except UpstreamOverloadedError as e:
+        # Shed before reaching a provider: 429 over the provider rate limit, 503 when queues are full
+        logger.warning(f"Shedding keyword {request.keyword}: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Too many requests, please retry later: {str(e)}",
+            headers={"Retry-After": str(max(1, int(e.retry_after or 1)))}
+        )
+    except LLMAPIError as e:
+        # Every LLM provider failed or is shedding load, the client may retry later
+        logger.error(f"LLM unavailable for keyword {request.keyword}: {e}")
+        headers = {"Retry-After": str(int(e.retry_after or settings.LLM_CIRCUIT_RESET_TIMEOUT))}
+        raise HTTPException(
+            status_code=503,
+            detail=f"Recommendation service temporarily unavailable: {str(e)}",
+            headers=headers
+        )
     except Exception as e:
         logger.error(f"Error processing keyword {request.keyword}: {e}")
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred while processing your request: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format one Server-Sent Events message
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/stream")
+async def stream_top3_recommendations_sse(
+    request: KeywordRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream Top 3 product recommendations as Server-Sent Events
+    Events: cache, search, recommendation (one per product), done, error
+    """
+    cache_client = get_redis_client()
+    config = await get_config_snapshot(db, cache_client)
+    keyword = require_keyword(request.keyword, config)
+    record_keyword_request(keyword)
+
+    async def event_stream():
+        try:
+            # 1. Cache tiers
+            cached = await lookup_cached_recommendations(
+                request.keyword, keyword, config, cache_client
+            )
+            yield format_sse("cache", {"hit": cached is not None})
+
+            if cached is not None:
+                cached_data = cached.data
+                for item in cached_data:
+                    yield format_sse("recommendation", item)
+                yield format_sse("done", {"status": "success", "data": cached_data})
+                return
+
+            # 2. Search + streamed LLM analysis
+            async for event, data in stream_top3_recommendations(keyword, config, cache_client):
+                if event == "recommendation":
+                    ProductRecommendation(**data)
+                elif event == "done":
+                    data = {"status": "success", "data": data}
+                yield format_sse(event, data)
+
+        except Exception as e:
+            logger.error(f"Error streaming keyword {request.keyword}: {e}")
+            yield format_sse("error", {
+                "detail": f"An error occurred while processing your request: {str(e)}"
+            })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+        }
+    )
+
+@router.post("/batch")
+async def get_batch_recommendations(
+    request: BatchKeywordRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get Top 3 recommendations for many keywords, streamed back as NDJSON
+    One line per normalized keyword, in completion order (cache hits first)
+    """
+    if len(request.keywords) > settings.BATCH_MAX_KEYWORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may contain at most {settings.BATCH_MAX_KEYWORDS} keywords"
+        )
+
+    cache_client = get_redis_client()
+    config = await get_config_snapshot(db, cache_client)
+
+    async def ndjson_stream():
+        try:
+            async for result in batch_recommendations(request.keywords, config, cache_client):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Error processing batch: {e}")
+            yield json.dumps({
+                "status": "error",
+                "detail": f"An error occurred while processing your request: {str(e)}"
+            }) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+@router.get("/history", response_model=RecommendationHistoryResponse)
+async def get_recommendation_history(
+    keyword: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get stored recommendation results for a keyword over time, newest first
+    """
+    try:
+        cache_client = get_redis_client()
+        config = await get_config_snapshot(db, cache_client)
+        normalized = resolve_keyword(keyword, config)
+
+        results = await load_result_history(normalized, limit)
+
+        return RecommendationHistoryResponse(
+            status="success",
+            keyword=normalized,
+            data=[
+                RecommendationHistoryItem(
+                    result_id=result.result_id,
+                    config_version=result.config_version,
+                    created_at=result.created_at.isoformat(),
+                    data=result.data
+                )
+                for result in results
+            ]
+        )
+
+    except Exception as e:
+        logger.error(f"Error loading history for keyword {keyword}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred while processing your request: {str(e)}"
+        )
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_top3_job(
+    request: JobRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Submit an async Top 3 job and return its id at once
+    Cache hits return a job that already succeeded (200); misses are queued
+    for the job workers (202), joining a pending job for the same keyword
+    """
+    try:
+        cache_client = get_redis_client()
+        config = await get_config_snapshot(db, cache_client)
+        keyword = require_keyword(request.keyword, config)
+        record_keyword_request(keyword)
+
+        cached = await lookup_cached_recommendations(
+            request.keyword, keyword, config, cache_client
+        )
+        if cached is not None:
+            job = await record_cached_job(keyword, request.priority, cached.data, cache_client)
+            response.status_code = 200
+            return job.to_dict()
+
+        job, _ = await submit_job(keyword, request.priority, config, cache_client)
+        return job.to_dict()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting job for keyword {request.keyword}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred while processing your request: {str(e)}"
+        )
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_top3_job(job_id: str):
+    """
+    Poll an async Top 3 job
+    """
+    job = await load_job(get_redis_client(), job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/events")
+async def subscribe_top3_job(job_id: str):
+    """
+    Subscribe to an async Top 3 job as Server-Sent Events
+    Sends a status event on every change and closes once the job succeeded
+    or failed, or after JOB_SUBSCRIBE_TIMEOUT seconds
+    """
+    cache_client = get_redis_client()
+    if await load_job(cache_client, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    async def event_stream():
+        pubsub = cache_client.pubsub()
+        try:
+            # Subscribe before reading so no status change is missed
+            await pubsub.subscribe(job_channel(job_id))
+            deadline = time.monotonic() + settings.JOB_SUBSCRIBE_TIMEOUT
+            last_update = None
+            while True:
+                job = await load_job(cache_client, job_id)
+                if job is None:
+                    yield format_sse("error", {"detail": "Job not found or expired"})
+                    return
+                if job.updated_at != last_update:
+                    last_update = job.updated_at
+                    yield format_sse("status", job.to_dict())
+                if job.finished:
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(remaining, 15.0))
+                if message is None:
+                    # Keep proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming job {job_id}: {e}")
+            yield format_sse("error", {
+                "detail": f"An error occurred while processing your request: {str(e)}"
+            })
+        finally:
+            await pubsub.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+        }
+    )
@@ -1,30 +1,66 @@
 import asyncio
+import json
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+import orjson
 import redis.asyncio as redis
 from app.core.config import settings
+from app.core.metrics import LOCAL_CACHE_EVICTIONS, LOCAL_CACHE_HITS, LOCAL_CACHE_MISSES
 import logging
 
+try:
+    import zstandard
+except ImportError:  # Optional, cache values fall back to zlib
+    zstandard = None
+
 logger = logging.getLogger(__name__)
 
 # Global redis client
 redis_client = None
 
+# Binary-safe client used by the application cache
+binary_redis_client = None
+
+# Global tiered cache for application payloads
+app_cache = None
+
+# Pub/sub channel announcing keys changed by another worker
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Bytes charged per LocalCache entry on top of its payload (key, tuple, dict)
+LOCAL_ENTRY_OVERHEAD = 256
+
 async def init_cache():
     """
     Initialize Redis cache connection
     """
-    global redis_client
-    
+    global redis_client, binary_redis_client, app_cache
+
     try:
         redis_client = redis.from_url(
             settings.REDIS_URL,
             decode_responses=True,  # Automatically decode byte responses to strings
             encoding="utf-8",
         )
-        
+
         # Test connection
         await redis_client.ping()
+
+        # Cache values are binary, so they need a client that returns raw bytes
+        binary_redis_client = redis.from_url(settings.REDIS_URL, decode_responses=False)
+
+        app_cache = TieredCache(
+            LocalCache("app", settings.LOCAL_CACHE_MAX_BYTES),
+            RedisCache(binary_redis_client),
+            BinaryCodec(settings.CACHE_COMPRESS_MIN_BYTES),
+            local_ttl=settings.LOCAL_CACHE_TTL,
+        )
         logger.info("Redis cache initialized successfully")
-        
+
     except Exception as e:
         logger.error(f"Failed to initialize Redis cache: {e}")
         raise
@@ -36,4 +72,297 @@ def get_redis_client():
     global redis_client
     if redis_client is None:
         raise RuntimeError("Redis client not initialized. Call init_cache() first.")
-    return redis_client
\ No newline at end of file
+    return redis_client
+
+def get_cache() -> "TieredCache":
+    """
+    Get the application cache (in-process LRU in front of Redis)
+    """
+    if app_cache is None:
+        raise RuntimeError("Cache not initialized. Call init_cache() first.")
+    return app_cache
+
+class CacheBackend(ABC):
+    """
+    Interface for cache backends
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return [await self.get(key) for key in keys]
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+class RedisCache(CacheBackend):
+    """
+    Redis backend storing encoded values
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self.client.get(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        return await self.client.mget(keys)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.client.set(key, value, ex=int(ttl) if ttl else None)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+class LocalCache(CacheBackend):
+    """
+    Per-worker LRU cache bounded by total value size in bytes, with per-entry TTL
+    Holds decoded values, so hits skip both the network and deserialization
+    """
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.get_nowait(key)
+
+    def get_nowait(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            LOCAL_CACHE_MISSES.inc(cache=self.name)
+            return None
+
+        value, size, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._remove(key)
+            LOCAL_CACHE_MISSES.inc(cache=self.name)
+            return None
+
+        self._entries.move_to_end(key)
+        LOCAL_CACHE_HITS.inc(cache=self.name)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None, size: int = 0):
+        self.set_nowait(key, value, ttl, size)
+
+    def set_nowait(self, key: str, value: Any, ttl: Optional[float] = None, size: int = 0):
+        if size > self.max_bytes:
+            return
+
+        self._remove(key)
+        expires_at = time.monotonic() + ttl if ttl else float("inf")
+        self._entries[key] = (value, size, expires_at)
+        self.size_bytes += size
+
+        while self.size_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            LOCAL_CACHE_EVICTIONS.inc(cache=self.name)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+class JsonCodec:
+    """
+    Legacy format: plain JSON text
+    """
+
+    def encode(self, value: Any) -> str:
+        return json.dumps(value)
+
+    def decode(self, raw) -> Any:
+        return json.loads(raw)
+
+# Header byte of BinaryCodec values; legacy JSON values start with "[" or "{"
+FORMAT_ORJSON = b"\x01"
+FORMAT_ORJSON_ZLIB = b"\x02"
+FORMAT_ORJSON_ZSTD = b"\x03"
+
+class BinaryCodec:
+    """
+    Versioned binary format: one header byte, then orjson bytes,
+    compressed with zstd (or zlib when zstandard is not installed)
+    once they exceed compress_min_bytes
+    Legacy JSON values are decoded transparently
+    """
+
+    def __init__(self, compress_min_bytes: int = 1024, level: int = 3):
+        self.compress_min_bytes = compress_min_bytes
+        self.level = level
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=level)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, value: Any) -> bytes:
+        data = orjson.dumps(value)
+        if len(data) < self.compress_min_bytes:
+            return FORMAT_ORJSON + data
+        if zstandard is not None:
+            return FORMAT_ORJSON_ZSTD + self._compressor.compress(data)
+        return FORMAT_ORJSON_ZLIB + zlib.compress(data, self.level)
+
+    def decode(self, raw) -> Any:
+        if isinstance(raw, str):
+            return json.loads(raw)
+
+        header, data = raw[:1], raw[1:]
+        if header == FORMAT_ORJSON:
+            return orjson.loads(data)
+        if header == FORMAT_ORJSON_ZLIB:
+            return orjson.loads(zlib.decompress(data))
+        if header == FORMAT_ORJSON_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Cache value is zstd-compressed but zstandard is not installed")
+            return orjson.loads(self._decompressor.decompress(data))
+        # Legacy JSON written before the binary format
+        return orjson.loads(raw)
+
+def local_entry_size(value: Any) -> int:
+    """
+    Approximate in-memory size of a decoded value, as LocalCache counts it
+    Values carrying a rendered body are charged for the body, others for
+    their uncompressed JSON size
+    """
+    if isinstance(value, dict) and isinstance(value.get("body"), (str, bytes)):
+        return len(value["body"]) + LOCAL_ENTRY_OVERHEAD
+    return len(orjson.dumps(value)) + LOCAL_ENTRY_OVERHEAD
+
+class TieredCache(CacheBackend):
+    """
+    In-process LocalCache in front of a shared remote backend
+    Writes and deletes are announced on INVALIDATION_CHANNEL so other
+    workers drop their local copy
+    """
+
+    def __init__(self, local: LocalCache, remote: CacheBackend, codec, local_ttl: float):
+        self.local = local
+        self.remote = remote
+        self.codec = codec
+        self.local_ttl = local_ttl
+        self.instance_id = uuid.uuid4().hex
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.local.get_nowait(key)
+        if value is not None:
+            return value
+
+        raw = await self.remote.get(key)
+        if raw is None:
+            return None
+
+        value = self.codec.decode(raw)
+        self.local.set_nowait(key, value, self.local_ttl, local_entry_size(value))
+        return value
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        values = [self.local.get_nowait(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+
+        raws = await self.remote.get_many([keys[i] for i in missing])
+        for i, raw in zip(missing, raws):
+            if raw is not None:
+                values[i] = self.codec.decode(raw)
+                self.local.set_nowait(keys[i], values[i], self.local_ttl, local_entry_size(values[i]))
+        return values
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raw = self.codec.encode(value)
+        await self.remote.set(key, raw, ttl)
+        self.local.set_nowait(key, value, min(ttl, self.local_ttl) if ttl else self.local_ttl, local_entry_size(value))
+        await self._announce(key)
+
+    async def delete(self, *keys: str):
+        await self.remote.delete(*keys)
+        await self.local.delete(*keys)
+        for key in keys:
+            await self._announce(key)
+
+    async def _announce(self, key: str):
+        try:
+            await get_redis_client().publish(INVALIDATION_CHANNEL, f"{self.instance_id}:{key}")
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation for {key}: {e}")
+
+    async def listen_for_invalidations(self, client):
+        """
+        Drop local copies of keys changed by other workers
+        Runs for the lifetime of the application
+        """
+        while True:
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    instance_id, _, key = message.get("data", "").partition(":")
+                    if instance_id != self.instance_id:
+                        await self.local.delete(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Local entries may have missed updates while disconnected
+                logger.error(f"Cache invalidation listener error: {e}")
+                self.local = LocalCache(self.local.name, self.local.max_bytes)
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+# Cache namespaces that can be invalidated independently
+CACHE_NAMESPACES = ("config", "query")
+
+def generation_key(namespace: str) -> str:
+    """
+    Redis key holding the generation counter of a cache namespace
+    """
+    if namespace not in CACHE_NAMESPACES:
+        raise ValueError(f"Unknown cache namespace: {namespace}")
+    return f"cache:generation:{namespace}"
+
+async def bump_generation(client, namespace: str) -> int:
+    """
+    Start a new generation for a namespace, orphaning every key of the old one
+    Orphaned keys are never read again and expire through their own TTL
+    """
+    generation = await client.incr(generation_key(namespace))
+    logger.info(f"Cache namespace {namespace} moved to generation {generation}")
+    return generation
+
+async def count_keys(client, pattern: str, limit: int = 100000) -> int:
+    """
+    Count keys matching a pattern with SCAN, stopping at limit
+    """
+    count = 0
+    async for _ in client.scan_iter(match=pattern, count=1000):
+        count += 1
+        if count >= limit:
+            break
+    return count
@@ -0,0 +1,80 @@
+import logging
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    Per-worker circuit breaker for an upstream
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds, then lets a single trial call through (half-open)
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be attempted now
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+
+        # Half-open: one trial call at a time, a stuck trial is given up after reset_timeout
+        now = time.monotonic()
+        if self._trial_started is None or now - self._trial_started >= self.reset_timeout:
+            self._trial_started = now
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+
+    def release_trial(self):
+        """
+        Give up an allowed call that says nothing about the upstream's health
+        (shed before sending, or rejected as a bad request), so a half-open
+        breaker lets the next call through as its trial
+        """
+        self._trial_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_started = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+# Breakers per upstream name, created on first use
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_circuit_breaker(name: str, failure_threshold: int, reset_timeout: float) -> CircuitBreaker:
+    """
+    Get this worker's breaker for an upstream
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout)
+    return breaker
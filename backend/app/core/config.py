@@ -1,5 +1,6 @@
 import os
-from pydantic import BaseSettings, Field
+# Settings use the pydantic v1 API, shipped with pydantic 2 as pydantic.v1
+from pydantic.v1 import BaseSettings, Field
 from typing import Optional
 
 class Settings(BaseSettings):
@@ -30,6 +31,92 @@ class Settings(BaseSettings):
     LLM_PROVIDER: str = Field("anthropic", env="LLM_PROVIDER")  # anthropic or openai
     LLM_MODEL_NAME: str = Field("claude-3-opus-20240229", env="LLM_MODEL_NAME")
     
+    # Configuration snapshot
+    CONFIG_SNAPSHOT_MAX_AGE: float = Field(300.0, env="CONFIG_SNAPSHOT_MAX_AGE")  # seconds before re-checking the epoch
+    
+    # Request coalescing (the lock is renewed while its holder runs the pipeline)
+    SINGLEFLIGHT_LOCK_TTL: Optional[int] = Field(None, env="SINGLEFLIGHT_LOCK_TTL")  # seconds, defaults to the pipeline deadline
+    SINGLEFLIGHT_WAIT_TIMEOUT: Optional[float] = Field(None, env="SINGLEFLIGHT_WAIT_TIMEOUT")  # seconds, defaults to the lock TTL plus slack
+    SINGLEFLIGHT_POLL_INTERVAL: float = Field(0.2, env="SINGLEFLIGHT_POLL_INTERVAL")  # seconds
+    
+    # Recommendation cache (stale-while-revalidate)
+    TOP3_CACHE_SOFT_TTL: int = Field(21600, env="TOP3_CACHE_SOFT_TTL")  # seconds, served fresh
+    TOP3_CACHE_HARD_TTL: int = Field(86400, env="TOP3_CACHE_HARD_TTL")  # seconds, served stale until expiry
+    CACHE_ROLLOVER_MAX_VERSIONS: int = Field(3, env="CACHE_ROLLOVER_MAX_VERSIONS")  # previous config versions served during a gradual rollover
+
+    # In-process cache tier in front of Redis (per worker)
+    LOCAL_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, env="LOCAL_CACHE_MAX_BYTES")
+    LOCAL_CACHE_TTL: float = Field(30.0, env="LOCAL_CACHE_TTL")  # seconds, bounds staleness if an invalidation is missed
+    CACHE_COMPRESS_MIN_BYTES: int = Field(1024, env="CACHE_COMPRESS_MIN_BYTES")  # compress larger cache values
+
+    # Search result cache (provider + query + locale), independent of prompt/model config
+    SEARCH_CACHE_TTL: int = Field(43200, env="SEARCH_CACHE_TTL")  # seconds, 0 disables
+    
+    # Persistent recommendation store (PostgreSQL tier behind Redis)
+    RECOMMENDATION_STORE_ENABLED: bool = Field(True, env="RECOMMENDATION_STORE_ENABLED")
+    RECOMMENDATION_STORE_BATCH_SIZE: int = Field(100, env="RECOMMENDATION_STORE_BATCH_SIZE")  # results per insert
+    RECOMMENDATION_STORE_FLUSH_INTERVAL: float = Field(2.0, env="RECOMMENDATION_STORE_FLUSH_INTERVAL")  # seconds
+    RECOMMENDATION_STORE_QUEUE_SIZE: int = Field(10000, env="RECOMMENDATION_STORE_QUEUE_SIZE")
+    
+    # Batch recommendations
+    BATCH_MAX_KEYWORDS: int = Field(1000, env="BATCH_MAX_KEYWORDS")
+    BATCH_MAX_CONCURRENCY: int = Field(8, env="BATCH_MAX_CONCURRENCY")  # pipeline runs per batch
+    
+    # Async recommendation jobs (Redis streams, consumed by app.utils.job_worker)
+    JOB_MAX_ATTEMPTS: int = Field(3, env="JOB_MAX_ATTEMPTS")
+    JOB_RETRY_BASE_DELAY: float = Field(5.0, env="JOB_RETRY_BASE_DELAY")  # seconds, doubled per attempt
+    JOB_VISIBILITY_TIMEOUT: int = Field(300, env="JOB_VISIBILITY_TIMEOUT")  # seconds before a crashed worker's job is reclaimed
+    JOB_RESULT_TTL: int = Field(3600, env="JOB_RESULT_TTL")  # seconds a job and its result stay readable
+    JOB_DEDUP_TTL: int = Field(900, env="JOB_DEDUP_TTL")  # seconds a keyword maps to its pending job
+    JOB_STREAM_MAXLEN: int = Field(100000, env="JOB_STREAM_MAXLEN")  # approximate entries per priority stream
+    JOB_WORKER_CONCURRENCY: int = Field(4, env="JOB_WORKER_CONCURRENCY")  # jobs in flight per worker process
+    JOB_WORKER_IN_APP: bool = Field(False, env="JOB_WORKER_IN_APP")  # also consume jobs inside each API worker
+    JOB_SUBSCRIBE_TIMEOUT: float = Field(120.0, env="JOB_SUBSCRIBE_TIMEOUT")  # seconds an events stream stays open
+    
+    # Keyword popularity counter (feeds the cache warm-up job)
+    POPULARITY_FLUSH_INTERVAL: float = Field(10.0, env="POPULARITY_FLUSH_INTERVAL")  # seconds
+    POPULARITY_MAX_KEYWORDS: int = Field(50000, env="POPULARITY_MAX_KEYWORDS")
+    
+    # Search stage
+    SEARCH_STAGE_DEADLINE: float = Field(30.0, env="SEARCH_STAGE_DEADLINE")  # seconds across all queries of a pipeline run
+    
+    # Upstream admission (limits per provider live in PROVIDER_RATE_LIMITS)
+    UPSTREAM_MAX_QUEUE: int = Field(100, env="UPSTREAM_MAX_QUEUE")  # waiting calls per upstream and worker
+    UPSTREAM_ADMISSION_TIMEOUT: float = Field(10.0, env="UPSTREAM_ADMISSION_TIMEOUT")  # seconds
+    UPSTREAM_OFFLINE_ADMISSION_TIMEOUT: float = Field(60.0, env="UPSTREAM_OFFLINE_ADMISSION_TIMEOUT")  # seconds, batch requests, jobs and warm-up
+    
+    # LLM gateway: retries, circuit breakers, overall deadline
+    LLM_MAX_RETRIES: int = Field(2, env="LLM_MAX_RETRIES")  # per provider, after the first attempt
+    LLM_RETRY_BASE_DELAY: float = Field(0.5, env="LLM_RETRY_BASE_DELAY")  # seconds
+    LLM_RETRY_MAX_DELAY: float = Field(8.0, env="LLM_RETRY_MAX_DELAY")  # seconds
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = Field(5, env="LLM_CIRCUIT_FAILURE_THRESHOLD")  # consecutive failures
+    LLM_CIRCUIT_RESET_TIMEOUT: float = Field(30.0, env="LLM_CIRCUIT_RESET_TIMEOUT")  # seconds before a trial call
+    LLM_REQUEST_DEADLINE: float = Field(90.0, env="LLM_REQUEST_DEADLINE")  # seconds across all attempts
+    
+    # Request tracing (Server-Timing header, slow-request log, OTLP export)
+    TRACING_ENABLED: bool = Field(True, env="TRACING_ENABLED")
+    TRACING_SERVICE_NAME: str = Field("top03-kuai", env="TRACING_SERVICE_NAME")
+    TRACING_SLOW_REQUEST_THRESHOLD: float = Field(10.0, env="TRACING_SLOW_REQUEST_THRESHOLD")  # seconds, 0 disables
+    TRACING_SLOW_REQUEST_SAMPLE_RATE: float = Field(1.0, env="TRACING_SLOW_REQUEST_SAMPLE_RATE")  # fraction of slow requests logged
+    TRACING_EXPORTER: str = Field("none", env="TRACING_EXPORTER")  # none, otlp (collector at OTLP_BASE_URL) or file
+    TRACING_EXPORT_FILE: str = Field("traces.jsonl", env="TRACING_EXPORT_FILE")  # OTLP/JSON lines
+    TRACING_EXPORT_SAMPLE_RATE: float = Field(1.0, env="TRACING_EXPORT_SAMPLE_RATE")
+    TRACING_EXPORT_QUEUE_SIZE: int = Field(1000, env="TRACING_EXPORT_QUEUE_SIZE")
+    
+    # Upstream HTTP connection pools (per host)
+    HTTP2_ENABLED: bool = Field(True, env="HTTP2_ENABLED")
+    HTTP_MAX_CONNECTIONS: int = Field(100, env="HTTP_MAX_CONNECTIONS")
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = Field(20, env="HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    HTTP_KEEPALIVE_EXPIRY: float = Field(30.0, env="HTTP_KEEPALIVE_EXPIRY")  # seconds
+    HTTP_CONNECT_TIMEOUT: float = Field(5.0, env="HTTP_CONNECT_TIMEOUT")  # seconds
+    
+    # Upstream base URL overrides (mock servers, proxies); None uses the public API
+    SERPER_BASE_URL: Optional[str] = Field(None, env="SERPER_BASE_URL")
+    GOOGLE_BASE_URL: Optional[str] = Field(None, env="GOOGLE_BASE_URL")
+    ANTHROPIC_BASE_URL: Optional[str] = Field(None, env="ANTHROPIC_BASE_URL")
+    OPENAI_BASE_URL: Optional[str] = Field(None, env="OPENAI_BASE_URL")
+    OTLP_BASE_URL: Optional[str] = Field(None, env="OTLP_BASE_URL")  # OpenTelemetry collector (OTLP/HTTP)
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
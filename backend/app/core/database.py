@@ -3,6 +3,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.models.configuration import Base
+from app.models.recommendation import Recommendation  # noqa: F401 - registers the table
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,6 +53,14 @@ async def get_db() -> AsyncSession:
         finally:
             await session.close()
 
+def get_session_factory():
+    """
+    Get the async session factory for work outside a request (background tasks)
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    return AsyncSessionLocal
+
 def get_sync_engine():
     """
     Get sync engine for Alembic migrations
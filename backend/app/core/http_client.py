@@ -0,0 +1,101 @@
+import httpx
+import logging
+from typing import Dict
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upstream hosts and their per-host client settings
+UPSTREAMS = {
+    "serper": {
+        "base_url": "https://google.serper.dev",
+        "timeout": 30.0,
+        "http2": True,
+    },
+    "google": {
+        "base_url": "https://www.googleapis.com",
+        "timeout": 30.0,
+        "http2": True,
+    },
+    "anthropic": {
+        "base_url": "https://api.anthropic.com",
+        "timeout": 60.0,
+        "http2": True,
+    },
+    "openai": {
+        "base_url": "https://api.openai.com",
+        "timeout": 60.0,
+        "http2": True,
+    },
+    # Local OpenTelemetry collector, receives exported traces
+    "otlp": {
+        "base_url": "http://localhost:4318",
+        "timeout": 5.0,
+        "http2": False,
+    },
+}
+
+# Global pooled clients, one per upstream host
+http_clients: Dict[str, httpx.AsyncClient] = {}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _create_client(name: str) -> httpx.AsyncClient:
+    upstream = UPSTREAMS[name]
+    http2 = settings.HTTP2_ENABLED and upstream["http2"] and _http2_available()
+    # Overridable per upstream, e.g. to point at a local mock server
+    base_url = getattr(settings, f"{name.upper()}_BASE_URL", None) or upstream["base_url"]
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            upstream["timeout"],
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+        ),
+    )
+
+async def init_http_clients():
+    """
+    Initialize pooled HTTP clients for every upstream host
+    """
+    if settings.HTTP2_ENABLED and not _http2_available():
+        logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+
+    for name in UPSTREAMS:
+        if name not in http_clients:
+            http_clients[name] = _create_client(name)
+
+    logger.info(f"HTTP clients initialized for: {', '.join(http_clients)}")
+
+async def close_http_clients():
+    """
+    Close all pooled HTTP clients
+    """
+    for name, client in list(http_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close HTTP client {name}: {e}")
+    http_clients.clear()
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """
+    Get the pooled HTTP client for an upstream host
+    Clients are created lazily so scripts outside the app lifespan still work
+    """
+    client = http_clients.get(name)
+    if client is None or client.is_closed:
+        client = _create_client(name)
+        http_clients[name] = client
+    return client
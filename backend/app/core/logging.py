@@ -0,0 +1,13 @@
+import logging
+
+from app.core.config import settings
+
+def setup_logging():
+    """
+    Configure the root logger for the application
+    DEBUG enables debug output; uvicorn keeps its own access log handlers
+    """
+    logging.basicConfig(
+        level=logging.DEBUG if settings.DEBUG else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
@@ -0,0 +1,229 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Counter:
+    """
+    Monotonic in-process counter with optional labels
+    """
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def samples(self) -> List[Tuple[Dict[str, str], float]]:
+        return [
+            (dict(zip(self.labelnames, key)), value)
+            for key, value in self._values.items()
+        ]
+
+# Default latency buckets in seconds, from cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """
+    In-process histogram with cumulative buckets and optional labels
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [count per bucket (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of a block in seconds
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Tuple[Dict[str, str], List[int], float]]:
+        return [
+            (dict(zip(self.labelnames, key)), list(counts), total)
+            for key, (counts, total) in self._values.items()
+        ]
+
+# All metrics created in this process
+REGISTRY: List = []
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(str(value))}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def render_prometheus() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format
+    Values are per process; with several workers each one reports its own
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        if isinstance(metric, Histogram):
+            lines.append(f"# TYPE {metric.name} histogram")
+            for labels, counts, total in metric.samples():
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    bucket_labels = {**labels, "le": _format_value(bound)}
+                    lines.append(f"{metric.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {cumulative}")
+        else:
+            lines.append(f"# TYPE {metric.name} counter")
+            for labels, value in metric.samples():
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# Keyword normalization
+KEYWORD_NORMALIZATION = Counter(
+    "top3_keyword_normalization_total",
+    "Keywords passed through normalization, by whether the cache key changed",
+    ("changed",),
+)
+
+# Recommendation cache lookups
+TOP3_CACHE_REQUESTS = Counter(
+    "top3_cache_requests_total",
+    "Recommendation cache lookups by result (hit, stale, database, rollover, semantic, miss)",
+    ("result",),
+)
+
+TOP3_CACHE_NORMALIZED_HITS = Counter(
+    "top3_cache_normalized_hits_total",
+    "Cache hits whose raw keyword differed from its normalized form",
+)
+
+# In-process cache tier
+LOCAL_CACHE_HITS = Counter(
+    "local_cache_hits_total",
+    "Lookups served from the in-process cache",
+    ("cache",),
+)
+
+LOCAL_CACHE_MISSES = Counter(
+    "local_cache_misses_total",
+    "Lookups that fell through the in-process cache",
+    ("cache",),
+)
+
+LOCAL_CACHE_EVICTIONS = Counter(
+    "local_cache_evictions_total",
+    "Entries evicted from the in-process cache to stay within its byte budget",
+    ("cache",),
+)
+
+# Search providers
+SEARCH_PROVIDER_REQUESTS = Counter(
+    "search_provider_requests_total",
+    "Search provider calls by result (ok, empty, error, timeout, cancelled, shed)",
+    ("provider", "result"),
+)
+
+SEARCH_HEDGES = Counter(
+    "search_hedges_total",
+    "Hedged search calls started because the previous provider was slow or failed",
+    ("provider",),
+)
+
+SEARCH_CACHE_REQUESTS = Counter(
+    "search_cache_requests_total",
+    "Search result cache lookups by provider and result (hit, miss)",
+    ("provider", "result"),
+)
+
+# LLM prompt size (estimated locally, before the call)
+LLM_PROMPT_REQUESTS = Counter(
+    "llm_prompt_requests_total",
+    "LLM prompts assembled",
+)
+
+LLM_PROMPT_CHARS = Counter(
+    "llm_prompt_chars_total",
+    "Characters of system + user prompt sent to the LLM",
+)
+
+LLM_PROMPT_TOKENS = Counter(
+    "llm_prompt_estimated_tokens_total",
+    "Estimated input tokens of system + user prompt sent to the LLM",
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "LLM tokens reported by providers, by type (input_tokens, output_tokens, "
+    "cache_read_input_tokens, cache_creation_input_tokens)",
+    ("provider", "type"),
+)
+
+LLM_GATEWAY_CALLS = Counter(
+    "llm_gateway_calls_total",
+    "LLM gateway attempts by provider and result (ok, fallback, retry, error, timeout, circuit_open, shed)",
+    ("provider", "result"),
+)
+
+# Upstream admission control
+UPSTREAM_SHED = Counter(
+    "upstream_calls_shed_total",
+    "Upstream calls rejected before being sent, by reason (queue_full, queue_timeout, rate_limited)",
+    ("upstream", "reason"),
+)
+
+# Async recommendation jobs
+TOP3_JOBS = Counter(
+    "top3_jobs_total",
+    "Recommendation jobs by event (submitted, deduplicated, cached, succeeded, retried, failed, reclaimed)",
+    ("event",),
+)
+
+# Pipeline stages
+PIPELINE_STAGE_SECONDS = Histogram(
+    "top3_pipeline_stage_seconds",
+    "Duration of recommendation pipeline stages (config_load, cache_lookup, search, "
+    "prompt_build, llm_call, extraction, cache_write)",
+    ("stage",),
+)
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from app.core.cache import get_redis_client
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_SHED
+
+logger = logging.getLogger(__name__)
+
+class AsyncRateLimiter:
+    """
+    In-process token bucket: `rate` calls per second with bursts up to `burst`
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Wait until a call is allowed
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def parse_rate_limits(raw: Optional[str]) -> Dict[str, dict]:
+    """
+    Parse the PROVIDER_RATE_LIMITS config value
+    JSON object provider (or provider:model) -> {"rate": calls per second,
+    "burst": bucket size, "concurrency": calls in flight per worker,
+    "queue": calls waiting per worker}
+    """
+    if not raw:
+        return {}
+
+    try:
+        limits = json.loads(raw)
+    except ValueError as e:
+        logger.error(f"Invalid PROVIDER_RATE_LIMITS configuration: {e}")
+        return {}
+
+    if not isinstance(limits, dict):
+        logger.error("PROVIDER_RATE_LIMITS must be a JSON object")
+        return {}
+    return limits
+
+# Distributed token bucket shared by every worker
+# Reserves a token if it is available within ARGV[3] ms; returns the wait in ms,
+# or -wait without reserving when the wait would be longer
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local wait = 0
+if tokens < 1 then
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+    if wait > max_wait then
+        return -wait
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+class UpstreamOverloadedError(Exception):
+    """
+    A call to an upstream was shed before being sent
+    status_code is 429 when the provider rate limit cannot be met in time,
+    503 when this worker's wait queue is full or the admission wait timed out
+    """
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class UpstreamGate:
+    """
+    Admission control for one upstream (provider or provider:model)
+    Calls wait for a per-worker concurrency slot in a bounded queue, then
+    for a token from the Redis token bucket shared by all workers; anything
+    that cannot start before its deadline is shed instead of piling up
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int, max_queue: int):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        self._waiting = 0
+        self._local_limiter = AsyncRateLimiter(rate, burst) if rate else None
+        self._script = None
+
+    def _shed(self, reason: str, status_code: int, retry_after: Optional[float] = None):
+        UPSTREAM_SHED.inc(upstream=self.name, reason=reason)
+        raise UpstreamOverloadedError(
+            f"{self.name} is overloaded ({reason})", status_code=status_code, retry_after=retry_after
+        )
+
+    @asynccontextmanager
+    async def admit(self, timeout: float):
+        """
+        Hold an admission slot for one upstream call
+        """
+        deadline = time.monotonic() + timeout
+
+        if self._semaphore is not None:
+            if not self._semaphore.locked():
+                # A slot is free, acquire returns without waiting
+                await self._semaphore.acquire()
+            else:
+                if self._waiting >= self.max_queue:
+                    self._shed("queue_full", 503)
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(self._semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self._shed("queue_timeout", 503)
+                finally:
+                    self._waiting -= 1
+
+        try:
+            if self.rate:
+                await self._take_token(deadline)
+            yield
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    async def _take_token(self, deadline: float):
+        max_wait = max(0.0, deadline - time.monotonic())
+        try:
+            if self._script is None:
+                self._script = get_redis_client().register_script(_TOKEN_BUCKET_SCRIPT)
+            wait_ms = int(await self._script(
+                keys=[f"ratelimit:{self.name}"],
+                args=[self.rate, self.burst, int(max_wait * 1000)]
+            ))
+        except Exception as e:
+            # Redis unavailable: fall back to this worker's own bucket
+            logger.warning(f"Distributed rate limiter unavailable for {self.name}: {e}")
+            try:
+                await asyncio.wait_for(self._local_limiter.acquire(), max_wait)
+            except asyncio.TimeoutError:
+                self._shed("rate_limited", 429)
+            return
+
+        if wait_ms < 0:
+            self._shed("rate_limited", 429, retry_after=-wait_ms / 1000)
+        if wait_ms:
+            await asyncio.sleep(wait_ms / 1000)
+
+# Admission timeout of offline callers, None for interactive requests; asyncio copies it into child tasks
+_offline_admission_timeout: ContextVar[Optional[float]] = ContextVar("offline_admission_timeout", default=None)
+
+@contextmanager
+def offline_admission():
+    """
+    Mark upstream calls made within the block as offline (batch requests,
+    async jobs, cache warm-up): they wait up to UPSTREAM_OFFLINE_ADMISSION_TIMEOUT
+    for admission instead of being shed after UPSTREAM_ADMISSION_TIMEOUT
+    """
+    token = _offline_admission_timeout.set(settings.UPSTREAM_OFFLINE_ADMISSION_TIMEOUT)
+    try:
+        yield
+    finally:
+        _offline_admission_timeout.reset(token)
+
+def offline_admission_timeout() -> Optional[float]:
+    """
+    Admission timeout of the current offline caller, None for interactive requests
+    """
+    return _offline_admission_timeout.get()
+
+def admission_timeout() -> float:
+    """
+    Longest wait for admission to an upstream in the current context
+    """
+    offline = _offline_admission_timeout.get()
+    return settings.UPSTREAM_ADMISSION_TIMEOUT if offline is None else offline
+
+# Gates per upstream, rebuilt when their limits change
+_gates: Dict[str, Tuple[tuple, UpstreamGate]] = {}
+
+def get_upstream_gate(name: str, limits: Dict[str, dict]) -> Optional[UpstreamGate]:
+    """
+    Get this worker's gate for an upstream, None when it is unlimited
+    A "provider:model" name uses its own limits if configured, else the provider's
+    """
+    limit = limits.get(name)
+    if limit is None and ":" in name:
+        name = name.split(":", 1)[0]
+        limit = limits.get(name)
+    if not limit or not (limit.get("rate") or limit.get("concurrency")):
+        return None
+
+    key = (
+        float(limit.get("rate") or 0),
+        int(limit.get("burst", 1)),
+        int(limit.get("concurrency") or 0),
+        int(limit.get("queue", settings.UPSTREAM_MAX_QUEUE)),
+    )
+    entry = _gates.get(name)
+    if entry is None or entry[0] != key:
+        entry = (key, UpstreamGate(name, *key))
+        _gates[name] = entry
+    return entry[1]
+
+@asynccontextmanager
+async def upstream_admission(name: str, limits: Dict[str, dict], timeout: Optional[float] = None):
+    """
+    Admit one call to an upstream, raising UpstreamOverloadedError when it must be shed
+    """
+    gate = get_upstream_gate(name, limits)
+    if gate is None:
+        yield
+        return
+    async with gate.admit(admission_timeout() if timeout is None else timeout):
+        yield
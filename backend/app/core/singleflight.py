@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Compare-and-delete so a worker never releases a lock it no longer owns
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+else
+    return 0
+end
+"""
+
+# Compare-and-extend so a worker only renews a lock it still owns
+_EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+else
+    return 0
+end
+"""
+
+class SingleFlight:
+    """
+    In-process request coalescing
+    Concurrent calls with the same key share a single in-flight execution
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def inflight(self, key: str) -> bool:
+        """
+        Check whether a call for the key is currently running
+        """
+        return key in self._inflight
+
+    def start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Start fn for the key unless a call is already running, and return the
+        shared future; await it through asyncio.shield, as do does
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        else:
+            logger.debug(f"Joining in-flight call for key: {key}")
+        return future
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once per key; every concurrent caller receives the same result
+        """
+        # Shield so a disconnecting caller does not cancel the shared call
+        return await asyncio.shield(self.start(key, fn))
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Mark the exception as retrieved when every waiter has gone away
+        if not future.cancelled():
+            future.exception()
+
+class FlightProgress:
+    """
+    Events published by an in-flight call, replayed to every follower
+    Followers that join late first receive the events they missed
+    """
+
+    def __init__(self):
+        self.events: List[Tuple[str, Any]] = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def publish(self, event: str, data: Any):
+        self.events.append((event, data))
+        self._notify()
+
+    def close(self):
+        self.closed = True
+        self._notify()
+
+    def _notify(self):
+        # A new Event per change, so no follower can miss a wakeup
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yield every event until the call closes the progress
+        """
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.closed:
+                return
+            await self._changed.wait()
+
+async def acquire_redis_lock(redis_client, key: str, lock_ttl: int) -> Optional[str]:
+    """
+    Try to take the Redis lock for a key without waiting
+    Returns the owner token, or None when another worker holds the lock
+    """
+    token = uuid.uuid4().hex
+    acquired = await redis_client.set(f"lock:{key}", token, nx=True, ex=lock_ttl)
+    return token if acquired else None
+
+async def release_redis_lock(redis_client, key: str, token: str):
+    """
+    Release a Redis lock taken with acquire_redis_lock
+    """
+    try:
+        await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+    except Exception as e:
+        logger.warning(f"Failed to release lock for {key}: {e}")
+
+async def extend_redis_lock(redis_client, key: str, token: str, lock_ttl: int) -> bool:
+    """
+    Reset the TTL of a Redis lock taken with acquire_redis_lock
+    Returns False when the lock expired or was taken over meanwhile
+    """
+    extended = await redis_client.eval(_EXTEND_LOCK_SCRIPT, 1, f"lock:{key}", token, int(lock_ttl * 1000))
+    return bool(extended)
+
+@asynccontextmanager
+async def renew_redis_lock(redis_client, key: str, token: str, lock_ttl: int):
+    """
+    Keep a held Redis lock alive for the duration of the block
+    The lock is extended every third of its TTL, so a long-running holder
+    never loses it while a crashed one still frees it within one TTL
+    """
+    async def renew():
+        while True:
+            await asyncio.sleep(lock_ttl / 3)
+            try:
+                if not await extend_redis_lock(redis_client, key, token, lock_ttl):
+                    logger.warning(f"Lost lock for {key} while holding it")
+                    return
+            except Exception as e:
+                logger.warning(f"Failed to extend lock for {key}: {e}")
+
+    task = asyncio.create_task(renew())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+async def redis_singleflight(
+    redis_client,
+    key: str,
+    fn: Callable[[], Awaitable[Any]],
+    read_result: Callable[[], Awaitable[Optional[Any]]],
+    lock_ttl: int,
+    wait_timeout: float,
+    poll_interval: float
+) -> Any:
+    """
+    Cross-worker request coalescing backed by a Redis lock
+    The lock holder runs fn (which must publish its result where read_result
+    can see it) and renews the lock until fn returns; other workers poll
+    read_result until it appears
+    """
+    lock_key = f"lock:{key}"
+    deadline = time.monotonic() + wait_timeout
+
+    while True:
+        token = await acquire_redis_lock(redis_client, key, lock_ttl)
+        if token:
+            try:
+                async with renew_redis_lock(redis_client, key, token, lock_ttl):
+                    return await fn()
+            finally:
+                await release_redis_lock(redis_client, key, token)
+
+        # Another worker owns the pipeline, wait for its result
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+
+            result = await read_result()
+            if result is not None:
+                return result
+
+            if not await redis_client.exists(lock_key):
+                # Holder finished without a result or died, try to take over
+                break
+        else:
+            logger.warning(f"Timed out waiting for lock {lock_key}, computing locally")
+            return await fn()
@@ -0,0 +1,358 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import PIPELINE_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Full span trees of slow requests, enable or silence independently of the app log
+slow_request_logger = logging.getLogger("app.slow_requests")
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+class Span:
+    """
+    One timed operation within a request trace
+    """
+
+    __slots__ = ("trace", "span_id", "parent", "name", "attributes", "started", "ended", "error", "children")
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"] = None, attributes: Optional[dict] = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes or {}
+        self.started = time.perf_counter()
+        self.ended: Optional[float] = None
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.ended or time.perf_counter()) - self.started
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def finish(self):
+        if self.ended is None:
+            self.ended = time.perf_counter()
+
+class Trace:
+    """
+    Span tree of one HTTP request or background operation
+    perf_counter timestamps are anchored to the wall clock at the start for export
+    """
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: Optional[str] = None,
+        parent_span_id: Optional[str] = None,
+        kind: int = SPAN_KIND_SERVER
+    ):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.started_ns = time.time_ns()
+        self.root = Span(self, name)
+        self.finished = False
+
+    def unix_nanos(self, perf_time: float) -> int:
+        return self.started_ns + int((perf_time - self.root.started) * 1e9)
+
+    def finish(self):
+        self.root.finish()
+        self.finished = True
+
+    def spans(self) -> List[Span]:
+        ordered, pending = [], [self.root]
+        while pending:
+            node = pending.pop()
+            ordered.append(node)
+            pending.extend(reversed(node.children))
+        return ordered
+
+# Innermost open span of the current task; asyncio copies it into child tasks
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def start_trace(name: str, traceparent: Optional[str] = None) -> Trace:
+    """
+    Start a request trace and make its root span current
+    A valid W3C traceparent header continues the caller's trace
+    """
+    trace_id = parent_span_id = None
+    if traceparent:
+        parts = traceparent.strip().split("-")
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16 and parts[1] != "0" * 32:
+            trace_id, parent_span_id = parts[1], parts[2]
+
+    trace = Trace(name, trace_id, parent_span_id)
+    _current_span.set(trace.root)
+    return trace
+
+@contextmanager
+def background_trace(name: str, **attributes):
+    """
+    Trace background work (e.g. a stale-entry refresh) in a trace of its own
+    The request that started it, if any, is recorded as origin.trace_id
+    """
+    origin = _current_span.get()
+    trace = Trace(name, kind=SPAN_KIND_INTERNAL)
+    for key, value in attributes.items():
+        trace.root.set_attribute(key, value)
+    if origin is not None:
+        trace.root.set_attribute("origin.trace_id", origin.trace.trace_id)
+
+    token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        finish_trace(trace)
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a child of the current span
+    A no-op outside a trace, or once the trace has finished (e.g. work
+    started by a request that outlives it without a trace of its own)
+    """
+    parent = _current_span.get()
+    if parent is None or parent.trace.finished:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent, attributes)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Time a pipeline stage as a span and in top3_pipeline_stage_seconds
+    """
+    with span(name, **attributes) as stage_span:
+        started = time.perf_counter()
+        try:
+            yield stage_span
+        finally:
+            PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+def server_timing(trace: Trace) -> str:
+    """
+    Render the request's top-level stages as a Server-Timing header value
+    Repeated stages are summed; durations are in milliseconds
+    """
+    totals: Dict[str, float] = {}
+    for child in trace.root.children:
+        totals[child.name] = totals.get(child.name, 0.0) + child.duration
+    totals["total"] = trace.root.duration
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+def format_span_tree(trace: Trace) -> str:
+    """
+    Indented span tree with durations, for the slow-request log
+    """
+    lines = []
+
+    def visit(node: Span, depth: int):
+        offset = (node.started - trace.root.started) * 1000
+        details = "".join(f" {key}={value}" for key, value in node.attributes.items())
+        error = f" error={node.error!r}" if node.error else ""
+        lines.append(f"{'  ' * depth}{node.name} +{offset:.1f}ms {node.duration * 1000:.1f}ms{details}{error}")
+        for child in node.children:
+            visit(child, depth + 1)
+
+    visit(trace.root, 0)
+    return "\n".join(lines)
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(trace: Trace) -> dict:
+    """
+    Convert a trace to an OTLP/JSON ExportTraceServiceRequest
+    """
+    spans = []
+    for node in trace.spans():
+        parent_id = node.parent.span_id if node.parent else trace.parent_span_id
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": node.span_id,
+            "parentSpanId": parent_id or "",
+            "name": node.name,
+            "kind": trace.kind if node is trace.root else SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(trace.unix_nanos(node.started)),
+            "endTimeUnixNano": str(trace.unix_nanos(node.ended or node.started)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in node.attributes.items()],
+            "status": {"code": 2, "message": node.error} if node.error else {"code": 0},
+        })
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": settings.TRACING_SERVICE_NAME}},
+                {"key": "service.version", "value": {"stringValue": settings.PROJECT_VERSION}},
+            ]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+class TraceExporter:
+    """
+    Exports finished traces off the request path
+    Sampled traces are queued and written by a background task, either to an
+    OTLP/HTTP collector (TRACING_EXPORTER=otlp) or appended as OTLP/JSON lines
+    to TRACING_EXPORT_FILE (TRACING_EXPORTER=file)
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+
+    def enqueue(self, trace: Trace):
+        """
+        Queue a trace for export if sampled, never blocks the caller
+        """
+        if self._queue is None or random.random() >= settings.TRACING_EXPORT_SAMPLE_RATE:
+            return
+        try:
+            self._queue.put_nowait(trace)
+        except asyncio.QueueFull:
+            logger.debug("Trace export queue full, dropping trace")
+
+    async def run(self):
+        """
+        Export queued traces in batches until cancelled, then drain the queue
+        Runs for the lifetime of the application when an exporter is configured
+        """
+        if settings.TRACING_EXPORTER not in ("otlp", "file"):
+            return
+
+        self._queue = asyncio.Queue(maxsize=settings.TRACING_EXPORT_QUEUE_SIZE)
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                while not self._queue.empty() and len(batch) < 100:
+                    batch.append(self._queue.get_nowait())
+                await self._export(batch)
+        finally:
+            # Export what is still queued on shutdown
+            remaining = []
+            while not self._queue.empty():
+                remaining.append(self._queue.get_nowait())
+            self._queue = None
+            for start in range(0, len(remaining), 100):
+                await self._export(remaining[start:start + 100])
+
+    async def _export(self, batch: List[Trace]):
+        payloads = [to_otlp(trace) for trace in batch]
+        try:
+            if settings.TRACING_EXPORTER == "otlp":
+                from app.core.http_client import get_http_client
+
+                # One request per batch: OTLP accepts several resourceSpans
+                body = {"resourceSpans": [rs for payload in payloads for rs in payload["resourceSpans"]]}
+                response = await get_http_client("otlp").post("/v1/traces", json=body)
+                response.raise_for_status()
+            else:
+                lines = "".join(json.dumps(payload, separators=(",", ":")) + "\n" for payload in payloads)
+                await asyncio.to_thread(_append_file, settings.TRACING_EXPORT_FILE, lines)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(batch)} traces: {e}")
+
+def _append_file(path: str, text: str):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+# Global exporter, started in the application lifespan
+trace_exporter = TraceExporter()
+
+def finish_trace(trace: Trace):
+    """
+    Close a trace: log it if slow (sampled) and queue it for export
+    """
+    trace.finish()
+
+    threshold = settings.TRACING_SLOW_REQUEST_THRESHOLD
+    if (
+        threshold > 0
+        and trace.root.duration >= threshold
+        and random.random() < settings.TRACING_SLOW_REQUEST_SAMPLE_RATE
+    ):
+        slow_request_logger.warning(
+            f"Slow {trace.root.name} ({trace.root.duration:.2f}s, trace {trace.trace_id}):\n{format_span_tree(trace)}"
+        )
+
+    trace_exporter.enqueue(trace)
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing each HTTP request through the pipeline stages
+    The Server-Timing header covers the time until the response headers are
+    sent; the exported trace and slow-request log cover the whole response,
+    streamed bodies included
+    """
+
+    def __init__(self, app, exclude_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = next(
+            (value.decode("latin-1") for key, value in scope["headers"] if key == b"traceparent"), None
+        )
+        trace = start_trace(f"{scope['method']} {scope['path']}", traceparent)
+        trace.root.set_attribute("http.method", scope["method"])
+        trace.root.set_attribute("http.target", scope["path"])
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                trace.root.set_attribute("http.status_code", message["status"])
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(trace).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception as e:
+            trace.root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            finish_trace(trace)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
+from app.models.configuration import Base
+
+class Recommendation(Base):
+    """
+    Recommendation model for persisting computed Top 3 results
+    One row per product; rows of the same pipeline run share a result_id
+    """
+    __tablename__ = "recommendations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    result_id = Column(String(32), nullable=False, index=True)
+    keyword = Column(String(100), nullable=False, index=True)
+    config_version = Column(String(32), nullable=False)
+    rank = Column(Integer, nullable=False)
+    product_name = Column(String(255), nullable=False)
+    description = Column(Text, nullable=False)
+    source_link = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_recommendations_keyword_version_created", "keyword", "config_version", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<Recommendation(keyword={self.keyword}, rank={self.rank}, product_name={self.product_name})>"
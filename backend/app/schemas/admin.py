@@ -49,4 +49,23 @@ class AdminResponse(BaseModel):
     Generic admin response schema
     """
     status: str = Field(..., description="Response status")
-    message: str = Field(..., description="Response message")
\ No newline at end of file
+    message: str = Field(..., description="Response message")
+
+class InvalidationPreviewResponse(BaseModel):
+    """
+    Preview of the cache invalidation a settings update will trigger
+    """
+    status: str = Field(..., description="Response status")
+    changed_keys: List[str] = Field(..., description="Configuration keys whose value changes")
+    namespaces: List[str] = Field(..., description="Cache namespaces that will be invalidated")
+    current_version: str = Field(..., description="Current recommendation config version")
+    new_version: str = Field(..., description="Recommendation config version after the update")
+    recommendations_affected: bool = Field(..., description="Whether cached recommendations roll over")
+    rollover_mode: str = Field(..., description="gradual (serve old results until refreshed) or immediate")
+    cached_recommendations: int = Field(..., description="Cached recommendations under the current version")
+
+class InvalidateCacheRequest(BaseModel):
+    """
+    Request to invalidate a cache namespace
+    """
+    namespace: str = Field(..., description="Cache namespace to invalidate (config or query)")
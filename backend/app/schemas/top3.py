@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, List, Literal, Optional
 
 class ProductRecommendation(BaseModel):
     """
@@ -16,6 +16,21 @@ class KeywordRequest(BaseModel):
     """
     keyword: str = Field(..., min_length=1, max_length=100, description="Product keyword to search for")
 
+class BatchKeywordRequest(BaseModel):
+    """
+    Request schema for batch recommendations
+    """
+    keywords: List[Annotated[str, Field(min_length=1, max_length=100)]] = Field(
+        ..., min_length=1, description="Product keywords to resolve"
+    )
+
+class JobRequest(BaseModel):
+    """
+    Request schema for submitting an async recommendation job
+    """
+    keyword: str = Field(..., min_length=1, max_length=100, description="Product keyword to search for")
+    priority: Literal["high", "normal", "low"] = Field("normal", description="Queue priority")
+
 class Top3Response(BaseModel):
     """
     Response schema for top 3 recommendations
@@ -25,10 +40,12 @@ class Top3Response(BaseModel):
 
 class ProductRecommendationInDB(BaseModel):
     """
-    Schema for storing product recommendations in database (if needed)
+    Schema for product recommendations stored in the database
     """
     id: Optional[int] = None
+    result_id: Optional[str] = None
     keyword: str
+    config_version: Optional[str] = None
     rank: int
     product_name: str
     description: str
@@ -36,4 +53,36 @@ class ProductRecommendationInDB(BaseModel):
     created_at: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class RecommendationHistoryItem(BaseModel):
+    """
+    One stored pipeline result for a keyword
+    """
+    result_id: str = Field(..., description="Identifier of the pipeline run")
+    config_version: str = Field(..., description="Prompt/model config version that produced it")
+    created_at: str = Field(..., description="When the result was computed (UTC, ISO 8601)")
+    data: List[ProductRecommendation] = Field(..., description="Top 3 recommendations")
+
+class RecommendationHistoryResponse(BaseModel):
+    """
+    Response schema for recommendation history
+    """
+    status: str = Field(..., description="Response status")
+    keyword: str = Field(..., description="Normalized keyword")
+    data: List[RecommendationHistoryItem] = Field(..., description="Stored results, newest first")
+
+
+class JobResponse(BaseModel):
+    """
+    Response schema for an async recommendation job
+    """
+    job_id: str = Field(..., description="Job identifier, used to poll or subscribe")
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    keyword: str = Field(..., description="Normalized keyword")
+    priority: str = Field(..., description="Queue priority")
+    attempts: int = Field(0, description="Pipeline runs started so far")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    updated_at: float = Field(..., description="Last status change (Unix seconds)")
+    data: Optional[List[ProductRecommendation]] = Field(None, description="Top 3 recommendations once succeeded")
+    error: Optional[str] = Field(None, description="Last error, if any")
@@ -0,0 +1,386 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.database import get_session_factory
+from app.core.metrics import TOP3_JOBS
+from app.core.ratelimit import UpstreamOverloadedError, offline_admission
+from app.services.recommendation import get_or_compute_recommendations
+from app.utils.config_loader import ConfigSnapshot, get_config_snapshot
+
+logger = logging.getLogger(__name__)
+
+# One stream per priority, read in this order
+PRIORITIES = ("high", "normal", "low")
+JOB_GROUP = "top3-workers"
+
+# Retries wait here (member "priority:job_id", score = due time) until promoted
+DELAYED_KEY = "jobs:delayed"
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# Compare-and-delete so a finished job never removes a newer job's dedup entry
+_RELEASE_DEDUP_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+else
+    return 0
+end
+"""
+
+# Point a keyword's dedup entry at a new job unless the current one is still
+# queued or running; returns the active job's id, or nil once claimed
+_CLAIM_DEDUP_SCRIPT = """
+local current = redis.call("get", KEYS[1])
+if current then
+    local status = redis.call("hget", "job:" .. current, "status")
+    if status == "queued" or status == "running" then
+        return current
+    end
+end
+redis.call("set", KEYS[1], ARGV[1], "EX", ARGV[2])
+return false
+"""
+
+# Move due retries back onto their priority stream
+_PROMOTE_SCRIPT = """
+local due = redis.call("zrangebyscore", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, 100)
+for _, member in ipairs(due) do
+    redis.call("zrem", KEYS[1], member)
+    local sep = string.find(member, ":", 1, true)
+    redis.call("xadd", "jobs:stream:" .. string.sub(member, 1, sep - 1), "MAXLEN", "~", ARGV[2],
+        "*", "job_id", string.sub(member, sep + 1))
+end
+return #due
+"""
+
+def stream_key(priority: str) -> str:
+    return f"jobs:stream:{priority}"
+
+def job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+def job_channel(job_id: str) -> str:
+    return f"job:{job_id}:events"
+
+def dedup_key(keyword: str, config: ConfigSnapshot) -> str:
+    return f"jobs:dedup:{config.version}:{keyword}"
+
+@dataclass
+class Job:
+    """
+    A recommendation job as stored in its Redis hash
+    """
+    job_id: str
+    keyword: str
+    priority: str
+    status: str
+    created_at: float
+    updated_at: float
+    attempts: int = 0
+    dedup_key: str = ""
+    data: Optional[list] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_hash(cls, fields: dict) -> "Job":
+        return cls(
+            job_id=fields["job_id"],
+            keyword=fields["keyword"],
+            priority=fields.get("priority", "normal"),
+            status=fields["status"],
+            created_at=float(fields["created_at"]),
+            updated_at=float(fields.get("updated_at", fields["created_at"])),
+            attempts=int(fields.get("attempts", 0)),
+            dedup_key=fields.get("dedup_key", ""),
+            data=json.loads(fields["data"]) if fields.get("data") else None,
+            error=fields.get("error") or None,
+        )
+
+    def to_hash(self) -> dict:
+        fields = {
+            "job_id": self.job_id,
+            "keyword": self.keyword,
+            "priority": self.priority,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "attempts": self.attempts,
+            "dedup_key": self.dedup_key,
+        }
+        if self.data is not None:
+            fields["data"] = json.dumps(self.data, ensure_ascii=False)
+        if self.error:
+            fields["error"] = self.error
+        return fields
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ACTIVE_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "keyword": self.keyword,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "data": self.data,
+            "error": self.error,
+        }
+
+async def load_job(cache_client, job_id: str) -> Optional[Job]:
+    """
+    Read a job, returns None if it is unknown or expired
+    """
+    fields = await cache_client.hgetall(job_key(job_id))
+    return Job.from_hash(fields) if fields else None
+
+async def _update_job(cache_client, job: Job, ttl: int, **changes):
+    """
+    Persist changed job fields and announce the new status to subscribers
+    """
+    for name, value in changes.items():
+        setattr(job, name, value)
+    job.updated_at = time.time()
+
+    fields = job.to_hash()
+    pipe = cache_client.pipeline(transaction=True)
+    pipe.hset(job_key(job.job_id), mapping=fields)
+    if "error" in changes and not job.error:
+        pipe.hdel(job_key(job.job_id), "error")
+    pipe.expire(job_key(job.job_id), ttl)
+    pipe.publish(job_channel(job.job_id), job.status)
+    await pipe.execute()
+
+async def submit_job(
+    keyword: str,
+    priority: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> Tuple[Job, bool]:
+    """
+    Queue a pipeline run for a normalized keyword
+    Returns (job, created); a keyword already queued or running under the
+    same config version returns that job instead of queuing a second one
+    """
+    key = dedup_key(keyword, config)
+    now = time.time()
+    job = Job(
+        job_id=uuid.uuid4().hex,
+        keyword=keyword,
+        priority=priority,
+        status=QUEUED,
+        created_at=now,
+        updated_at=now,
+        dedup_key=key,
+    )
+
+    # The job is stored before it is claimed, so a claimed entry always has a status
+    pipe = cache_client.pipeline(transaction=True)
+    pipe.hset(job_key(job.job_id), mapping=job.to_hash())
+    pipe.expire(job_key(job.job_id), settings.JOB_RESULT_TTL)
+    await pipe.execute()
+
+    # Atomic, so concurrent submissions never both replace a finished job's entry
+    while True:
+        existing_id = await cache_client.eval(_CLAIM_DEDUP_SCRIPT, 1, key, job.job_id, settings.JOB_DEDUP_TTL)
+        if not existing_id:
+            break
+        existing = await load_job(cache_client, existing_id)
+        if existing is not None:
+            await cache_client.delete(job_key(job.job_id))
+            TOP3_JOBS.inc(event="deduplicated")
+            return existing, False
+        # Expired right after the check, claim the entry on the next pass
+
+    await cache_client.xadd(
+        stream_key(priority), {"job_id": job.job_id}, maxlen=settings.JOB_STREAM_MAXLEN, approximate=True
+    )
+
+    TOP3_JOBS.inc(event="submitted")
+    logger.info(f"Queued job {job.job_id} for keyword: {keyword} ({priority})")
+    return job, True
+
+async def record_cached_job(keyword: str, priority: str, data: list, cache_client) -> Job:
+    """
+    Store an already completed job for a keyword answered from the cache
+    Clients get the same job resource whether or not a pipeline run was needed
+    """
+    now = time.time()
+    job = Job(
+        job_id=uuid.uuid4().hex,
+        keyword=keyword,
+        priority=priority,
+        status=SUCCEEDED,
+        created_at=now,
+        updated_at=now,
+        data=data,
+    )
+    await cache_client.hset(job_key(job.job_id), mapping=job.to_hash())
+    await cache_client.expire(job_key(job.job_id), settings.JOB_RESULT_TTL)
+    TOP3_JOBS.inc(event="cached")
+    return job
+
+async def ensure_job_groups(cache_client):
+    """
+    Create the consumer group on every priority stream (idempotent)
+    """
+    for priority in PRIORITIES:
+        try:
+            await cache_client.xgroup_create(stream_key(priority), JOB_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+class JobWorker:
+    """
+    Consumes recommendation jobs from the priority streams
+    Higher priority streams are drained first; failed runs are retried with
+    exponential backoff up to JOB_MAX_ATTEMPTS; jobs left pending by a crashed
+    worker are reclaimed after JOB_VISIBILITY_TIMEOUT
+    """
+
+    def __init__(self, cache_client, concurrency: Optional[int] = None):
+        self.cache_client = cache_client
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        # Strong references to jobs being processed
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def run(self):
+        """
+        Consume jobs until cancelled, then wait for running jobs to finish
+        """
+        await ensure_job_groups(self.cache_client)
+        logger.info(f"Job worker {self.consumer} started (concurrency {self.concurrency})")
+        next_reclaim = 0.0
+        try:
+            while True:
+                free = self.concurrency - len(self._tasks)
+                if free <= 0:
+                    await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                try:
+                    await self.cache_client.eval(
+                        _PROMOTE_SCRIPT, 1, DELAYED_KEY, time.time(), settings.JOB_STREAM_MAXLEN
+                    )
+                    entries = []
+                    if time.monotonic() >= next_reclaim:
+                        entries = await self._reclaim(free)
+                        next_reclaim = time.monotonic() + settings.JOB_VISIBILITY_TIMEOUT / 4
+                    entries = entries or await self._read(free)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Job worker {self.consumer} failed to read jobs: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                for priority, entry_id, job_id in entries:
+                    task = asyncio.create_task(self._process(priority, entry_id, job_id))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+        finally:
+            if self._tasks:
+                # Unacknowledged jobs are reclaimed by another worker if these are cut short
+                await asyncio.wait(self._tasks, timeout=settings.LLM_REQUEST_DEADLINE)
+
+    async def _read(self, count: int) -> List[Tuple[str, str, str]]:
+        # Non-blocking pass in priority order, then block on all streams
+        for priority in PRIORITIES:
+            response = await self.cache_client.xreadgroup(
+                JOB_GROUP, self.consumer, {stream_key(priority): ">"}, count=count
+            )
+            if response:
+                return self._entries(response)
+
+        response = await self.cache_client.xreadgroup(
+            JOB_GROUP, self.consumer, {stream_key(priority): ">" for priority in PRIORITIES},
+            count=count, block=1000
+        )
+        return self._entries(response or [])
+
+    async def _reclaim(self, count: int) -> List[Tuple[str, str, str]]:
+        entries = []
+        for priority in PRIORITIES:
+            response = await self.cache_client.xautoclaim(
+                stream_key(priority), JOB_GROUP, self.consumer,
+                min_idle_time=settings.JOB_VISIBILITY_TIMEOUT * 1000, start_id="0-0", count=count
+            )
+            for entry_id, fields in response[1]:
+                if fields:
+                    TOP3_JOBS.inc(event="reclaimed")
+                    entries.append((priority, entry_id, fields.get("job_id")))
+        return entries
+
+    @staticmethod
+    def _entries(response) -> List[Tuple[str, str, str]]:
+        return [
+            (stream.rsplit(":", 1)[-1], entry_id, fields.get("job_id"))
+            for stream, messages in response
+            for entry_id, fields in messages
+        ]
+
+    async def _ack(self, priority: str, entry_id: str):
+        pipe = self.cache_client.pipeline(transaction=False)
+        pipe.xack(stream_key(priority), JOB_GROUP, entry_id)
+        pipe.xdel(stream_key(priority), entry_id)
+        await pipe.execute()
+
+    async def _process(self, priority: str, entry_id: str, job_id: Optional[str]):
+        job = await load_job(self.cache_client, job_id) if job_id else None
+        if job is None or job.finished:
+            await self._ack(priority, entry_id)
+            return
+
+        await _update_job(self.cache_client, job, settings.JOB_RESULT_TTL, status=RUNNING, attempts=job.attempts + 1)
+        try:
+            async with get_session_factory()() as db:
+                config = await get_config_snapshot(db, self.cache_client)
+            with offline_admission():
+                data = await get_or_compute_recommendations(job.keyword, config, self.cache_client)
+            if data is None:
+                raise ValueError("Pipeline returned no recommendations")
+        except asyncio.CancelledError:
+            # Left pending, another worker reclaims it
+            raise
+        except Exception as e:
+            await self._fail(job, priority, e)
+        else:
+            await _update_job(self.cache_client, job, settings.JOB_RESULT_TTL, status=SUCCEEDED, data=data, error=None)
+            await self._release_dedup(job)
+            TOP3_JOBS.inc(event="succeeded")
+            logger.info(f"Job {job.job_id} succeeded for keyword: {job.keyword}")
+        await self._ack(priority, entry_id)
+
+    async def _fail(self, job: Job, priority: str, error: Exception):
+        if job.attempts < settings.JOB_MAX_ATTEMPTS:
+            delay = settings.JOB_RETRY_BASE_DELAY * 2 ** (job.attempts - 1)
+            if isinstance(error, UpstreamOverloadedError) and error.retry_after:
+                delay = max(delay, error.retry_after)
+            await _update_job(self.cache_client, job, settings.JOB_RESULT_TTL, status=QUEUED, error=str(error))
+            await self.cache_client.zadd(DELAYED_KEY, {f"{priority}:{job.job_id}": time.time() + delay})
+            TOP3_JOBS.inc(event="retried")
+            logger.warning(f"Job {job.job_id} attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+            return
+
+        await _update_job(self.cache_client, job, settings.JOB_RESULT_TTL, status=FAILED, error=str(error))
+        await self._release_dedup(job)
+        TOP3_JOBS.inc(event="failed")
+        logger.error(f"Job {job.job_id} failed after {job.attempts} attempts for keyword {job.keyword}: {error}")
+
+    async def _release_dedup(self, job: Job):
+        if job.dedup_key:
+            await self.cache_client.eval(_RELEASE_DEDUP_SCRIPT, 1, job.dedup_key, job.job_id)
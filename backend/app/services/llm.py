@@ -1,10 +1,72 @@
 import httpx
 import json
 import logging
-from typing import Dict, Any
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.http_client import get_http_client
+from app.core.metrics import LLM_TOKENS
 
 logger = logging.getLogger(__name__)
 
+# Status codes worth retrying or failing over: timeouts, rate limits, overload
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+class LLMAPIError(Exception):
+    """
+    Error from an LLM provider call
+    retryable is set for rate limits, server errors and network failures;
+    retry_after is the provider's requested wait in seconds, if any
+    """
+
+    def __init__(
+        self,
+        message: str,
+        provider: Optional[str] = None,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: bool = False
+    ):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _llm_api_error(provider: str, error: Exception) -> LLMAPIError:
+    """
+    Wrap a failed provider call, classifying whether it is worth retrying
+    """
+    if isinstance(error, LLMAPIError):
+        return error
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return LLMAPIError(
+            f"LLM API error: {str(error)}",
+            provider=provider,
+            status_code=status_code,
+            retry_after=_parse_retry_after(error.response.headers.get("retry-after")),
+            retryable=status_code in RETRYABLE_STATUS_CODES
+        )
+    return LLMAPIError(
+        f"LLM API error: {str(error)}",
+        provider=provider,
+        retryable=isinstance(error, httpx.TransportError)
+    )
+
 async def call_llm_api(
     provider: str,
     api_key: str,
@@ -12,33 +74,104 @@ async def call_llm_api(
     system_prompt: str,
     user_prompt: str,
     tools: list = None,
-    tool_choice: dict = None
+    tool_choice: dict = None,
+    cache_system_prompt: bool = False,
+    cache_tools: bool = False
 ) -> dict:
     """
     Call LLM API (Claude or OpenAI)
+    The cache_* switches mark prompt prefixes cacheable (Anthropic only,
+    OpenAI caches long prefixes automatically)
     """
     if not api_key:
         raise ValueError(f"{provider.upper()}_API_KEY is required")
     
     if provider.lower() == "anthropic":
-        return await call_anthropic_api(api_key, model, system_prompt, user_prompt, tools, tool_choice)
+        return await call_anthropic_api(
+            api_key, model, system_prompt, user_prompt, tools, tool_choice,
+            cache_system_prompt, cache_tools
+        )
     elif provider.lower() == "openai":
         return await call_openai_api(api_key, model, system_prompt, user_prompt, tools, tool_choice)
     else:
         raise ValueError(f"Unsupported LLM provider: {provider}")
 
-async def call_anthropic_api(
+# Marks the end of a cacheable prompt prefix (Anthropic prompt caching)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+def _anthropic_tool(tool: dict) -> dict:
+    """
+    Tool definition in Anthropic format, converted from OpenAI's if needed
+    """
+    if tool.get("type") == "function" and "function" in tool:
+        function = tool["function"]
+        return {
+            "name": function.get("name"),
+            "description": function.get("description", ""),
+            "input_schema": function.get("parameters", {"type": "object", "properties": {}}),
+        }
+    return tool
+
+def _openai_tool(tool: dict) -> dict:
+    """
+    Tool definition in OpenAI format, converted from Anthropic's if needed
+    """
+    if tool.get("type") == "function":
+        return tool
+    return {
+        "type": "function",
+        "function": {
+            "name": tool.get("name"),
+            "description": tool.get("description", ""),
+            "parameters": tool.get("input_schema", {"type": "object", "properties": {}}),
+        },
+    }
+
+def _anthropic_tool_choice(tool_choice):
+    """
+    Tool choice in Anthropic format, converted from OpenAI's if needed
+    """
+    if tool_choice == "required":
+        return {"type": "any"}
+    if tool_choice == "auto":
+        return {"type": "auto"}
+    if isinstance(tool_choice, dict) and tool_choice.get("type") == "function":
+        return {"type": "tool", "name": (tool_choice.get("function") or {}).get("name")}
+    return tool_choice
+
+def _openai_tool_choice(tool_choice):
+    """
+    Tool choice in OpenAI format, converted from Anthropic's if needed
+    """
+    if not isinstance(tool_choice, dict):
+        return tool_choice
+    choice_type = tool_choice.get("type")
+    if choice_type == "tool":
+        return {"type": "function", "function": {"name": tool_choice.get("name")}}
+    if choice_type == "any":
+        return "required"
+    if choice_type in ("auto", "none"):
+        return choice_type
+    return tool_choice
+
+def _build_anthropic_request(
     api_key: str,
     model: str,
     system_prompt: str,
     user_prompt: str,
     tools: list = None,
-    tool_choice: dict = None
-) -> dict:
+    tool_choice: dict = None,
+    cache_system_prompt: bool = False,
+    cache_tools: bool = False
+) -> tuple:
     """
-    Call Anthropic Claude API
+    Build headers and payload for the Anthropic Messages API
+    Tools and tool choice may be given in either provider's format
+    With caching enabled, cache breakpoints are placed after the tool
+    definitions and after the system prompt (the prompt prefix order is
+    tools, system, messages); prefixes below the model's minimum cacheable
+    length are simply not cached
     """
-    url = "https://api.anthropic.com/v1/messages"
     headers = {
         "Content-Type": "application/json",
         "x-api-key": api_key,
@@ -58,39 +191,68 @@ async def call_anthropic_api(
         ]
     }
     
+    if cache_system_prompt and system_prompt:
+        payload["system"] = [
+            {"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}
+        ]
     if tools:
+        tools = [_anthropic_tool(tool) for tool in tools]
+        if cache_tools:
+            tools = tools[:-1] + [{**tools[-1], "cache_control": CACHE_CONTROL}]
         payload["tools"] = tools
     if tool_choice:
-        payload["tool_choice"] = tool_choice
+        payload["tool_choice"] = _anthropic_tool_choice(tool_choice)
+    
+    return headers, payload
+
+async def call_anthropic_api(
+    api_key: str,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    tools: list = None,
+    tool_choice: dict = None,
+    cache_system_prompt: bool = False,
+    cache_tools: bool = False
+) -> dict:
+    """
+    Call Anthropic Claude API
+    """
+    url = "/v1/messages"
+    headers, payload = _build_anthropic_request(
+        api_key, model, system_prompt, user_prompt, tools, tool_choice,
+        cache_system_prompt, cache_tools
+    )
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            
-            logger.info(f"Anthropic API call successful for model: {model}")
-            return data
+        client = get_http_client("anthropic")
+        response = await client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        record_llm_usage("anthropic", extract_usage_from_llm_response(data))
+        
+        logger.info(f"Anthropic API call successful for model: {model}")
+        return data
             
     except httpx.HTTPError as e:
         logger.error(f"HTTP error calling Anthropic API: {e}")
-        raise Exception(f"LLM API error: {str(e)}")
+        raise _llm_api_error("anthropic", e)
     except Exception as e:
         logger.error(f"Unexpected error calling Anthropic API: {e}")
-        raise Exception(f"LLM API error: {str(e)}")
+        raise _llm_api_error("anthropic", e)
 
-async def call_openai_api(
+def _build_openai_request(
     api_key: str,
     model: str,
     system_prompt: str,
     user_prompt: str,
     tools: list = None,
     tool_choice: dict = None
-) -> dict:
+) -> tuple:
     """
-    Call OpenAI API
+    Build headers and payload for the OpenAI Chat Completions API
+    Tools and tool choice may be given in either provider's format
     """
-    url = "https://api.openai.com/v1/chat/completions"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
@@ -113,25 +275,196 @@ async def call_openai_api(
     }
     
     if tools:
-        payload["tools"] = tools
+        payload["tools"] = [_openai_tool(tool) for tool in tools]
     if tool_choice:
-        payload["tool_choice"] = tool_choice
+        payload["tool_choice"] = _openai_tool_choice(tool_choice)
+    
+    return headers, payload
+
+async def call_openai_api(
+    api_key: str,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    tools: list = None,
+    tool_choice: dict = None
+) -> dict:
+    """
+    Call OpenAI API
+    """
+    url = "/v1/chat/completions"
+    headers, payload = _build_openai_request(
+        api_key, model, system_prompt, user_prompt, tools, tool_choice
+    )
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            
-            logger.info(f"OpenAI API call successful for model: {model}")
-            return data
+        client = get_http_client("openai")
+        response = await client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        record_llm_usage("openai", extract_usage_from_llm_response(data))
+        
+        logger.info(f"OpenAI API call successful for model: {model}")
+        return data
             
     except httpx.HTTPError as e:
         logger.error(f"HTTP error calling OpenAI API: {e}")
-        raise Exception(f"LLM API error: {str(e)}")
+        raise _llm_api_error("openai", e)
     except Exception as e:
         logger.error(f"Unexpected error calling OpenAI API: {e}")
-        raise Exception(f"LLM API error: {str(e)}")
+        raise _llm_api_error("openai", e)
+
+async def stream_llm_api(
+    provider: str,
+    api_key: str,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    tools: list = None,
+    tool_choice: dict = None,
+    cache_system_prompt: bool = False,
+    cache_tools: bool = False
+) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of call_llm_api
+    Yields fragments of the tool-use arguments JSON as the model produces them
+    """
+    if not api_key:
+        raise ValueError(f"{provider.upper()}_API_KEY is required")
+    
+    if provider.lower() == "anthropic":
+        headers, payload = _build_anthropic_request(
+            api_key, model, system_prompt, user_prompt, tools, tool_choice,
+            cache_system_prompt, cache_tools
+        )
+        client_name, url = "anthropic", "/v1/messages"
+    elif provider.lower() == "openai":
+        headers, payload = _build_openai_request(
+            api_key, model, system_prompt, user_prompt, tools, tool_choice
+        )
+        client_name, url = "openai", "/v1/chat/completions"
+    else:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+    
+    payload["stream"] = True
+    if client_name == "openai":
+        # Usage is only reported in the final chunk when asked for
+        payload["stream_options"] = {"include_usage": True}
+    
+    usage = {}
+    try:
+        client = get_http_client(client_name)
+        async with client.stream("POST", url, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if not data or data == "[DONE]":
+                    continue
+                
+                event = json.loads(data)
+                _merge_stream_usage(usage, event)
+                fragment = _extract_tool_json_delta(event)
+                if fragment:
+                    yield fragment
+        
+        record_llm_usage(client_name, extract_usage_from_llm_response({"usage": usage}))
+        logger.info(f"{client_name} streaming call completed for model: {model}")
+            
+    except httpx.HTTPError as e:
+        logger.error(f"HTTP error streaming from {client_name} API: {e}")
+        raise _llm_api_error(client_name, e)
+
+def _merge_stream_usage(usage: dict, event: dict):
+    """
+    Collect token usage from streamed events
+    Claude reports input and cache usage in message_start and output tokens
+    in message_delta; OpenAI sends one final chunk carrying usage
+    """
+    if event.get("type") == "message_start":
+        usage.update((event.get("message") or {}).get("usage") or {})
+    elif event.get("usage"):
+        usage.update(event["usage"])
+
+def _extract_tool_json_delta(event: dict) -> str:
+    """
+    Pull the tool arguments fragment out of one streamed event
+    Handles both Claude and OpenAI stream formats
+    """
+    # Claude: content_block_delta with an input_json_delta
+    if event.get("type") == "content_block_delta":
+        delta = event.get("delta", {})
+        if delta.get("type") == "input_json_delta":
+            return delta.get("partial_json", "")
+        return ""
+    
+    # OpenAI: choices[0].delta.tool_calls[].function.arguments
+    choices = event.get("choices") or [{}]
+    tool_calls = choices[0].get("delta", {}).get("tool_calls") or []
+    return "".join(
+        (tool_call.get("function") or {}).get("arguments") or ""
+        for tool_call in tool_calls
+    )
+
+class IncrementalRecommendationParser:
+    """
+    Incremental parser for the report_top3_products arguments JSON
+    Emits each recommendation object as soon as its closing brace arrives
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item_start = None
+
+    def feed(self, fragment: str) -> list:
+        """
+        Consume a JSON fragment and return recommendations completed by it
+        """
+        self.buffer += fragment
+        completed = []
+        
+        while self._pos < len(self.buffer):
+            ch = self.buffer[self._pos]
+            
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                # {"recommendations": [ {item} ]} -> items open at depth 3
+                if ch == "{" and self._depth == 3:
+                    self._item_start = self._pos
+            elif ch in "}]":
+                if ch == "}" and self._depth == 3 and self._item_start is not None:
+                    try:
+                        completed.append(json.loads(self.buffer[self._item_start:self._pos + 1]))
+                    except ValueError as e:
+                        logger.warning(f"Skipping unparseable streamed recommendation: {e}")
+                    self._item_start = None
+                self._depth -= 1
+            
+            self._pos += 1
+        
+        return completed
+
+    def result(self) -> list:
+        """
+        Parse the complete arguments JSON once the stream has finished
+        """
+        if not self.buffer:
+            raise ValueError("Could not extract recommendations from LLM response")
+        return json.loads(self.buffer).get("recommendations", [])
 
 def extract_tool_use_from_llm_response(llm_response: dict) -> list:
     """
@@ -173,6 +506,28 @@ def extract_tool_use_from_llm_response(llm_response: dict) -> list:
         logger.error(f"Error extracting tool use from LLM response: {e}")
         raise Exception(f"Failed to parse LLM response: {str(e)}")
 
+def extract_usage_from_llm_response(llm_response: dict) -> dict:
+    """
+    Extract token usage from an LLM response
+    Handles both Claude and OpenAI response formats
+    """
+    usage = llm_response.get("usage") or {}
+    prompt_details = usage.get("prompt_tokens_details") or {}
+    return {
+        "input_tokens": usage.get("input_tokens", usage.get("prompt_tokens", 0)) or 0,
+        "output_tokens": usage.get("output_tokens", usage.get("completion_tokens", 0)) or 0,
+        "cache_read_input_tokens": usage.get("cache_read_input_tokens", prompt_details.get("cached_tokens", 0)) or 0,
+        "cache_creation_input_tokens": usage.get("cache_creation_input_tokens", 0) or 0,
+    }
+
+def record_llm_usage(provider: str, usage: dict):
+    """
+    Add one call's token usage to the LLM token counters
+    """
+    for token_type, tokens in usage.items():
+        if tokens:
+            LLM_TOKENS.inc(tokens, provider=provider, type=token_type)
+
 async def test_llm_connection(provider: str, api_key: str, model: str) -> bool:
     """
     Test LLM API connection
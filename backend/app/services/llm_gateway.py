@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import AsyncIterator, List
+
+from app.core.circuit_breaker import get_circuit_breaker
+from app.core.config import settings
+from app.core.metrics import LLM_GATEWAY_CALLS
+from app.core.ratelimit import (
+    UpstreamOverloadedError,
+    admission_timeout,
+    offline_admission_timeout,
+    upstream_admission,
+)
+from app.core.tracing import span
+from app.services.llm import LLMAPIError, call_llm_api, stream_llm_api
+
+logger = logging.getLogger(__name__)
+
+def get_llm_candidates(request: dict, config) -> List[dict]:
+    """
+    Ordered (provider, model) attempts for a request: the configured model
+    first, then the LLM_FALLBACKS entries
+    LLM_FALLBACKS is a JSON list of {"provider", "model"} objects; a fallback's
+    key is read from <PROVIDER>_API_KEY, or LLM_API_KEY for the main provider
+    """
+    candidates = [request]
+
+    raw = config.get("LLM_FALLBACKS")
+    try:
+        fallbacks = json.loads(raw) if raw else []
+    except ValueError as e:
+        logger.error(f"Invalid LLM_FALLBACKS configuration: {e}")
+        fallbacks = []
+    if not isinstance(fallbacks, list):
+        logger.error("LLM_FALLBACKS must be a JSON list")
+        fallbacks = []
+
+    primary_provider = (request.get("provider") or "").lower()
+    for fallback in fallbacks:
+        if not isinstance(fallback, dict) or not fallback.get("provider") or not fallback.get("model"):
+            logger.error(f"Skipping invalid LLM_FALLBACKS entry: {fallback}")
+            continue
+        provider = fallback["provider"].lower()
+        api_key = config.get(f"{provider.upper()}_API_KEY")
+        if not api_key and provider == primary_provider:
+            api_key = request.get("api_key")
+        if not api_key:
+            logger.warning(f"Skipping LLM fallback {provider}/{fallback['model']}: no API key configured")
+            continue
+        candidates.append({**request, "provider": provider, "model": fallback["model"], "api_key": api_key})
+
+    return candidates
+
+def llm_deadline() -> float:
+    """
+    Seconds allowed across all attempts; offline callers also get their
+    longer admission wait, so queueing does not eat into the calls' budget
+    """
+    return settings.LLM_REQUEST_DEADLINE + (offline_admission_timeout() or 0.0)
+
+def _backoff(attempt: int, error: LLMAPIError) -> float:
+    """
+    Full-jitter exponential backoff, never shorter than the provider's retry-after
+    """
+    delay = random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt))
+    if error.retry_after is not None:
+        delay = max(delay, error.retry_after)
+    return delay
+
+def _upstream_name(candidate: dict) -> str:
+    return f"{(candidate.get('provider') or '').lower()}:{candidate.get('model')}"
+
+def _breaker(candidate: dict):
+    return get_circuit_breaker(
+        f"llm:{(candidate.get('provider') or '').lower()}",
+        settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+        settings.LLM_CIRCUIT_RESET_TIMEOUT,
+    )
+
+async def call_llm_with_failover(request: dict, config) -> dict:
+    """
+    Call the LLM with retries, circuit breaking and provider failover
+    Retryable errors (429, 5xx, network) are retried on the same provider
+    with jittered backoff up to LLM_MAX_RETRIES times, then the next
+    candidate is tried; everything is bounded by LLM_REQUEST_DEADLINE
+    """
+    deadline = time.monotonic() + llm_deadline()
+    last_error = None
+
+    for candidate in get_llm_candidates(request, config):
+        provider = (candidate.get("provider") or "").lower()
+        breaker = _breaker(candidate)
+        if not breaker.allow():
+            LLM_GATEWAY_CALLS.inc(provider=provider, result="circuit_open")
+            last_error = last_error or LLMAPIError(
+                f"LLM API error: {provider} circuit open", provider=provider, retryable=True
+            )
+            continue
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                with span("llm_attempt", provider=provider, model=candidate.get("model") or "", attempt=attempt):
+                    async with upstream_admission(
+                        _upstream_name(candidate), config.rate_limits,
+                        min(remaining, admission_timeout())
+                    ):
+                        response = await asyncio.wait_for(
+                            call_llm_api(**candidate), max(0.0, deadline - time.monotonic())
+                        )
+            except UpstreamOverloadedError as e:
+                # Shed before sending, says nothing about the provider's health
+                breaker.release_trial()
+                LLM_GATEWAY_CALLS.inc(provider=provider, result="shed")
+                last_error = e
+                break
+            except ValueError as e:
+                # Missing key or unsupported provider, the next candidate may still work
+                breaker.release_trial()
+                LLM_GATEWAY_CALLS.inc(provider=provider, result="error")
+                logger.error(f"Skipping LLM candidate {_upstream_name(candidate)}: {e}")
+                last_error = LLMAPIError(f"LLM API error: {e}", provider=provider)
+                break
+            except asyncio.TimeoutError:
+                breaker.record_failure()
+                LLM_GATEWAY_CALLS.inc(provider=provider, result="timeout")
+                last_error = LLMAPIError(
+                    f"LLM API error: {provider} exceeded the request deadline",
+                    provider=provider, retryable=True
+                )
+                break
+            except LLMAPIError as e:
+                last_error = e
+                if not e.retryable:
+                    # Bad request or credentials, the next provider may still work
+                    breaker.release_trial()
+                    LLM_GATEWAY_CALLS.inc(provider=provider, result="error")
+                    break
+                breaker.record_failure()
+
+                delay = _backoff(attempt, e)
+                if attempt == settings.LLM_MAX_RETRIES or not breaker.allow() or delay >= deadline - time.monotonic():
+                    LLM_GATEWAY_CALLS.inc(provider=provider, result="error")
+                    break
+                LLM_GATEWAY_CALLS.inc(provider=provider, result="retry")
+                logger.warning(f"Retrying {provider} in {delay:.2f}s after: {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            LLM_GATEWAY_CALLS.inc(provider=provider, result="ok" if candidate is request else "fallback")
+            return response
+
+        if time.monotonic() >= deadline:
+            break
+
+    raise last_error or LLMAPIError("LLM API error: no LLM provider available", retryable=True)
+
+# Marks the end of an upstream stream in the fragments queue
+_STREAM_END = object()
+
+async def _read_upstream_stream(candidate: dict, config, timeout: float, fragments: asyncio.Queue):
+    """
+    Read one candidate's stream into fragments, holding its admission slot
+    only until the upstream response is fully read, not until a slow client
+    has consumed it; errors are passed on through the queue
+    """
+    try:
+        async with upstream_admission(_upstream_name(candidate), config.rate_limits, timeout):
+            async for fragment in stream_llm_api(**candidate):
+                fragments.put_nowait(fragment)
+    except Exception as e:
+        fragments.put_nowait(e)
+    else:
+        fragments.put_nowait(_STREAM_END)
+
+async def stream_llm_with_failover(request: dict, config) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of call_llm_with_failover
+    Failover only happens before the first fragment; once output has been
+    yielded an error is raised to the caller
+    """
+    deadline = time.monotonic() + llm_deadline()
+    last_error = None
+
+    for candidate in get_llm_candidates(request, config):
+        provider = (candidate.get("provider") or "").lower()
+        breaker = _breaker(candidate)
+        if not breaker.allow():
+            LLM_GATEWAY_CALLS.inc(provider=provider, result="circuit_open")
+            continue
+        if time.monotonic() >= deadline:
+            break
+
+        started = False
+        fragments = asyncio.Queue()
+        reader = asyncio.create_task(_read_upstream_stream(
+            candidate, config, min(deadline - time.monotonic(), admission_timeout()), fragments
+        ))
+        try:
+            while True:
+                fragment = await fragments.get()
+                if fragment is _STREAM_END:
+                    break
+                if isinstance(fragment, Exception):
+                    raise fragment
+                started = True
+                yield fragment
+        except UpstreamOverloadedError as e:
+            breaker.release_trial()
+            LLM_GATEWAY_CALLS.inc(provider=provider, result="shed")
+            last_error = e
+            continue
+        except ValueError as e:
+            breaker.release_trial()
+            LLM_GATEWAY_CALLS.inc(provider=provider, result="error")
+            if started:
+                raise
+            logger.error(f"Skipping LLM candidate {_upstream_name(candidate)}: {e}")
+            last_error = LLMAPIError(f"LLM API error: {e}", provider=provider)
+            continue
+        except LLMAPIError as e:
+            last_error = e
+            if e.retryable:
+                breaker.record_failure()
+            else:
+                breaker.release_trial()
+            LLM_GATEWAY_CALLS.inc(provider=provider, result="error")
+            if started:
+                raise
+            logger.warning(f"Streaming from {provider} failed, trying next provider: {e}")
+            continue
+        finally:
+            # The caller stopped reading early, stop the upstream read too
+            reader.cancel()
+
+        breaker.record_success()
+        LLM_GATEWAY_CALLS.inc(provider=provider, result="ok" if candidate is request else "fallback")
+        return
+
+    raise last_error or LLMAPIError("LLM API error: no LLM provider available", retryable=True)
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import List
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of normalized keyword -> request count
+POPULARITY_KEY = "stats:keyword_popularity"
+
+# Counts buffered in this worker until the next flush
+_pending: Counter = Counter()
+
+def record_keyword_request(keyword: str):
+    """
+    Count a request for a normalized keyword (no I/O, flushed periodically)
+    """
+    _pending[keyword] += 1
+
+async def flush_keyword_counts(cache_client):
+    """
+    Push buffered counts to Redis and trim the long tail
+    """
+    if not _pending:
+        return
+
+    counts = dict(_pending)
+    _pending.clear()
+
+    try:
+        pipe = cache_client.pipeline(transaction=False)
+        for keyword, count in counts.items():
+            pipe.zincrby(POPULARITY_KEY, count, keyword)
+        # Keep only the most requested keywords
+        pipe.zremrangebyrank(POPULARITY_KEY, 0, -settings.POPULARITY_MAX_KEYWORDS - 1)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to flush keyword popularity: {e}")
+        _pending.update(counts)
+
+async def run_popularity_flusher(cache_client):
+    """
+    Flush keyword counts every POPULARITY_FLUSH_INTERVAL seconds
+    Runs for the lifetime of the application
+    """
+    try:
+        while True:
+            await asyncio.sleep(settings.POPULARITY_FLUSH_INTERVAL)
+            await flush_keyword_counts(cache_client)
+    finally:
+        await flush_keyword_counts(cache_client)
+
+async def get_top_keywords(cache_client, limit: int) -> List[str]:
+    """
+    Most requested normalized keywords, most popular first
+    """
+    return await cache_client.zrevrange(POPULARITY_KEY, 0, limit - 1)
@@ -0,0 +1,80 @@
+import logging
+from typing import List
+
+from app.core.metrics import LLM_PROMPT_CHARS, LLM_PROMPT_REQUESTS, LLM_PROMPT_TOKENS
+from app.utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Snippets are trimmed to fit the budget, but never below this many characters
+MIN_SNIPPET_CHARS = 60
+
+def _clean(text: str) -> str:
+    return " ".join((text or "").split())
+
+def format_search_result(title: str, link: str, snippet: str) -> str:
+    """
+    One result in the line format the prompt template describes:
+    [title] - [link] - [snippet]
+    """
+    return f"{title} - {link} - {snippet}" if snippet else f"{title} - {link}"
+
+def _trim_snippet(snippet: str, max_tokens: int) -> str:
+    """
+    Shorten a snippet to about max_tokens, cutting at a word boundary when there is one
+    """
+    while snippet and estimate_tokens(snippet) > max_tokens:
+        cut = max(0, min(len(snippet) - 1, int(len(snippet) * max_tokens / estimate_tokens(snippet))))
+        shortened = snippet[:cut]
+        if " " in shortened:
+            shortened = shortened.rsplit(" ", 1)[0]
+        snippet = shortened.rstrip(" ,.;:-")
+    return snippet
+
+def pack_search_results(results: list, token_budget: int) -> List[str]:
+    """
+    Render ranked results as compact lines within an estimated token budget
+    Results that do not fit get their snippet trimmed; a result whose snippet
+    would fall under MIN_SNIPPET_CHARS is dropped instead
+    A budget of 0 keeps every result
+    """
+    lines = []
+    used = 0
+    for result in results:
+        title = _clean(result.get("title", ""))
+        link = _clean(result.get("link", ""))
+        snippet = _clean(result.get("snippet", ""))
+
+        line = format_search_result(title, link, snippet)
+        tokens = estimate_tokens(line) + 1  # newline
+        if token_budget and used + tokens > token_budget:
+            head_tokens = estimate_tokens(format_search_result(title, link, "x")) + 1
+            snippet = _trim_snippet(snippet, token_budget - used - head_tokens)
+            if len(snippet) < MIN_SNIPPET_CHARS:
+                continue
+            line = format_search_result(title, link, snippet + "…")
+            tokens = estimate_tokens(line) + 1
+
+        lines.append(line)
+        used += tokens
+    return lines
+
+def assemble_user_prompt(keyword: str, config, search_results: list) -> str:
+    """
+    Build the LLM user prompt from ranked search results
+    Results are packed into SEARCH_TOKEN_BUDGET estimated tokens and the
+    prompt size is recorded per request
+    """
+    token_budget = int(config.get("SEARCH_TOKEN_BUDGET") or 0)
+    lines = pack_search_results(search_results, token_budget)
+    user_prompt = config.render_user_prompt(keyword, "\n".join(lines))
+
+    tokens = estimate_tokens(config.system_prompt or "") + estimate_tokens(user_prompt)
+    LLM_PROMPT_REQUESTS.inc()
+    LLM_PROMPT_CHARS.inc(len(config.system_prompt or "") + len(user_prompt))
+    LLM_PROMPT_TOKENS.inc(tokens)
+    logger.info(
+        f"Prompt for {keyword}: {len(lines)}/{len(search_results)} results, "
+        f"~{tokens} estimated input tokens"
+    )
+    return user_prompt
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from app.services.search import normalize_url, search
+
+logger = logging.getLogger(__name__)
+
+# Used when SEARCH_QUERY_TEMPLATES is missing or invalid
+DEFAULT_QUERY_TEMPLATES = [
+    "best {keyword} reviews {year}",
+    "{keyword} reddit recommendations",
+    "{keyword} comparison vs",
+]
+
+def _parse_json_config(config, key: str, expected_type, default):
+    raw = config.get(key)
+    if not raw:
+        return default
+    try:
+        value = json.loads(raw)
+    except ValueError as e:
+        logger.error(f"Invalid {key} configuration: {e}")
+        return default
+    if not isinstance(value, expected_type):
+        logger.error(f"{key} must be a JSON {expected_type.__name__}")
+        return default
+    return value
+
+def plan_queries(keyword: str, config) -> List[str]:
+    """
+    Expand a normalized keyword into search queries
+    SEARCH_QUERY_TEMPLATES is a JSON list of templates with {keyword} and
+    {year} placeholders; {year} is the current year
+    """
+    templates = _parse_json_config(config, "SEARCH_QUERY_TEMPLATES", list, DEFAULT_QUERY_TEMPLATES)
+    year = datetime.now().year
+
+    queries = []
+    for template in templates:
+        query = " ".join(str(template).replace("{keyword}", keyword).replace("{year}", str(year)).split())
+        if query and query not in queries:
+            queries.append(query)
+    return queries or [f"best {keyword} reviews {year}"]
+
+def domain_authority(url: str, authority: Dict[str, float]) -> float:
+    """
+    Authority weight of a URL's domain, matching parent domains too
+    """
+    host = (urlsplit(url.strip()).hostname or "").removeprefix("www.")
+    while host:
+        if host in authority:
+            return float(authority[host])
+        host = host.partition(".")[2]
+    return 0.0
+
+def rank_search_results(result_lists: List[list], authority: Dict[str, float]) -> list:
+    """
+    Merge results of several queries, best evidence first
+    A URL scores 1 / (1 + position) for every query returning it, plus the
+    authority of its domain; the longest snippet seen for it is kept
+    """
+    merged: Dict[str, dict] = {}
+    scores: Dict[str, float] = {}
+    for results in result_lists:
+        for position, result in enumerate(results):
+            url = normalize_url(result.get("link", ""))
+            if not url:
+                continue
+            if url not in merged:
+                merged[url] = dict(result)
+                scores[url] = domain_authority(result.get("link", ""), authority)
+            elif len(result.get("snippet", "")) > len(merged[url].get("snippet", "")):
+                merged[url]["snippet"] = result["snippet"]
+            scores[url] += 1 / (1 + position)
+
+    return [merged[url] for url in sorted(merged, key=lambda url: scores[url], reverse=True)]
+
+async def gather_search_results(keyword: str, config) -> list:
+    """
+    Search stage: run every planned query concurrently, then rank and
+    de-duplicate the results (packing into the token budget happens when the
+    prompt is assembled)
+    Fails only if every query fails
+    """
+    queries = plan_queries(keyword, config)
+    outcomes = await asyncio.gather(
+        *(search(query, config) for query in queries),
+        return_exceptions=True
+    )
+
+    result_lists = []
+    errors = []
+    for query, outcome in zip(queries, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning(f"Search query failed ({query}): {outcome}")
+            errors.append(outcome)
+        else:
+            result_lists.append(outcome)
+    if not result_lists:
+        raise errors[0]
+
+    authority = _parse_json_config(config, "SEARCH_DOMAIN_AUTHORITY", dict, {})
+    ranked = rank_search_results(result_lists, authority)
+
+    logger.info(
+        f"Search for {keyword}: {len(queries)} queries, {sum(len(r) for r in result_lists)} results, "
+        f"{len(ranked)} unique"
+    )
+    return ranked
@@ -0,0 +1,684 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.core.cache import get_cache
+from app.core.config import settings
+from app.core.metrics import (
+    KEYWORD_NORMALIZATION,
+    TOP3_CACHE_NORMALIZED_HITS,
+    TOP3_CACHE_REQUESTS,
+)
+from app.core.ratelimit import offline_admission, offline_admission_timeout
+from app.core.singleflight import (
+    FlightProgress,
+    SingleFlight,
+    acquire_redis_lock,
+    redis_singleflight,
+    release_redis_lock,
+    renew_redis_lock,
+)
+from app.core.tracing import background_trace, stage
+from app.schemas.top3 import Top3Response
+from app.services import semantic_cache
+from app.services.recommendation_store import load_latest_result, recommendation_writer
+from app.services.llm_gateway import call_llm_with_failover, stream_llm_with_failover
+from app.services.prompt import assemble_user_prompt
+from app.services.query_planner import gather_search_results
+from app.services.llm import (
+    IncrementalRecommendationParser,
+    extract_tool_use_from_llm_response,
+    extract_usage_from_llm_response,
+)
+from app.utils.config_loader import ConfigSnapshot
+from app.utils.keyword import normalize_keyword
+
+logger = logging.getLogger(__name__)
+
+# Coalesces concurrent cache misses within this worker
+_top3_flight = SingleFlight()
+
+# Progress of the pipeline runs started by streaming requests, by cache key
+_pipeline_progress: Dict[str, FlightProgress] = {}
+
+# Strong references to running background refresh tasks
+_refresh_tasks: Set[asyncio.Task] = set()
+
+# Prompt building, extraction and cache writes on top of the search and LLM deadlines
+PIPELINE_SLACK = 5.0
+
+def search_stage_deadline() -> float:
+    """
+    Seconds allowed for the search stage, plus the admission wait of offline callers
+    """
+    return settings.SEARCH_STAGE_DEADLINE + (offline_admission_timeout() or 0.0)
+
+def pipeline_deadline() -> float:
+    """
+    Upper bound in seconds of one interactive pipeline run
+    """
+    return settings.SEARCH_STAGE_DEADLINE + settings.LLM_REQUEST_DEADLINE + PIPELINE_SLACK
+
+def singleflight_lock_ttl() -> int:
+    """
+    Lock TTL for a pipeline run; the holder renews it, so this only bounds
+    how long a crashed holder blocks the keyword
+    """
+    return settings.SINGLEFLIGHT_LOCK_TTL or math.ceil(pipeline_deadline())
+
+def singleflight_wait_timeout() -> float:
+    """
+    How long a worker waits for another worker's run before computing itself
+    """
+    return settings.SINGLEFLIGHT_WAIT_TIMEOUT or singleflight_lock_ttl() + PIPELINE_SLACK
+
+@dataclass
+class CachedRecommendations:
+    """
+    A cached recommendation list and its freshness
+    body is the serialized Top3Response, returned as-is on cache hits
+    """
+    body: str
+    etag: str
+    fresh_until: float
+
+    @classmethod
+    def from_data(cls, data: list, fresh_until: float) -> "CachedRecommendations":
+        body = render_top3_response(data)
+        return cls(body=body, etag=build_etag(body), fresh_until=fresh_until)
+
+    @cached_property
+    def data(self) -> list:
+        return json.loads(self.body)["data"]
+
+    @property
+    def stale(self) -> bool:
+        return time.time() >= self.fresh_until
+
+def render_top3_response(data: list) -> str:
+    """
+    Validate and serialize recommendations exactly as the Top3 endpoint returns them
+    """
+    return Top3Response(status="success", data=data).model_dump_json()
+
+def build_etag(body: str) -> str:
+    return '"' + hashlib.sha1(body.encode("utf-8")).hexdigest()[:20] + '"'
+
+def resolve_keyword(keyword: str, config: ConfigSnapshot) -> str:
+    """
+    Normalize a raw user keyword into its canonical form
+    """
+    normalized = normalize_keyword(keyword, config.keyword_aliases)
+    KEYWORD_NORMALIZATION.inc(changed=str(normalized != keyword.strip()).lower())
+    return normalized
+
+def build_cache_key(keyword: str, config: ConfigSnapshot, version: Optional[str] = None) -> str:
+    """
+    Build the recommendation cache key for a normalized keyword
+    Keys carry the namespace generation and the prompt/model config version,
+    so purges and config edits never serve old output by accident
+    """
+    return f"query:g{config.query_generation}:{version or config.version}:{keyword}"
+
+def query_key_pattern(config: ConfigSnapshot, version: Optional[str] = None) -> str:
+    """
+    SCAN pattern matching every recommendation key of a config version
+    """
+    return f"query:g{config.query_generation}:{version or config.version}:*"
+
+async def get_cached_recommendations(cache_key: str) -> Optional[CachedRecommendations]:
+    """
+    Read cached recommendations, returns None on a miss
+    Entries past the soft TTL are returned with stale=True until the hard TTL
+    """
+    return decode_cached_recommendations(await get_cache().get(cache_key))
+
+async def get_many_cached_recommendations(cache_keys: List[str]) -> List[Optional[CachedRecommendations]]:
+    """
+    Read several cache entries, local hits first and the rest in a single MGET
+    """
+    if not cache_keys:
+        return []
+    return [decode_cached_recommendations(payload) for payload in await get_cache().get_many(cache_keys)]
+
+def decode_cached_recommendations(payload) -> Optional[CachedRecommendations]:
+    """
+    Wrap a decoded cache value, returns None for an empty value
+    """
+    if not payload:
+        return None
+
+    if isinstance(payload, list):
+        # Legacy entry written before soft TTLs, its Redis TTL is at most the old 6 hours
+        return CachedRecommendations.from_data(payload, float("inf"))
+
+    if "body" not in payload:
+        # Entry written before responses were pre-serialized
+        return CachedRecommendations.from_data(payload["data"], payload["fresh_until"])
+
+    return CachedRecommendations(
+        body=payload["body"],
+        etag=payload["etag"],
+        fresh_until=payload["fresh_until"]
+    )
+
+async def get_fresh_recommendations(cache_key: str) -> Optional[list]:
+    """
+    Read cached recommendations only if they are within the soft TTL
+    """
+    cached = await get_cached_recommendations(cache_key)
+    if cached is None or cached.stale:
+        return None
+    return cached.data
+
+async def store_recommendations(
+    cache_key: str,
+    data: list,
+    computed_at: Optional[float] = None
+) -> CachedRecommendations:
+    """
+    Cache recommendations with a soft TTL (fresh) and a hard TTL (Redis expiry)
+    Both are measured from computed_at, which defaults to now
+    The response body is serialized once here so cache hits skip validation
+    """
+    computed_at = computed_at or time.time()
+    cached = CachedRecommendations.from_data(data, computed_at + settings.TOP3_CACHE_SOFT_TTL)
+    payload = {
+        "body": cached.body,
+        "etag": cached.etag,
+        "fresh_until": cached.fresh_until
+    }
+    await get_cache().set(
+        cache_key,
+        payload,
+        ttl=max(1, int(computed_at + settings.TOP3_CACHE_HARD_TTL - time.time()))
+    )
+    return cached
+
+async def get_stored_recommendations(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> Optional[CachedRecommendations]:
+    """
+    Read the newest persisted result within the hard TTL and backfill Redis with it
+    """
+    try:
+        stored = await load_latest_result(keyword, config.version, settings.TOP3_CACHE_HARD_TTL)
+    except Exception as e:
+        logger.error(f"Recommendation store lookup failed for keyword {keyword}: {e}")
+        return None
+    if stored is None:
+        return None
+
+    return await store_recommendations(
+        build_cache_key(keyword, config), stored.data, stored.computed_at
+    )
+
+async def get_rollover_recommendations(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> Optional[CachedRecommendations]:
+    """
+    Read recommendations computed under a previous prompt/model config,
+    the newest version that has the keyword wins (one MGET for all of them)
+    Used during a gradual rollover; callers treat the result as stale
+    """
+    if not config.gradual_rollover or not config.previous_versions:
+        return None
+
+    cache_keys = [build_cache_key(keyword, config, version) for version in config.previous_versions]
+    for cached in await get_many_cached_recommendations(cache_keys):
+        if cached is not None:
+            cached.fresh_until = 0
+            return cached
+    return None
+
+def semantic_cache_enabled(config: ConfigSnapshot) -> bool:
+    """
+    Check whether the semantic near-duplicate tier is switched on
+    """
+    return config.semantic_cache_enabled
+
+async def find_semantic_match(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> Optional[CachedRecommendations]:
+    """
+    Look up recommendations cached for a semantically similar keyword
+    """
+    config_version = config.version
+    similar_keyword = await semantic_cache.find_similar_keyword(
+        cache_client, config_version, keyword, config.keyword_aliases
+    )
+    if similar_keyword is None:
+        return None
+
+    cached = await get_cached_recommendations(build_cache_key(similar_keyword, config))
+    if cached is None:
+        # The entry expired since it was indexed
+        await semantic_cache.remove_keyword(cache_client, config_version, similar_keyword, config.keyword_aliases)
+        return None
+
+    logger.info(f"Semantic cache hit for keyword: {keyword} -> {similar_keyword}")
+    return cached
+
+async def lookup_cached_recommendations(
+    raw_keyword: str,
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> Optional[CachedRecommendations]:
+    """
+    Resolve a keyword from the cache tiers, returns None on a full miss
+    Tiers in order: exact key in Redis (stale entries trigger a background
+    refresh), PostgreSQL store, previous config versions during a gradual
+    rollover, semantic near-duplicate
+    """
+    with stage("cache_lookup") as lookup_span:
+        cached = await _lookup_cache_tiers(raw_keyword, keyword, config, cache_client)
+        if lookup_span is not None:
+            lookup_span.set_attribute("hit", cached is not None)
+        return cached
+
+async def _lookup_cache_tiers(
+    raw_keyword: str,
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> Optional[CachedRecommendations]:
+    # 1. Exact key
+    cached_result = await get_cached_recommendations(build_cache_key(keyword, config))
+    if cached_result is not None:
+        if keyword != raw_keyword.strip():
+            TOP3_CACHE_NORMALIZED_HITS.inc()
+        if cached_result.stale:
+            # Serve the stale entry now and refresh it in the background
+            logger.info(f"Stale cache hit for keyword: {keyword}")
+            TOP3_CACHE_REQUESTS.inc(result="stale")
+            schedule_refresh(keyword, config, cache_client)
+        else:
+            logger.info(f"Cache hit for keyword: {keyword}")
+            TOP3_CACHE_REQUESTS.inc(result="hit")
+        return cached_result
+
+    return await lookup_fallback_tiers(keyword, config, cache_client)
+
+async def lookup_fallback_tiers(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> Optional[CachedRecommendations]:
+    """
+    The cache tiers behind the exact Redis key, for callers that already
+    missed it (batches read the exact keys with one MGET)
+    """
+    # 2. Persisted result in PostgreSQL (survives Redis evictions and restarts)
+    stored_result = await get_stored_recommendations(keyword, config, cache_client)
+    if stored_result is not None:
+        logger.info(f"Database hit for keyword: {keyword}")
+        TOP3_CACHE_REQUESTS.inc(result="database")
+        if stored_result.stale:
+            schedule_refresh(keyword, config, cache_client)
+        return stored_result
+
+    # 3. During a gradual rollover, serve a previous config's result while refreshing
+    rollover_result = await get_rollover_recommendations(keyword, config, cache_client)
+    if rollover_result is not None:
+        logger.info(f"Rollover cache hit for keyword: {keyword}")
+        TOP3_CACHE_REQUESTS.inc(result="rollover")
+        schedule_refresh(keyword, config, cache_client)
+        return rollover_result
+
+    # 4. Recommendations cached for a near-duplicate keyword
+    if semantic_cache_enabled(config):
+        similar_result = await find_semantic_match(keyword, config, cache_client)
+        if similar_result is not None:
+            TOP3_CACHE_REQUESTS.inc(result="semantic")
+            return similar_result
+
+    TOP3_CACHE_REQUESTS.inc(result="miss")
+    return None
+
+async def search_keyword(keyword: str, config: ConfigSnapshot) -> list:
+    """
+    Search stage: fetch web results for a normalized keyword
+    """
+    logger.info(f"Searching for keyword: {keyword}")
+    deadline = search_stage_deadline()
+    try:
+        return await asyncio.wait_for(gather_search_results(keyword, config), deadline)
+    except asyncio.TimeoutError:
+        raise Exception(f"Search API error: no results within {deadline}s")
+
+def build_user_prompt(keyword: str, config: ConfigSnapshot, search_results: list) -> str:
+    """
+    Prompt stage: render the user prompt from the search results
+    """
+    logger.info(f"Preparing LLM prompt for keyword: {keyword}")
+    if config.tool_definition is None:
+        raise ValueError("LLM_TOOL_DEFINITION is not configured")
+
+    return assemble_user_prompt(keyword, config, search_results)
+
+def _llm_request(config: ConfigSnapshot, user_prompt: str) -> dict:
+    return {
+        "provider": config.get("LLM_PROVIDER"),
+        "api_key": config.get("LLM_API_KEY"),
+        "model": config.get("LLM_MODEL_NAME"),
+        "system_prompt": config.system_prompt,
+        "user_prompt": user_prompt,
+        "tools": [config.tool_definition],
+        "tool_choice": { "type": "tool", "name": "report_top3_products" },
+        "cache_system_prompt": config.cache_system_prompt,
+        "cache_tools": config.cache_tools,
+    }
+
+async def save_recommendations(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client,
+    data: list
+):
+    """
+    Cache stage: store a computed result and index it for semantic lookups
+    """
+    await store_recommendations(build_cache_key(keyword, config), data)
+    recommendation_writer.enqueue(keyword, config.version, data)
+    if semantic_cache_enabled(config):
+        await semantic_cache.add_keyword(cache_client, config.version, keyword, config.keyword_aliases)
+
+async def compute_top3_recommendations(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client,
+    usage: Optional[dict] = None,
+    progress: Optional[FlightProgress] = None
+) -> list:
+    """
+    Run the full search + LLM pipeline for a normalized keyword and cache the result
+    When a usage dict is passed, the LLM token counts are added to it. When
+    progress is passed, the LLM response is streamed and "search" and
+    "recommendation" events are published to it as they become available
+    """
+    # 1. Search phase
+    with stage("search"):
+        search_results = await search_keyword(keyword, config)
+    if progress is not None:
+        progress.publish("search", {"results": len(search_results)})
+
+    # 2. Prepare prompt
+    with stage("prompt_build"):
+        user_prompt = build_user_prompt(keyword, config, search_results)
+
+    # 3. LLM analysis phase
+    if progress is None:
+        logger.info(f"Calling LLM for keyword: {keyword}")
+        with stage("llm_call"):
+            llm_response_json = await call_llm_with_failover(_llm_request(config, user_prompt), config)
+        if usage is not None:
+            for name, tokens in extract_usage_from_llm_response(llm_response_json).items():
+                usage[name] = usage.get(name, 0) + tokens
+
+        # 4. Extract results
+        logger.info(f"Extracting results for keyword: {keyword}")
+        with stage("extraction"):
+            final_data = extract_tool_use_from_llm_response(llm_response_json)
+    else:
+        logger.info(f"Streaming LLM response for keyword: {keyword}")
+        parser = IncrementalRecommendationParser()
+        with stage("llm_call"):
+            async for fragment in stream_llm_with_failover(_llm_request(config, user_prompt), config):
+                for item in parser.feed(fragment):
+                    progress.publish("recommendation", item)
+
+        # 4. Extract results
+        with stage("extraction"):
+            final_data = parser.result()
+
+    # 5. Cache results
+    with stage("cache_write"):
+        await save_recommendations(keyword, config, cache_client, final_data)
+
+    logger.info(f"Successfully processed keyword: {keyword}")
+    return final_data
+
+async def stream_top3_recommendations(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of the pipeline, yields (event, data) pairs:
+    "search" once results are in, "recommendation" per parsed item, then "done"
+    The pipeline runs as the keyword's shared single-flight call, this only
+    follows its progress: a disconnecting client does not cancel the run
+    """
+    cache_key = build_cache_key(keyword, config)
+
+    progress = _pipeline_progress.get(cache_key)
+    if progress is None and not _top3_flight.inflight(cache_key):
+        progress = _pipeline_progress[cache_key] = FlightProgress()
+    flight = _start_pipeline(keyword, config, cache_client, progress)
+
+    streamed = False
+    if progress is not None:
+        async for event, data in progress.follow():
+            streamed = streamed or event == "recommendation"
+            yield event, data
+
+    final_data = await asyncio.shield(flight)
+    if final_data is None:
+        # Joined a background refresh that ended without a fresh result
+        final_data = await get_or_compute_recommendations(keyword, config, cache_client)
+    if not streamed:
+        # Computed by another worker or joined without progress, send the result
+        for item in final_data:
+            yield "recommendation", item
+    yield "done", final_data
+
+async def _run_pipeline_locked(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client,
+    progress: Optional[FlightProgress] = None
+) -> list:
+    """
+    Run the pipeline for a keyword under its Redis lock, or wait for the
+    worker holding the lock to publish the result
+    """
+    cache_key = build_cache_key(keyword, config)
+
+    async def read_result():
+        return await get_fresh_recommendations(cache_key)
+
+    async def run_pipeline():
+        # Another worker may have filled the cache just before we took the lock
+        cached = await read_result()
+        if cached is not None:
+            return cached
+        return await compute_top3_recommendations(keyword, config, cache_client, progress=progress)
+
+    try:
+        return await redis_singleflight(
+            cache_client,
+            cache_key,
+            run_pipeline,
+            read_result,
+            lock_ttl=singleflight_lock_ttl(),
+            wait_timeout=singleflight_wait_timeout(),
+            poll_interval=settings.SINGLEFLIGHT_POLL_INTERVAL
+        )
+    finally:
+        if progress is not None:
+            progress.close()
+            if _pipeline_progress.get(cache_key) is progress:
+                del _pipeline_progress[cache_key]
+
+def _start_pipeline(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client,
+    progress: Optional[FlightProgress] = None
+) -> asyncio.Future:
+    """
+    Start the keyword's single-flight pipeline run, or join the one in flight
+    """
+    return _top3_flight.start(
+        build_cache_key(keyword, config),
+        lambda: _run_pipeline_locked(keyword, config, cache_client, progress)
+    )
+
+async def get_or_compute_recommendations(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client
+) -> list:
+    """
+    Resolve recommendations for a keyword on a cache miss
+    Only one pipeline run per keyword is in flight: concurrent requests in
+    this worker share one call, and workers coordinate through a Redis lock
+    """
+    # Shield so a disconnecting caller does not cancel the shared call
+    result = await asyncio.shield(_start_pipeline(keyword, config, cache_client))
+    if result is None:
+        # Joined a background refresh that ended without a fresh result
+        # (busy elsewhere or failed); the Redis lock still coordinates these retries
+        result = await _run_pipeline_locked(keyword, config, cache_client)
+    return result
+
+async def refresh_recommendations(
+    keyword: str,
+    config: ConfigSnapshot,
+    cache_client,
+    usage: Optional[dict] = None
+) -> str:
+    """
+    Recompute a keyword unless it is fresh or another worker is computing it
+    Returns "computed", "fresh" or "busy"
+    """
+    cache_key = build_cache_key(keyword, config)
+
+    # Skip if another worker is already computing this keyword
+    lock_ttl = singleflight_lock_ttl()
+    token = await acquire_redis_lock(cache_client, cache_key, lock_ttl)
+    if not token:
+        logger.debug(f"Refresh already running elsewhere for keyword: {keyword}")
+        return "busy"
+
+    try:
+        if await get_fresh_recommendations(cache_key) is not None:
+            return "fresh"
+
+        async with renew_redis_lock(cache_client, cache_key, token, lock_ttl):
+            await compute_top3_recommendations(keyword, config, cache_client, usage)
+        return "computed"
+    finally:
+        await release_redis_lock(cache_client, cache_key, token)
+
+def schedule_refresh(keyword: str, config: ConfigSnapshot, cache_client):
+    """
+    Refresh a stale keyword in the background, at most once at a time per keyword
+    """
+    cache_key = build_cache_key(keyword, config)
+    if _top3_flight.inflight(cache_key):
+        return
+
+    async def run_refresh() -> Optional[list]:
+        # Cache misses may join this call, so hand them the fresh result
+        try:
+            with background_trace("top3_refresh", keyword=keyword) as trace:
+                status = await refresh_recommendations(keyword, config, cache_client)
+                trace.root.set_attribute("refresh.status", status)
+            if status == "computed":
+                logger.info(f"Background refresh completed for keyword: {keyword}")
+            return await get_fresh_recommendations(cache_key)
+        except Exception as e:
+            # The stale entry keeps being served until its hard TTL
+            logger.error(f"Background refresh failed for keyword {keyword}: {e}")
+            return None
+
+    task = asyncio.create_task(_top3_flight.do(cache_key, run_refresh))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+async def batch_recommendations(
+    raw_keywords: List[str],
+    config: ConfigSnapshot,
+    cache_client
+) -> AsyncIterator[dict]:
+    """
+    Resolve many keywords, yielding one result per normalized keyword as it completes
+    Cache hits come from a single MGET; misses go through the remaining
+    cache tiers (lookup_fallback_tiers), then run through the pipeline with
+    bounded concurrency and per-provider rate limits
+    """
+    # 1. Normalize and de-duplicate, remembering which inputs map to each keyword
+    inputs: Dict[str, List[str]] = {}
+    for raw_keyword in raw_keywords:
+        keyword = resolve_keyword(raw_keyword, config)
+        if not keyword:
+            yield {"keyword": raw_keyword, "inputs": [raw_keyword], "status": "error", "detail": "Empty keyword"}
+            continue
+        inputs.setdefault(keyword, []).append(raw_keyword)
+
+    keywords = list(inputs)
+
+    # 2. Cache hits in one round trip
+    cached_entries = await get_many_cached_recommendations(
+        [build_cache_key(keyword, config) for keyword in keywords]
+    )
+
+    misses = []
+    for keyword, cached in zip(keywords, cached_entries):
+        if cached is None:
+            misses.append(keyword)
+            continue
+
+        if cached.stale:
+            TOP3_CACHE_REQUESTS.inc(result="stale")
+            schedule_refresh(keyword, config, cache_client)
+        else:
+            TOP3_CACHE_REQUESTS.inc(result="hit")
+        yield {"keyword": keyword, "inputs": inputs[keyword], "status": "success", "cached": True, "data": cached.data}
+
+    if not misses:
+        return
+
+    # 3. Remaining cache tiers, then pipeline runs for the misses
+    logger.info(f"Batch resolving {len(misses)} of {len(keywords)} keywords")
+    # Provider limits are enforced on every upstream call (app.core.ratelimit)
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+
+    async def run(keyword: str) -> dict:
+        async with semaphore:
+            try:
+                # Same tier order as single lookups: store, rollover, semantic
+                cached = await lookup_fallback_tiers(keyword, config, cache_client)
+                if cached is not None:
+                    return {"keyword": keyword, "inputs": inputs[keyword], "status": "success", "cached": True, "data": cached.data}
+
+                # Batches prefer queueing for provider capacity to being shed
+                with offline_admission():
+                    data = await get_or_compute_recommendations(keyword, config, cache_client)
+                return {"keyword": keyword, "inputs": inputs[keyword], "status": "success", "cached": False, "data": data}
+            except Exception as e:
+                logger.error(f"Batch error for keyword {keyword}: {e}")
+                return {"keyword": keyword, "inputs": inputs[keyword], "status": "error", "detail": str(e)}
+
+    tasks = [asyncio.create_task(run(keyword)) for keyword in misses]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # The client went away, stop the remaining pipeline runs
+        for task in tasks:
+            task.cancel()
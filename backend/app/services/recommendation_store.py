@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.core.database import get_session_factory
+from app.models.recommendation import Recommendation
+
+logger = logging.getLogger(__name__)
+
+# Column limits, rows are fitted to them before queueing so one oversized
+# value cannot fail a whole batch insert
+KEYWORD_MAX_LENGTH = Recommendation.__table__.c.keyword.type.length
+PRODUCT_NAME_MAX_LENGTH = Recommendation.__table__.c.product_name.type.length
+
+@dataclass
+class StoredResult:
+    """
+    One persisted pipeline result
+    """
+    result_id: str
+    keyword: str
+    config_version: str
+    created_at: datetime
+    data: list
+
+    @property
+    def age(self) -> float:
+        return (datetime.utcnow() - self.created_at).total_seconds()
+
+    @property
+    def computed_at(self) -> float:
+        return time.time() - self.age
+
+class RecommendationWriter:
+    """
+    Persists computed results off the request path
+    Results are queued and written in batches by a background task
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+
+    def enqueue(self, keyword: str, config_version: str, data: list):
+        """
+        Queue a result for insertion, never blocks the caller
+        """
+        if not settings.RECOMMENDATION_STORE_ENABLED or self._queue is None:
+            return
+        if len(keyword) > KEYWORD_MAX_LENGTH:
+            # A truncated keyword would never be looked up again
+            logger.warning(f"Keyword too long to store, skipping result for keyword: {keyword[:50]}...")
+            return
+
+        result = StoredResult(
+            result_id=uuid.uuid4().hex,
+            keyword=keyword,
+            config_version=config_version,
+            created_at=datetime.utcnow(),
+            data=data
+        )
+        try:
+            self._queue.put_nowait(result)
+        except asyncio.QueueFull:
+            logger.warning(f"Recommendation store queue full, dropping result for keyword: {keyword}")
+
+    async def run(self):
+        """
+        Write queued results in batches until cancelled, then drain the queue
+        Runs for the lifetime of the application
+        """
+        self._queue = asyncio.Queue(maxsize=settings.RECOMMENDATION_STORE_QUEUE_SIZE)
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = time.monotonic() + settings.RECOMMENDATION_STORE_FLUSH_INTERVAL
+                while len(batch) < settings.RECOMMENDATION_STORE_BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._write(batch)
+        finally:
+            remaining = []
+            while not self._queue.empty():
+                remaining.append(self._queue.get_nowait())
+            if remaining:
+                await self._write(remaining)
+            self._queue = None
+
+    async def _write(self, batch: List[StoredResult]):
+        try:
+            await self._insert(batch)
+            logger.debug(f"Stored {len(batch)} recommendation results")
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Failed to store recommendation result for keyword {batch[0].keyword}: {e}")
+                return
+            logger.warning(f"Failed to store {len(batch)} recommendation results, retrying one by one: {e}")
+
+        # Isolate the failing result so the rest of the batch is still stored
+        for result in batch:
+            await self._write([result])
+
+    async def _insert(self, batch: List[StoredResult]):
+        rows = [
+            {
+                "result_id": result.result_id,
+                "keyword": result.keyword,
+                "config_version": result.config_version,
+                "rank": item.get("rank", position + 1),
+                "product_name": (item.get("product_name") or "")[:PRODUCT_NAME_MAX_LENGTH],
+                "description": item.get("description", ""),
+                "source_link": item.get("source_link", ""),
+                "created_at": result.created_at,
+            }
+            for result in batch
+            for position, item in enumerate(result.data)
+        ]
+        if not rows:
+            return
+
+        async with get_session_factory()() as session:
+            await session.execute(insert(Recommendation), rows)
+            await session.commit()
+
+# Global writer, started in the application lifespan
+recommendation_writer = RecommendationWriter()
+
+def _group_results(rows) -> List[StoredResult]:
+    results = {}
+    for row in rows:
+        result = results.get(row.result_id)
+        if result is None:
+            result = results[row.result_id] = StoredResult(
+                result_id=row.result_id,
+                keyword=row.keyword,
+                config_version=row.config_version,
+                created_at=row.created_at,
+                data=[]
+            )
+        result.data.append({
+            "rank": row.rank,
+            "product_name": row.product_name,
+            "description": row.description,
+            "source_link": row.source_link,
+        })
+
+    for result in results.values():
+        result.data.sort(key=lambda item: item["rank"])
+    return list(results.values())
+
+async def load_latest_result(keyword: str, config_version: str, max_age: float) -> Optional[StoredResult]:
+    """
+    Newest stored result for a keyword and config version, if younger than max_age
+    """
+    if not settings.RECOMMENDATION_STORE_ENABLED:
+        return None
+
+    async with get_session_factory()() as session:
+        latest = await session.execute(
+            select(Recommendation.result_id)
+            .where(
+                Recommendation.keyword == keyword,
+                Recommendation.config_version == config_version,
+                Recommendation.created_at >= datetime.utcfromtimestamp(time.time() - max_age),
+            )
+            .order_by(Recommendation.created_at.desc())
+            .limit(1)
+        )
+        result_id = latest.scalar_one_or_none()
+        if result_id is None:
+            return None
+
+        rows = await session.execute(
+            select(Recommendation).where(Recommendation.result_id == result_id)
+        )
+        results = _group_results(rows.scalars())
+
+    return results[0] if results else None
+
+async def load_result_history(keyword: str, limit: int = 20) -> List[StoredResult]:
+    """
+    Stored results for a keyword across config versions, newest first
+    """
+    async with get_session_factory()() as session:
+        latest = await session.execute(
+            select(Recommendation.result_id, Recommendation.created_at)
+            .where(Recommendation.keyword == keyword)
+            .group_by(Recommendation.result_id, Recommendation.created_at)
+            .order_by(Recommendation.created_at.desc())
+            .limit(limit)
+        )
+        result_ids = [row.result_id for row in latest]
+        if not result_ids:
+            return []
+
+        rows = await session.execute(
+            select(Recommendation).where(Recommendation.result_id.in_(result_ids))
+        )
+        results = _group_results(rows.scalars())
+
+    return sorted(results, key=lambda result: result.created_at, reverse=True)
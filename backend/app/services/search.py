@@ -1,17 +1,29 @@
+import asyncio
 import httpx
 import json
 import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app.core.cache import get_cache
+from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.metrics import SEARCH_CACHE_REQUESTS, SEARCH_HEDGES, SEARCH_PROVIDER_REQUESTS
+from app.core.ratelimit import UpstreamOverloadedError, offline_admission_timeout, upstream_admission
+from app.core.tracing import span
 
 logger = logging.getLogger(__name__)
 
-async def call_serper_api(query: str, api_key: str) -> dict:
+async def call_serper_api(query: str, api_key: str, gl: str = "us", hl: str = "en") -> dict:
     """
     Call Serper.dev API for web search
     """
     if not api_key:
         raise ValueError("SERPER_API_KEY is required")
     
-    url = "https://google.serper.dev/search"
+    url = "/search"
     headers = {
         "Content-Type": "application/json",
         "X-API-KEY": api_key
@@ -19,28 +31,28 @@ async def call_serper_api(query: str, api_key: str) -> dict:
     
     payload = {
         "q": query,
-        "gl": "us",
-        "hl": "en",
+        "gl": gl,
+        "hl": hl,
         "num": 10
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Format results for LLM
-            formatted_results = []
-            for result in data.get("organic", []):
-                formatted_results.append({
-                    "title": result.get("title", ""),
-                    "link": result.get("link", ""),
-                    "snippet": result.get("snippet", "")
-                })
-            
-            logger.info(f"Serper API returned {len(formatted_results)} results for query: {query}")
-            return formatted_results
+        client = get_http_client("serper")
+        response = await client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        
+        # Format results for LLM
+        formatted_results = []
+        for result in data.get("organic", []):
+            formatted_results.append({
+                "title": result.get("title", ""),
+                "link": result.get("link", ""),
+                "snippet": result.get("snippet", "")
+            })
+        
+        logger.info(f"Serper API returned {len(formatted_results)} results for query: {query}")
+        return formatted_results
             
     except httpx.HTTPError as e:
         logger.error(f"HTTP error calling Serper API: {e}")
@@ -49,42 +61,309 @@ async def call_serper_api(query: str, api_key: str) -> dict:
         logger.error(f"Unexpected error calling Serper API: {e}")
         raise Exception(f"Search API error: {str(e)}")
 
-async def call_google_custom_search_api(query: str, api_key: str, search_engine_id: str) -> dict:
+async def call_google_custom_search_api(
+    query: str,
+    api_key: str,
+    search_engine_id: str,
+    gl: str = "us",
+    hl: str = "en"
+) -> dict:
     """
     Call Google Custom Search API (alternative to Serper)
     """
     if not api_key or not search_engine_id:
         raise ValueError("GOOGLE_API_KEY and SEARCH_ENGINE_ID are required")
     
-    url = f"https://www.googleapis.com/customsearch/v1"
+    url = "/customsearch/v1"
     params = {
         "key": api_key,
         "cx": search_engine_id,
         "q": query,
+        "gl": gl,
+        "hl": hl,
         "num": 10
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Format results for LLM
-            formatted_results = []
-            for result in data.get("items", []):
-                formatted_results.append({
-                    "title": result.get("title", ""),
-                    "link": result.get("link", ""),
-                    "snippet": result.get("snippet", "")
-                })
-            
-            logger.info(f"Google Custom Search returned {len(formatted_results)} results for query: {query}")
-            return formatted_results
+        client = get_http_client("google")
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        
+        # Format results for LLM
+        formatted_results = []
+        for result in data.get("items", []):
+            formatted_results.append({
+                "title": result.get("title", ""),
+                "link": result.get("link", ""),
+                "snippet": result.get("snippet", "")
+            })
+        
+        logger.info(f"Google Custom Search returned {len(formatted_results)} results for query: {query}")
+        return formatted_results
             
     except httpx.HTTPError as e:
         logger.error(f"HTTP error calling Google Custom Search API: {e}")
         raise Exception(f"Search API error: {str(e)}")
     except Exception as e:
         logger.error(f"Unexpected error calling Google Custom Search API: {e}")
-        raise Exception(f"Search API error: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Search API error: {str(e)}")
+
+
+# Search orchestration across providers
+
+# Recent latencies kept per provider for the hedge threshold
+LATENCY_WINDOW = 200
+# Hedge delay used until a provider has enough samples
+DEFAULT_HEDGE_DELAY = 1.5
+MIN_LATENCY_SAMPLES = 20
+
+# Query parameters that only track the referrer
+_TRACKING_PARAMS = {"gclid", "fbclid", "ref", "ref_src", "spm"}
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies for one provider
+    """
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float, default: float) -> float:
+        if len(self._samples) < MIN_LATENCY_SAMPLES:
+            return default
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+_latencies: Dict[str, LatencyTracker] = {}
+
+def search_locale(config) -> Tuple[str, str]:
+    """
+    (country, language) from the SEARCH_LOCALE config value, e.g. "us-en"
+    """
+    country, _, language = (config.get("SEARCH_LOCALE") or "us-en").lower().partition("-")
+    return country or "us", language or "en"
+
+def _serper_search(query: str, config) -> Awaitable[list]:
+    gl, hl = search_locale(config)
+    return call_serper_api(query, config.get("SERPER_API_KEY"), gl, hl)
+
+def _google_search(query: str, config) -> Awaitable[list]:
+    gl, hl = search_locale(config)
+    return call_google_custom_search_api(
+        query, config.get("GOOGLE_API_KEY"), config.get("SEARCH_ENGINE_ID"), gl, hl
+    )
+
+# Provider name -> (search function, config keys it needs)
+SEARCH_PROVIDERS: Dict[str, Tuple[Callable[[str, Any], Awaitable[list]], Tuple[str, ...]]] = {
+    "serper": (_serper_search, ("SERPER_API_KEY",)),
+    "google": (_google_search, ("GOOGLE_API_KEY", "SEARCH_ENGINE_ID")),
+}
+
+def get_search_providers(config) -> List[str]:
+    """
+    Configured providers in preference order
+    SEARCH_PROVIDER is a provider name or a comma-separated list; providers
+    without credentials are skipped unless none has any
+    """
+    names = [
+        name.strip().lower()
+        for name in (config.get("SEARCH_PROVIDER") or "serper").split(",")
+        if name.strip().lower() in SEARCH_PROVIDERS
+    ] or ["serper"]
+    configured = [
+        name for name in names
+        if all(config.get(key) for key in SEARCH_PROVIDERS[name][1])
+    ]
+    # Let the first provider raise its own missing-credentials error
+    return configured or names[:1]
+
+def normalize_url(link: str) -> str:
+    """
+    Canonical form of a result URL used to de-duplicate across providers
+    """
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    ])
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, ""))
+
+def merge_search_results(result_lists: List[list], limit: int = 10) -> list:
+    """
+    Interleave provider results by rank, dropping duplicate URLs
+    """
+    merged = []
+    seen = set()
+    for position in range(max((len(results) for results in result_lists), default=0)):
+        for results in result_lists:
+            if position >= len(results):
+                continue
+            result = results[position]
+            url = normalize_url(result.get("link", ""))
+            if url in seen:
+                continue
+            seen.add(url)
+            merged.append(result)
+    return merged[:limit]
+
+def search_cache_key(provider: str, query: str, locale: Tuple[str, str]) -> str:
+    """
+    Cache key of one provider's results for a query
+    Independent of the prompt/model config, so results survive prompt edits
+    """
+    return f"search:{provider}:{'-'.join(locale)}:{' '.join(query.casefold().split())}"
+
+async def _get_cached_search(cache_key: str) -> Optional[list]:
+    try:
+        return await get_cache().get(cache_key)
+    except Exception as e:
+        logger.warning(f"Search cache read failed for {cache_key}: {e}")
+        return None
+
+async def _store_search(cache_key: str, results: list):
+    try:
+        await get_cache().set(cache_key, results, ttl=settings.SEARCH_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Search cache write failed for {cache_key}: {e}")
+
+async def _call_provider(name: str, query: str, config, deadline: float) -> list:
+    """
+    Call one provider within its deadline and record its latency
+    Non-empty results are cached for SEARCH_CACHE_TTL seconds
+    """
+    cache_key = search_cache_key(name, query, search_locale(config))
+    if settings.SEARCH_CACHE_TTL > 0:
+        cached = await _get_cached_search(cache_key)
+        if cached is not None:
+            SEARCH_CACHE_REQUESTS.inc(provider=name, result="hit")
+            return cached
+        SEARCH_CACHE_REQUESTS.inc(provider=name, result="miss")
+
+    search_fn = SEARCH_PROVIDERS[name][0]
+    offline_admission = offline_admission_timeout()
+    expires_at = time.monotonic() + deadline
+    with span("search_provider", provider=name, query=query):
+        try:
+            # The deadline covers waiting for admission as well as the call itself,
+            # except for offline callers, which may queue longer for admission
+            async with upstream_admission(name, config.rate_limits, offline_admission or deadline):
+                started = time.monotonic()
+                if offline_admission is not None:
+                    expires_at = started + deadline
+                results = await asyncio.wait_for(search_fn(query, config), max(0.0, expires_at - started))
+        except asyncio.TimeoutError:
+            SEARCH_PROVIDER_REQUESTS.inc(provider=name, result="timeout")
+            raise Exception(f"Search API error: {name} timed out after {deadline:.1f}s")
+        except asyncio.CancelledError:
+            SEARCH_PROVIDER_REQUESTS.inc(provider=name, result="cancelled")
+            raise
+        except UpstreamOverloadedError:
+            SEARCH_PROVIDER_REQUESTS.inc(provider=name, result="shed")
+            raise
+        except Exception:
+            SEARCH_PROVIDER_REQUESTS.inc(provider=name, result="error")
+            raise
+
+    _latencies.setdefault(name, LatencyTracker()).record(time.monotonic() - started)
+    SEARCH_PROVIDER_REQUESTS.inc(provider=name, result="ok" if results else "empty")
+    if results and settings.SEARCH_CACHE_TTL > 0:
+        await _store_search(cache_key, results)
+    return results
+
+async def _first_good(tasks: List[asyncio.Task], timeout: Optional[float] = None) -> Optional[list]:
+    """
+    Wait for the first task returning a non-empty result list
+    Returns None once every task has finished without one, or after timeout
+    """
+    pending = {task for task in tasks if not task.done()}
+    for task in tasks:
+        if task.done() and not task.cancelled() and task.exception() is None and task.result():
+            return task.result()
+
+    expires_at = None if timeout is None else time.monotonic() + timeout
+    while pending:
+        remaining = None if expires_at is None else expires_at - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return None
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None and task.result():
+                return task.result()
+    return None
+
+def _all_failed(tasks: List[asyncio.Task]) -> Exception:
+    """
+    Error for a search where every provider failed
+    If all of them were shed, the shedding error is kept so callers can answer 429/503
+    """
+    errors = [
+        task.exception() for task in tasks
+        if task.done() and not task.cancelled() and task.exception() is not None
+    ]
+    if errors and all(isinstance(error, UpstreamOverloadedError) for error in errors):
+        return errors[0]
+    return Exception(f"Search API error: all providers failed ({'; '.join(str(error) for error in errors)})")
+
+async def search(query: str, config) -> list:
+    """
+    Run a web search across the configured providers
+    SEARCH_STRATEGY:
+      single   - first provider only
+      parallel - all providers at once, results merged by normalized URL
+      hedged   - first provider, plus the next one if the first is slower
+                 than its SEARCH_HEDGE_PERCENTILE latency; first good answer wins
+    Every provider call is bounded by SEARCH_PROVIDER_TIMEOUT seconds
+    """
+    providers = get_search_providers(config)
+    strategy = (config.get("SEARCH_STRATEGY") or "single").lower()
+    deadline = float(config.get("SEARCH_PROVIDER_TIMEOUT") or 10)
+
+    if strategy == "single" or len(providers) == 1:
+        return await _call_provider(providers[0], query, config, deadline)
+
+    if strategy == "parallel":
+        tasks = [asyncio.create_task(_call_provider(name, query, config, deadline)) for name in providers]
+        try:
+            await asyncio.wait(tasks)
+        finally:
+            # Only has an effect when the caller is cancelled while waiting
+            for task in tasks:
+                task.cancel()
+        result_lists = [task.result() for task in tasks if task.exception() is None]
+        if not result_lists:
+            raise _all_failed(tasks)
+        return merge_search_results(result_lists)
+
+    # Hedged: start providers one at a time, each after the previous one's tail latency
+    percentile = float(config.get("SEARCH_HEDGE_PERCENTILE") or 95)
+    tasks: List[asyncio.Task] = []
+    try:
+        for index, name in enumerate(providers):
+            tasks.append(asyncio.create_task(_call_provider(name, query, config, deadline)))
+            if index == len(providers) - 1:
+                break
+
+            hedge_delay = _latencies.get(name, LatencyTracker()).percentile(percentile, DEFAULT_HEDGE_DELAY)
+            results = await _first_good(tasks, hedge_delay)
+            if results is not None:
+                return results
+            # Slow or failed so far, start the next provider as well
+            SEARCH_HEDGES.inc(provider=providers[index + 1])
+            logger.info(f"Hedging search for {query!r} to {providers[index + 1]}")
+
+        results = await _first_good(tasks)
+        if results is not None:
+            return results
+        if any(task.exception() is None for task in tasks):
+            return []
+        raise _all_failed(tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
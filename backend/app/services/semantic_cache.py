@@ -0,0 +1,127 @@
+import logging
+import re
+from typing import FrozenSet, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Words that do not change which products a keyword asks for
+STOPWORDS = frozenset({
+    "a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "with",
+    "best", "top", "good", "great", "recommended", "review", "reviews", "buy",
+    "最好", "推荐", "的",
+})
+
+# Words users swap freely, mapped to one canonical term
+SYNONYMS = {
+    "cheap": "budget",
+    "affordable": "budget",
+    "inexpensive": "budget",
+    "low-cost": "budget",
+    "便宜": "budget",
+}
+
+_REPEATED_LETTER = re.compile(r"([a-z])\1+")
+
+# Compare-and-delete so a worker never drops a mapping another worker just replaced
+_REMOVE_KEYWORD_SCRIPT = """
+if redis.call("hget", KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call("hdel", KEYS[1], ARGV[1])
+else
+    return 0
+end
+"""
+
+def stem(word: str) -> str:
+    """
+    Light stemming for latin words so spelling variants share one term
+    Repeated letters collapse ("cancelling" and "canceling") and plurals lose
+    their ending ("keyboards", "batteries"); other scripts are left as is
+    """
+    if not (word.isascii() and word.isalpha()):
+        return word
+    word = _REPEATED_LETTER.sub(r"\1", word)
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def keyword_terms(keyword: str, aliases: Optional[Mapping[str, str]] = None) -> FrozenSet[str]:
+    """
+    The set of meaningful words of a normalized keyword
+    Stopwords are dropped and each word goes through the keyword aliases,
+    SYNONYMS and stem, so word order, filler words, synonyms and spelling
+    variants do not matter
+    """
+    words = keyword.split()
+    if aliases:
+        words = [part for word in words for part in aliases.get(word, word).split()]
+
+    terms = set()
+    for word in words:
+        word = SYNONYMS.get(word, word)
+        if word not in STOPWORDS:
+            terms.add(stem(word))
+    return frozenset(terms)
+
+def canonical_key(keyword: str, aliases: Optional[Mapping[str, str]] = None) -> str:
+    """
+    Key shared by all keywords that ask for the same products, empty when
+    the keyword has no meaningful words
+    """
+    return " ".join(sorted(keyword_terms(keyword, aliases)))
+
+def _index_key(config_version: str) -> str:
+    return f"semantic:keywords:{config_version}"
+
+async def find_similar_keyword(
+    cache_client,
+    config_version: str,
+    keyword: str,
+    aliases: Optional[Mapping[str, str]] = None
+) -> Optional[str]:
+    """
+    Find a cached keyword with the same canonical key, so its
+    recommendations can be reused ("gaming laptop bag" never answers
+    "gaming laptop": the terms differ)
+    """
+    key = canonical_key(keyword, aliases)
+    if not key:
+        return None
+
+    match = await cache_client.hget(_index_key(config_version), key)
+    if match is None or match == keyword:
+        return None
+    return match
+
+async def add_keyword(
+    cache_client,
+    config_version: str,
+    keyword: str,
+    aliases: Optional[Mapping[str, str]] = None
+):
+    """
+    Register a freshly cached keyword under its canonical key
+    """
+    from app.core.config import settings
+
+    key = canonical_key(keyword, aliases)
+    if not key:
+        return
+
+    index_key = _index_key(config_version)
+    await cache_client.hset(index_key, key, keyword)
+    await cache_client.expire(index_key, settings.TOP3_CACHE_HARD_TTL)
+
+async def remove_keyword(
+    cache_client,
+    config_version: str,
+    keyword: str,
+    aliases: Optional[Mapping[str, str]] = None
+):
+    """
+    Drop a keyword whose cache entry has expired
+    """
+    key = canonical_key(keyword, aliases)
+    if key:
+        await cache_client.eval(_REMOVE_KEYWORD_SCRIPT, 1, _index_key(config_version), key, keyword)
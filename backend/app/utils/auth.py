@@ -1,5 +1,5 @@
 import bcrypt
-import jwt
+from jose import ExpiredSignatureError, JWTError, jwt
 from datetime import datetime, timedelta
 from app.core.config import settings
 
@@ -40,9 +40,9 @@ def verify_access_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.ADMIN_PASSWORD, algorithms=["HS256"])
         return payload
-    except jwt.ExpiredSignatureError:
+    except ExpiredSignatureError:
         raise Exception("Token has expired")
-    except jwt.InvalidTokenError:
+    except JWTError:
         raise Exception("Invalid token")
 
 def hash_password(password: str) -> str:
@@ -1,16 +1,40 @@
+import asyncio
+import hashlib
 import json
 import logging
+import time
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Tuple
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.cache import get_redis_client
+from app.core.cache import bump_generation, generation_key, get_redis_client
+from app.core.config import settings
+from app.core.tracing import stage
+from app.core.ratelimit import parse_rate_limits
 from app.models.configuration import Configuration
+from app.utils.keyword import parse_keyword_aliases
 
 logger = logging.getLogger(__name__)
 
+# Shared Redis copy of the configuration table
+CONFIG_CACHE_KEY = "app:config"
+# Generation of the config namespace, bumped on every settings update so
+# workers can detect stale snapshots
+CONFIG_EPOCH_KEY = generation_key("config")
+# Generation of the recommendation namespace, bumped to purge all recommendations
+QUERY_GENERATION_KEY = generation_key("query")
+# Config versions whose recommendations are served while the current one
+# warms up, newest first and comma-separated
+PREVIOUS_VERSIONS_KEY = "cache:query:previous_versions"
+# Pub/sub channel announcing settings updates
+CONFIG_CHANNEL = "app:config:changed"
+
 async def load_app_config(db: AsyncSession, cache_client) -> dict:
     """
     Load application configuration from database with caching
     """
-    cache_key = "app:config"
+    cache_key = CONFIG_CACHE_KEY
     
     # Try to get from cache first
     cached_config = await cache_client.get(cache_key)
@@ -20,7 +44,7 @@ async def load_app_config(db: AsyncSession, cache_client) -> dict:
     
     # Load from database
     logger.info("Loading configuration from database")
-    result = await db.execute("SELECT key, value FROM configuration WHERE value IS NOT NULL")
+    result = await db.execute(text("SELECT key, value FROM configuration WHERE value IS NOT NULL"))
     config_data = result.fetchall()
     
     # Convert to dictionary
@@ -34,13 +58,281 @@ async def load_app_config(db: AsyncSession, cache_client) -> dict:
     logger.info(f"Loaded {len(config)} configuration items")
     return config
 
+# Config keys that change the recommendations the pipeline produces
+RECOMMENDATION_CONFIG_KEYS = (
+    "LLM_PROVIDER",
+    "LLM_MODEL_NAME",
+    "LLM_SYSTEM_PROMPT",
+    "LLM_USER_PROMPT_TEMPLATE",
+    "LLM_TOOL_DEFINITION",
+    "LLM_FALLBACKS",
+    "SEARCH_QUERY_TEMPLATES",
+    "SEARCH_TOKEN_BUDGET",
+)
+
+def get_config_version(config: dict) -> str:
+    """
+    Short hash of the prompt/model configuration, used to version cache keys
+    """
+    digest = hashlib.sha256()
+    for key in RECOMMENDATION_CONFIG_KEYS:
+        digest.update(key.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update((config.get(key) or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:12]
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Immutable, pre-parsed view of the configuration table
+    Built once per change and shared by every request in the worker
+    """
+    values: Mapping[str, str]
+    version: str
+    epoch: Optional[str]
+    query_generation: str
+    previous_versions: Tuple[str, ...]
+    system_prompt: Optional[str]
+    tool_definition: Optional[dict]
+    keyword_aliases: Mapping[str, str]
+    semantic_cache_enabled: bool
+    gradual_rollover: bool
+    rate_limits: Mapping[str, dict]
+    cache_system_prompt: bool = False
+    cache_tools: bool = False
+    generations: tuple = ()
+    loaded_at: float = field(default_factory=time.monotonic)
+    _template_parts: Tuple[str, ...] = ()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.values.get(key, default)
+
+    def render_user_prompt(self, keyword: str, search_results: str) -> str:
+        """
+        Fill the pre-split user prompt template
+        """
+        parts = []
+        for part in self._template_parts:
+            if part == "[USER_KEYWORD]":
+                parts.append(keyword)
+            elif part == "[SEARCH_RESULTS]":
+                parts.append(search_results)
+            else:
+                parts.append(part)
+        return "".join(parts)
+
+def _split_template(template: str) -> Tuple[str, ...]:
+    parts = [template]
+    for placeholder in ("[USER_KEYWORD]", "[SEARCH_RESULTS]"):
+        split_parts = []
+        for part in parts:
+            if part in ("[USER_KEYWORD]", "[SEARCH_RESULTS]"):
+                split_parts.append(part)
+                continue
+            pieces = part.split(placeholder)
+            for i, piece in enumerate(pieces):
+                if i:
+                    split_parts.append(placeholder)
+                split_parts.append(piece)
+        parts = split_parts
+    return tuple(part for part in parts if part)
+
+def build_config_snapshot(
+    config: dict,
+    epoch: Optional[str] = None,
+    query_generation: Optional[str] = None,
+    previous_versions: Optional[str] = None
+) -> ConfigSnapshot:
+    """
+    Parse raw configuration values into a ConfigSnapshot
+    """
+    tool_definition = None
+    if config.get("LLM_TOOL_DEFINITION"):
+        try:
+            tool_definition = json.loads(config["LLM_TOOL_DEFINITION"])
+        except ValueError as e:
+            logger.error(f"Invalid LLM_TOOL_DEFINITION configuration: {e}")
+
+    def enabled(key: str) -> bool:
+        return (config.get(key) or "").lower() in ("1", "true", "yes")
+
+    version = get_config_version(config)
+    gradual_rollover = (config.get("CACHE_ROLLOVER_MODE") or "gradual").lower() == "gradual"
+
+    return ConfigSnapshot(
+        values=MappingProxyType(dict(config)),
+        version=version,
+        epoch=epoch,
+        query_generation=query_generation or "0",
+        previous_versions=tuple(
+            previous for previous in (previous_versions or "").split(",") if previous and previous != version
+        ),
+        system_prompt=config.get("LLM_SYSTEM_PROMPT"),
+        tool_definition=tool_definition,
+        keyword_aliases=MappingProxyType(parse_keyword_aliases(config.get("KEYWORD_ALIASES"))),
+        semantic_cache_enabled=enabled("SEMANTIC_CACHE_ENABLED"),
+        gradual_rollover=gradual_rollover,
+        rate_limits=MappingProxyType(parse_rate_limits(config.get("PROVIDER_RATE_LIMITS"))),
+        cache_system_prompt=enabled("LLM_CACHE_SYSTEM_PROMPT"),
+        cache_tools=enabled("LLM_CACHE_TOOLS"),
+        generations=(epoch, query_generation, previous_versions),
+        _template_parts=_split_template(config.get("LLM_USER_PROMPT_TEMPLATE") or ""),
+    )
+
+class ConfigStore:
+    """
+    Per-worker holder of the current ConfigSnapshot
+    Invalidated by pub/sub notifications; the epoch counter is re-checked
+    after CONFIG_SNAPSHOT_MAX_AGE in case a notification was missed
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._dirty = True
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._dirty = True
+
+    async def _read_generations(self, cache_client) -> tuple:
+        return tuple(await cache_client.mget(
+            CONFIG_EPOCH_KEY, QUERY_GENERATION_KEY, PREVIOUS_VERSIONS_KEY
+        ))
+
+    async def get(self, db: AsyncSession, cache_client) -> ConfigSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._dirty:
+            if time.monotonic() - snapshot.loaded_at < settings.CONFIG_SNAPSHOT_MAX_AGE:
+                return snapshot
+
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and not self._dirty:
+                if time.monotonic() - snapshot.loaded_at < settings.CONFIG_SNAPSHOT_MAX_AGE:
+                    return snapshot
+                # Safety net: keep the snapshot if no generation has moved
+                if await self._read_generations(cache_client) == snapshot.generations:
+                    self._snapshot = snapshot = replace(snapshot, loaded_at=time.monotonic())
+                    return snapshot
+
+            self._dirty = False
+            epoch, query_generation, previous_versions = await self._read_generations(cache_client)
+            config = await load_app_config(db, cache_client)
+            self._snapshot = build_config_snapshot(config, epoch, query_generation, previous_versions)
+            logger.info(f"Configuration snapshot loaded (version {self._snapshot.version})")
+            return self._snapshot
+
+# Global config store for this worker
+config_store = ConfigStore()
+
+async def get_config_snapshot(db: AsyncSession, cache_client) -> ConfigSnapshot:
+    """
+    Get the current configuration snapshot, no I/O unless it was invalidated
+    """
+    with stage("config_load"):
+        return await config_store.get(db, cache_client)
+
+async def notify_config_change(cache_client, message: str = ""):
+    """
+    Ask every worker to rebuild its snapshot (e.g. after a generation bump)
+    """
+    await cache_client.publish(CONFIG_CHANNEL, message)
+    config_store.invalidate()
+
+async def publish_config_change(cache_client):
+    """
+    Announce a settings update to every worker
+    Only the config namespace is invalidated
+    """
+    await cache_client.delete(CONFIG_CACHE_KEY)
+    epoch = await bump_generation(cache_client, "config")
+    await notify_config_change(cache_client, str(epoch))
+
+def preview_config_update(current: ConfigSnapshot, updates: dict) -> dict:
+    """
+    Describe which cache namespaces a settings update will invalidate
+    """
+    changed_keys = sorted(
+        key for key, value in updates.items() if current.values.get(key) != value
+    )
+    new_config = {**current.values, **updates}
+    new_version = get_config_version(new_config)
+    recommendations_affected = new_version != current.version
+    rollover_mode = (new_config.get("CACHE_ROLLOVER_MODE") or "gradual").lower()
+
+    namespaces = ["config"] if changed_keys else []
+    if recommendations_affected:
+        namespaces.append("query")
+
+    return {
+        "changed_keys": changed_keys,
+        "namespaces": namespaces,
+        "current_version": current.version,
+        "new_version": new_version,
+        "recommendations_affected": recommendations_affected,
+        "rollover_mode": rollover_mode,
+    }
+
+async def apply_config_update(cache_client, current: ConfigSnapshot, updates: dict) -> dict:
+    """
+    Invalidate caches after a settings update has been committed
+    Prompt/model changes move recommendations to a new config version; in
+    gradual mode the previous versions keep being served until refreshed,
+    so quick successive changes (A -> B -> C) still fall back to A while
+    neither B nor C has a result for a keyword
+    """
+    plan = preview_config_update(current, updates)
+
+    if plan["recommendations_affected"]:
+        if plan["rollover_mode"] == "gradual":
+            versions = [current.version, *current.previous_versions]
+            versions = [version for version in versions if version != plan["new_version"]]
+            await cache_client.set(
+                PREVIOUS_VERSIONS_KEY,
+                ",".join(versions[:settings.CACHE_ROLLOVER_MAX_VERSIONS]),
+                ex=settings.TOP3_CACHE_HARD_TTL
+            )
+        else:
+            await cache_client.delete(PREVIOUS_VERSIONS_KEY)
+
+    await publish_config_change(cache_client)
+    return plan
+
+async def listen_for_config_changes(cache_client):
+    """
+    Invalidate this worker's snapshot whenever settings change
+    Runs for the lifetime of the application
+    """
+    while True:
+        pubsub = cache_client.pubsub()
+        try:
+            await pubsub.subscribe(CONFIG_CHANNEL)
+            # Updates may have been missed while (re)connecting
+            config_store.invalidate()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    logger.info(f"Configuration changed ({message.get('data')})")
+                    config_store.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Configuration listener error: {e}")
+            config_store.invalidate()
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
 async def get_default_config() -> dict:
     """
     Get default configuration values
     """
     return {
         # API Configuration
-        "SEARCH_PROVIDER": "serper",
+        "SEARCH_PROVIDER": "serper",  # or a fallback list, e.g. "serper,google"
         "LLM_PROVIDER": "anthropic",
         "LLM_MODEL_NAME": "claude-3-opus-20240229",
         
@@ -105,7 +397,61 @@ async def get_default_config() -> dict:
   }
 }""",
         
+        # LLM failover, JSON list of {"provider": ..., "model": ...} tried in order
+        # after LLM_PROVIDER/LLM_MODEL_NAME; keys come from <PROVIDER>_API_KEY
+        "LLM_FALLBACKS": "[]",
+        
+        # Anthropic prompt caching of the static prompt prefix
+        "LLM_CACHE_SYSTEM_PROMPT": "true",
+        "LLM_CACHE_TOOLS": "true",
+        
+        # Keyword aliases, JSON object mapping alias -> canonical keyword
+        "KEYWORD_ALIASES": "{}",
+        
+        # Recommendation rollover after prompt/model changes:
+        # "gradual" serves previous results until refreshed, "immediate" drops them
+        "CACHE_ROLLOVER_MODE": "gradual",
+        
+        # Per-provider (or "provider:model") limits: calls per second and burst
+        # across all workers, calls in flight per worker. Unlisted providers are
+        # unlimited; set these from the account's quotas, e.g.
+        # {"anthropic": {"rate": 50, "burst": 50, "concurrency": 32}}
+        "PROVIDER_RATE_LIMITS": "{}",
+        
+        # Search orchestration: "single", "parallel" or "hedged"
+        "SEARCH_STRATEGY": "hedged",
+        "SEARCH_HEDGE_PERCENTILE": "95",
+        "SEARCH_PROVIDER_TIMEOUT": "8",
+        "SEARCH_LOCALE": "us-en",  # country-language passed to search providers
+        
+        # Query planning: templates ({keyword}, {year}), domain weights, result token budget
+        "SEARCH_QUERY_TEMPLATES": """[
+  "best {keyword} reviews {year}",
+  "{keyword} reddit recommendations",
+  "{keyword} comparison vs"
+]""",
+        "SEARCH_DOMAIN_AUTHORITY": """{
+  "rtings.com": 3,
+  "consumerreports.org": 3,
+  "nytimes.com": 3,
+  "theverge.com": 2,
+  "techradar.com": 2,
+  "tomsguide.com": 2,
+  "pcmag.com": 2,
+  "cnet.com": 2,
+  "reddit.com": 2,
+  "zhihu.com": 2,
+  "smzdm.com": 2
+}""",
+        "SEARCH_TOKEN_BUDGET": "1500",
+        
+        # Semantic near-duplicate cache
+        # A hit needs the same meaningful words (semantic_cache.keyword_terms)
+        "SEMANTIC_CACHE_ENABLED": "false",
+        
         # Default API keys (empty)
         "SERPER_API_KEY": "",
+        "GOOGLE_API_KEY": "",
+        "SEARCH_ENGINE_ID": "",
         "LLM_API_KEY": ""
     }
\ No newline at end of file
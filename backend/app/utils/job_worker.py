@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import logging
+
+async def run_worker(args):
+    """
+    Consume async recommendation jobs until interrupted
+    Runs separately from the API so both can be scaled independently
+    """
+    from app.core.cache import get_cache, get_redis_client, init_cache
+    from app.core.database import init_db
+    from app.core.http_client import close_http_clients, init_http_clients
+    from app.services.jobs import JobWorker
+    from app.services.recommendation_store import recommendation_writer
+    from app.utils.config_loader import listen_for_config_changes
+
+    await init_db()
+    await init_cache()
+    await init_http_clients()
+    cache_client = get_redis_client()
+
+    # Same background tasks as an API worker: config changes, cache coherence, persistence
+    background = [
+        asyncio.create_task(listen_for_config_changes(cache_client)),
+        asyncio.create_task(get_cache().listen_for_invalidations(cache_client)),
+        asyncio.create_task(recommendation_writer.run()),
+    ]
+
+    # JobWorker.run logs the consumer name and concurrency once it is consuming
+    worker = JobWorker(cache_client, args.concurrency)
+    try:
+        await worker.run()
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await close_http_clients()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Consume async Top3 recommendation jobs")
+    parser.add_argument("--concurrency", type=int, default=0, help="Jobs in flight (default JOB_WORKER_CONCURRENCY)")
+    parser.add_argument("--log-level", default="INFO", help="Logging level")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(run_worker(args))
+    except KeyboardInterrupt:
+        pass
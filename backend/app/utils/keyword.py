@@ -0,0 +1,62 @@
+import json
+import logging
+import re
+import unicodedata
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Punctuation kept because it changes meaning (c++, c#, 2.5)
+_KEEP_CHARS = {"+", "#", "."}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# A dot is only meaningful between digits ("2.5"), anywhere else it is a separator
+_STRAY_DOT_RE = re.compile(r"(?<!\d)\.|\.(?!\d)")
+# Spaces between CJK characters carry no meaning ("无线 耳机" == "无线耳机")
+_CJK_SPACE_RE = re.compile(r"(?<=[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]) (?=[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af])")
+
+def _fold_punctuation(text: str) -> str:
+    return "".join(
+        " " if unicodedata.category(ch)[0] in ("P", "S") and ch not in _KEEP_CHARS else ch
+        for ch in text
+    )
+
+def normalize_keyword(keyword: str, aliases: Optional[Dict[str, str]] = None) -> str:
+    """
+    Normalize a user keyword into its canonical cache form
+    NFKC (folds full-width to half-width), case folding, punctuation and
+    whitespace collapsing, then an optional alias lookup
+    """
+    text = unicodedata.normalize("NFKC", keyword).casefold()
+    text = _fold_punctuation(text)
+    text = _STRAY_DOT_RE.sub(" ", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    text = _CJK_SPACE_RE.sub("", text)
+
+    if aliases:
+        text = aliases.get(text, text)
+
+    return text
+
+def parse_keyword_aliases(raw: Optional[str]) -> Dict[str, str]:
+    """
+    Parse the KEYWORD_ALIASES config value (JSON object alias -> canonical)
+    Both sides are normalized so aliases match whatever form users type
+    """
+    if not raw:
+        return {}
+
+    try:
+        table = json.loads(raw)
+    except ValueError as e:
+        logger.error(f"Invalid KEYWORD_ALIASES configuration: {e}")
+        return {}
+
+    if not isinstance(table, dict):
+        logger.error("KEYWORD_ALIASES must be a JSON object")
+        return {}
+
+    return {
+        normalize_keyword(alias): normalize_keyword(canonical)
+        for alias, canonical in table.items()
+    }
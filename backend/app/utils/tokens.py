@@ -0,0 +1,17 @@
+import re
+
+# CJK, kana and hangul: roughly one token per character
+_WIDE_CHAR_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+# Average characters per token for Latin text in common BPE vocabularies
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the LLM token count of a text without calling a tokenizer
+    Meant for budgeting prompt sections, not for billing
+    """
+    if not text:
+        return 0
+    wide = len(_WIDE_CHAR_RE.findall(text))
+    return wide + (len(text) - wide + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import os
+from typing import List
+
+async def load_keywords(args, cache_client) -> List[str]:
+    """
+    Keywords to warm: from a file (one per line) or the most requested ones
+    """
+    from app.services.popularity import get_top_keywords
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return await get_top_keywords(cache_client, args.top)
+
+def new_progress() -> dict:
+    return {"done": [], "failed": {}, "usage": {"input_tokens": 0, "output_tokens": 0}}
+
+def load_progress(path: str) -> dict:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return new_progress()
+
+def save_progress(path: str, progress: dict):
+    if not path:
+        return
+    # Write atomically so an interrupted run never leaves a corrupt file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(progress, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+async def warm_cache(args):
+    """
+    Pre-populate recommendation cache entries for popular keywords
+    """
+    from app.core.cache import init_cache, get_redis_client
+    from app.core.database import init_db, get_session_factory
+    from app.core.http_client import close_http_clients
+    from app.core.ratelimit import offline_admission
+    from app.services.recommendation import refresh_recommendations, resolve_keyword
+    from app.services.recommendation_store import recommendation_writer
+    from app.utils.config_loader import get_config_snapshot
+
+    await init_db()
+    await init_cache()
+    cache_client = get_redis_client()
+
+    # Persist computed results like an API worker does
+    writer = asyncio.create_task(recommendation_writer.run())
+
+    async with get_session_factory()() as db:
+        config = await get_config_snapshot(db, cache_client)
+
+    progress = load_progress(args.progress)
+    if progress.get("config_version") not in (None, config.version):
+        # Prompts or model changed since the last run, start over
+        print("ℹ️  Configuration changed since the last run, ignoring saved progress")
+        progress = new_progress()
+    progress["config_version"] = config.version
+    done = set(progress["done"])
+    usage = progress["usage"]
+
+    keywords = []
+    for raw_keyword in await load_keywords(args, cache_client):
+        keyword = resolve_keyword(raw_keyword, config)
+        if keyword and keyword not in done and keyword not in keywords:
+            keywords.append(keyword)
+
+    print(f"🔥 Warming {len(keywords)} keywords ({len(done)} already done)")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    budget_exhausted = asyncio.Event()
+
+    def tokens_used() -> int:
+        return usage["input_tokens"] + usage["output_tokens"]
+
+    async def warm(keyword: str):
+        async with semaphore:
+            if budget_exhausted.is_set():
+                return
+            if args.token_budget and tokens_used() >= args.token_budget:
+                budget_exhausted.set()
+                return
+
+            try:
+                with offline_admission():
+                    status = await refresh_recommendations(keyword, config, cache_client, usage)
+                # "busy" keywords are being computed elsewhere and may still fail,
+                # leave them for the next run
+                if status != "busy":
+                    progress["done"].append(keyword)
+                    progress["failed"].pop(keyword, None)
+                print(f"  {status:<8} {keyword}")
+            except Exception as e:
+                progress["failed"][keyword] = str(e)
+                print(f"  failed   {keyword}: {e}")
+
+            save_progress(args.progress, progress)
+
+    try:
+        await asyncio.gather(*(warm(keyword) for keyword in keywords))
+    finally:
+        # Cancelling the writer flushes the results still queued
+        writer.cancel()
+        await asyncio.gather(writer, return_exceptions=True)
+        await close_http_clients()
+
+    if budget_exhausted.is_set():
+        print(f"⚠️  Token budget of {args.token_budget} reached, rerun to resume")
+    print(f"✅ Warm-up finished: {len(progress['done'])} done, {len(progress['failed'])} failed, "
+          f"{tokens_used()} tokens used")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-populate the Top3 recommendation cache")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--file", help="Keyword list file, one keyword per line")
+    source.add_argument("--top", type=int, default=500, help="Warm the N most requested keywords")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pipeline runs in parallel")
+    parser.add_argument("--token-budget", type=int, default=0, help="Stop after this many LLM tokens (0 = unlimited)")
+    parser.add_argument("--progress", default="warm_cache_progress.json", help="Progress file used to resume")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(warm_cache(parse_args()))
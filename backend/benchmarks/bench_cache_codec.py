@@ -0,0 +1,77 @@
+"""
+Cache codec benchmark
+
+Encodes synthetic recommendation cache values with the legacy JSON format and
+the binary format and compares bytes per key and encode/decode time. Values
+have the stored shape {"body", "etag", "fresh_until"}, where body is the
+pre-serialized Top3Response JSON string.
+
+    cd backend && python -m benchmarks.bench_cache_codec --keys 10000
+"""
+import argparse
+import json
+import random
+import time
+
+from app.core.cache import BinaryCodec, JsonCodec, zstandard
+from app.services.recommendation import CachedRecommendations
+
+WORDS = [
+    "wireless", "noise", "cancelling", "battery", "comfortable", "premium", "sound", "quality",
+    "design", "lightweight", "durable", "value", "reviewers", "praise", "excellent", "fit",
+    "降噪", "续航", "音质", "舒适", "性价比", "轻便",
+]
+
+def synthetic_payload(rng: random.Random) -> dict:
+    data = [
+        {
+            "rank": rank,
+            "product_name": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 6))).title(),
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))),
+            "source_link": f"https://www.example.com/reviews/{rng.randint(0, 10**9)}",
+        }
+        for rank in (1, 2, 3)
+    ]
+    # Same value as store_recommendations writes
+    cached = CachedRecommendations.from_data(data, time.time() + 21600)
+    return {"body": cached.body, "etag": cached.etag, "fresh_until": cached.fresh_until}
+
+def measure(codec, payloads: list) -> dict:
+    started = time.perf_counter()
+    encoded = [codec.encode(payload) for payload in payloads]
+    encode_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for raw in encoded:
+        codec.decode(raw)
+    decode_seconds = time.perf_counter() - started
+
+    sizes = [len(raw.encode("utf-8") if isinstance(raw, str) else raw) for raw in encoded]
+    return {
+        "bytes_per_key": round(sum(sizes) / len(sizes)),
+        "encode_us": round(encode_seconds / len(payloads) * 1e6, 1),
+        "decode_us": round(decode_seconds / len(payloads) * 1e6, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=10000, help="Number of cached payloads")
+    parser.add_argument("--compress-min-bytes", type=int, default=1024, help="Compression threshold")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    payloads = [synthetic_payload(rng) for _ in range(args.keys)]
+
+    legacy = measure(JsonCodec(), payloads)
+    binary = measure(BinaryCodec(args.compress_min_bytes), payloads)
+
+    print(json.dumps({
+        "keys": args.keys,
+        "compression": "zstd" if zstandard is not None else "zlib",
+        "legacy_json": legacy,
+        "binary": binary,
+        "size_ratio": round(binary["bytes_per_key"] / legacy["bytes_per_key"], 3),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Prompt size benchmark
+
+Compares the search-results section of the LLM user prompt rendered as
+indented JSON (previous format) and as compact lines packed into a token budget.
+
+    cd backend && python -m benchmarks.bench_prompt_size --results 30 --budget 1500
+"""
+import argparse
+import json
+import random
+
+from app.services.prompt import pack_search_results
+from app.utils.tokens import estimate_tokens
+
+SITES = [
+    "www.rtings.com", "www.theverge.com", "www.reddit.com", "www.techradar.com",
+    "www.nytimes.com/wirecutter", "www.amazon.com", "zhuanlan.zhihu.com", "www.smzdm.com",
+]
+WORDS = [
+    "best", "wireless", "headphones", "noise", "cancelling", "battery", "life", "comfort",
+    "sound", "quality", "review", "tested", "price", "value", "compared", "model", "2025",
+    "降噪", "耳机", "评测", "推荐", "性价比", "续航", "音质",
+]
+
+def synthetic_results(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 10))),
+            "link": f"https://{rng.choice(SITES)}/{'-'.join(rng.choice(WORDS[:16]) for _ in range(4))}",
+            "snippet": " ".join(rng.choice(WORDS) for _ in range(rng.randint(25, 45))),
+        }
+        for _ in range(count)
+    ]
+
+def size(text: str) -> dict:
+    return {"chars": len(text), "estimated_tokens": estimate_tokens(text)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--results", type=int, default=30, help="Search results after merging")
+    parser.add_argument("--budget", type=int, default=1500, help="SEARCH_TOKEN_BUDGET")
+    args = parser.parse_args()
+
+    results = synthetic_results(args.results)
+    indented = json.dumps(results, indent=2)
+    compact = "\n".join(pack_search_results(results, 0))
+    packed_lines = pack_search_results(results, args.budget)
+    packed = "\n".join(packed_lines)
+
+    print(json.dumps({
+        "results": args.results,
+        "json_indent_2": size(indented),
+        "compact_lines": size(compact),
+        "compact_within_budget": {**size(packed), "results_kept": len(packed_lines), "budget": args.budget},
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Semantic cache lookup benchmark
+
+Registers synthetic keywords under their canonical keys and measures lookup
+latency (canonical key plus one HGET) for reordered and respelled variants.
+Uses an in-memory fakeredis unless --redis-url is given.
+
+    cd backend && python -m benchmarks.bench_semantic_cache --size 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.services.semantic_cache import _index_key, canonical_key, find_similar_keyword
+
+ADJECTIVES = [
+    "best", "cheap", "budget", "premium", "wireless", "portable", "quiet", "gaming",
+    "ergonomic", "compact", "waterproof", "smart", "lightweight", "professional", "mini",
+    "无线", "便宜", "高端", "静音", "便携",
+]
+PRODUCTS = [
+    "mechanical keyboard", "headphones", "earbuds", "monitor", "office chair", "laptop",
+    "robot vacuum", "air purifier", "espresso machine", "running shoes", "backpack",
+    "phone case", "smartwatch", "router", "webcam", "microphone", "耳机", "键盘", "显示器",
+    "扫地机器人", "咖啡机",
+]
+QUALIFIERS = ["", "for kids", "for travel", "under 100", "2025", "for work", "for gaming", "for mac"]
+
+def synthetic_keywords(size: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    keywords = set()
+    while len(keywords) < size:
+        parts = [rng.choice(ADJECTIVES), rng.choice(ADJECTIVES), rng.choice(PRODUCTS), rng.choice(QUALIFIERS)]
+        keywords.add(f"{' '.join(p for p in parts if p)} {rng.randint(0, size)}")
+    return list(keywords)
+
+def variant(keyword: str) -> str:
+    """
+    Reordered words, with the plural and "cheap"/"affordable" swapped
+    """
+    words = list(reversed(keyword.split()))
+    swaps = {"cheap": "affordable", "headphones": "headphone", "earbuds": "earbud", "shoes": "shoe"}
+    return " ".join(swaps.get(word, word) for word in words)
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run(args):
+    if args.redis_url:
+        import redis.asyncio as redis
+        client = redis.from_url(args.redis_url, decode_responses=True)
+    else:
+        import fakeredis.aioredis
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    version = "bench"
+    keywords = synthetic_keywords(args.size)
+    await client.delete(_index_key(version))
+
+    started = time.perf_counter()
+    entries = list({canonical_key(keyword): keyword for keyword in keywords}.items())
+    for start in range(0, len(entries), 1000):
+        await client.hset(_index_key(version), mapping=dict(entries[start:start + 1000]))
+    build_seconds = time.perf_counter() - started
+
+    queries = [variant(keyword) for keyword in random.Random(11).sample(keywords, min(args.lookups, len(keywords)))]
+    latencies, hits = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        match = await find_similar_keyword(client, version, query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += match is not None
+
+    await client.delete(_index_key(version))
+    await client.aclose()
+
+    print(json.dumps({
+        "size": len(keywords),
+        "canonical_keys": len(entries),
+        "build_seconds": round(build_seconds, 2),
+        "variant_hit_rate": round(hits / len(queries), 3),
+        "lookup_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+        },
+    }, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000, help="Number of cached keywords")
+    parser.add_argument("--lookups", type=int, default=1000, help="Number of timed lookups")
+    parser.add_argument("--redis-url", help="Benchmark against a real Redis instead of fakeredis")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Top3 load test
+
+Starts the FastAPI app against local mock Serper, Google, Anthropic and OpenAI
+servers (with configurable latency and error injection), fakeredis or a real
+Redis, and SQLite, then drives POST /api/v1/top3/ per scenario and reports
+throughput and latency percentiles as JSON.
+
+    cd backend && python -m benchmarks.load_test \\
+        --scenario hit:50:2000:1.0 --scenario mixed:50:1000:0.8 --output load.json
+
+A scenario is name:concurrency:requests:hit_ratio. Needs uvicorn, aiosqlite
+and fakeredis[lua] (unless --redis-url is given). Load generator, app and mocks
+share one process, so compare results between commits on the same machine.
+The first requests of a scenario include connection setup, which shows up
+in p99 but not in the Server-Timing totals.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import tempfile
+import time
+from typing import List
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def parse_scenario(raw: str) -> dict:
+    name, concurrency, requests, hit_ratio = raw.split(":")
+    return {"name": name, "concurrency": int(concurrency), "requests": int(requests), "hit_ratio": float(hit_ratio)}
+
+def create_mock_upstreams(args) -> FastAPI:
+    """
+    Stand-ins for the search and LLM APIs
+    Latency is uniform within +-25% of the configured mean
+    """
+    mock = FastAPI()
+    rng = random.Random(args.seed)
+
+    async def simulate(latency_ms: float):
+        await asyncio.sleep(latency_ms * rng.uniform(0.75, 1.25) / 1000)
+        if rng.random() < args.error_rate:
+            return JSONResponse(
+                {"error": {"type": "overloaded_error", "message": "Injected error"}},
+                status_code=529 if rng.random() < 0.5 else 503,
+                headers={"retry-after": "1"},
+            )
+        return None
+
+    def results(query: str) -> list:
+        return [
+            {
+                "title": f"{query} review {i}",
+                "link": f"https://www.example{i % 4}.com/{query.replace(' ', '-')}/{i}",
+                "snippet": f"We tested {query} option {i} for weeks: battery, comfort, sound and value compared.",
+            }
+            for i in range(10)
+        ]
+
+    def recommendations(prompt: str) -> dict:
+        return {
+            "recommendations": [
+                {
+                    "rank": rank,
+                    "product_name": f"Product {rank}",
+                    "description": f"Recommended option {rank} based on {len(prompt)} characters of evidence.",
+                    "source_link": f"https://www.example{rank}.com/",
+                }
+                for rank in (1, 2, 3)
+            ]
+        }
+
+    @mock.post("/search")
+    async def serper(request: Request):
+        body = await request.json()
+        return await simulate(args.search_latency) or {"organic": results(body.get("q", ""))}
+
+    @mock.get("/customsearch/v1")
+    async def google(q: str = ""):
+        return await simulate(args.search_latency) or {"items": results(q)}
+
+    @mock.post("/v1/messages")
+    async def anthropic(request: Request):
+        body = await request.json()
+        prompt = body["messages"][0]["content"]
+        return await simulate(args.llm_latency) or {
+            "content": [{"type": "tool_use", "name": "report_top3_products", "input": recommendations(prompt)}],
+            "usage": {"input_tokens": len(prompt) // 4, "output_tokens": 300},
+        }
+
+    @mock.post("/v1/chat/completions")
+    async def openai(request: Request):
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        arguments = json.dumps(recommendations(prompt))
+        return await simulate(args.llm_latency) or {
+            "choices": [{"message": {"tool_calls": [
+                {"function": {"name": "report_top3_products", "arguments": arguments}}
+            ]}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 300},
+        }
+
+    return mock
+
+def configure_environment(args, mock_url: str, workdir: str):
+    """
+    Point the app at the mocks before its settings are imported
+    """
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'load_test.db')}"
+    os.environ["REDIS_URL"] = args.redis_url or "redis://fakeredis"
+    os.environ.setdefault("ADMIN_PASSWORD", "load-test")
+    for name in ("SERPER", "GOOGLE", "ANTHROPIC", "OPENAI"):
+        os.environ[f"{name}_BASE_URL"] = mock_url
+
+    if not args.redis_url:
+        import fakeredis
+        import redis.asyncio
+
+        server = fakeredis.FakeServer()
+        redis.asyncio.from_url = lambda url, **kwargs: fakeredis.FakeAsyncRedis(
+            server=server, decode_responses=kwargs.get("decode_responses", False)
+        )
+
+async def seed_configuration(args):
+    """
+    Default configuration with mock credentials and no provider limits
+    """
+    from app.core.database import get_session_factory, init_db
+    from app.models.configuration import Configuration
+    from app.utils.config_loader import get_default_config
+
+    await init_db()
+    config = await get_default_config()
+    config.update({
+        "SERPER_API_KEY": "load-test",
+        "LLM_API_KEY": "load-test",
+        "LLM_PROVIDER": args.llm_provider,
+        "LLM_MODEL_NAME": "load-test-model",
+    })
+    if args.rate_limits:
+        config["PROVIDER_RATE_LIMITS"] = args.rate_limits
+
+    async with get_session_factory()() as session:
+        for key, value in config.items():
+            session.add(Configuration(key=key, value=value))
+        await session.commit()
+
+async def run_scenario(client: httpx.AsyncClient, scenario: dict, hot_keywords: List[str], rng: random.Random) -> dict:
+    latencies = []
+    statuses = {}
+    remaining = list(range(scenario["requests"]))
+
+    async def worker():
+        while remaining:
+            index = remaining.pop()
+            if rng.random() < scenario["hit_ratio"]:
+                keyword = rng.choice(hot_keywords)
+            else:
+                keyword = f"{scenario['name']} miss {index} {rng.getrandbits(32)}"
+
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/top3/", json={"keyword": keyword})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(scenario["concurrency"])))
+    elapsed = time.perf_counter() - started
+
+    return {
+        **scenario,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+        },
+        "status": statuses,
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+async def main(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="top3-load-")
+
+    mock_port, app_port = free_port(), free_port()
+    mock_server = uvicorn.Server(uvicorn.Config(
+        create_mock_upstreams(args), host="127.0.0.1", port=mock_port, log_level="warning"
+    ))
+    mock_task = asyncio.create_task(mock_server.serve())
+
+    configure_environment(args, f"http://127.0.0.1:{mock_port}", workdir)
+    await seed_configuration(args)
+
+    from main import app
+
+    # Importing main configures logging; per-request INFO lines would dominate the profile
+    logging.getLogger().setLevel(args.log_level)
+
+    app_server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=app_port, log_level="warning"))
+    app_task = asyncio.create_task(app_server.serve())
+    while not (mock_server.started and app_server.started):
+        await asyncio.sleep(0.05)
+
+    scenarios = [parse_scenario(raw) for raw in args.scenario] or [
+        parse_scenario("hit:50:2000:1.0"),
+        parse_scenario("mixed:50:1000:0.8"),
+        parse_scenario("miss:20:200:0.0"),
+    ]
+    hot_keywords = [f"hot keyword {i}" for i in range(args.hot_keywords)]
+
+    results = []
+    limits = httpx.Limits(max_connections=max(s["concurrency"] for s in scenarios))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=120, limits=limits) as client:
+        # Warm the hot set so hit scenarios measure the cache path only
+        await asyncio.gather(*(client.post("/api/v1/top3/", json={"keyword": k}) for k in hot_keywords))
+        for scenario in scenarios:
+            results.append(await run_scenario(client, scenario, hot_keywords, rng))
+
+    app_server.should_exit = True
+    mock_server.should_exit = True
+    await asyncio.gather(app_task, mock_task)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "redis": args.redis_url or "fakeredis",
+        "mock": {
+            "search_latency_ms": args.search_latency,
+            "llm_latency_ms": args.llm_latency,
+            "error_rate": args.error_rate,
+            "llm_provider": args.llm_provider,
+        },
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", action="append", default=[], help="name:concurrency:requests:hit_ratio (repeatable)")
+    parser.add_argument("--hot-keywords", type=int, default=50, help="Keywords pre-warmed for cache hits")
+    parser.add_argument("--search-latency", type=float, default=300, help="Mock search latency in ms")
+    parser.add_argument("--llm-latency", type=float, default=3000, help="Mock LLM latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock upstream calls failing with 503/529")
+    parser.add_argument("--llm-provider", choices=("anthropic", "openai"), default="anthropic")
+    parser.add_argument("--redis-url", help="Use a real Redis instead of fakeredis")
+    parser.add_argument("--rate-limits", help="PROVIDER_RATE_LIMITS JSON to apply (unlimited by default)")
+    parser.add_argument("--log-level", default="WARNING", help="Application log level during the run")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
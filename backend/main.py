@@ -1,9 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from app.core.config import settings
+from app.core.metrics import render_prometheus
+from app.core.tracing import TracingMiddleware, trace_exporter
 from app.api.api_v1 import api_router
 from app.core.logging import setup_logging
 
@@ -39,10 +42,57 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to initialize cache: {e}")
         raise
     
+    # Initialize pooled HTTP clients for upstream APIs
+    from app.core.http_client import init_http_clients, close_http_clients
+    await init_http_clients()
+    
+    # Watch for configuration changes published by the admin API
+    from app.core.cache import get_redis_client
+    from app.utils.config_loader import listen_for_config_changes
+    config_listener = asyncio.create_task(listen_for_config_changes(get_redis_client()))
+    
+    # Keep the in-process cache tier coherent with writes from other workers
+    from app.core.cache import get_cache
+    cache_invalidation_listener = asyncio.create_task(
+        get_cache().listen_for_invalidations(get_redis_client())
+    )
+    
+    # Periodically flush keyword popularity counts (used by the warm-up job)
+    from app.services.popularity import run_popularity_flusher
+    popularity_flusher = asyncio.create_task(run_popularity_flusher(get_redis_client()))
+    
+    # Persist computed recommendations to PostgreSQL in the background
+    from app.services.recommendation_store import recommendation_writer
+    recommendation_store_writer = asyncio.create_task(recommendation_writer.run())
+    
+    # Export request traces to an OpenTelemetry collector or file, if configured
+    trace_export = asyncio.create_task(trace_exporter.run())
+    
+    # Optionally consume async jobs here too (normally done by app.utils.job_worker)
+    job_worker = None
+    if settings.JOB_WORKER_IN_APP:
+        from app.services.jobs import JobWorker
+        job_worker = asyncio.create_task(JobWorker(get_redis_client()).run())
+    
     yield
     
     # Shutdown
     logger.info("Shutting down Top03-Kuai application...")
+    if job_worker is not None:
+        job_worker.cancel()
+        await asyncio.gather(job_worker, return_exceptions=True)
+    background = [
+        config_listener,
+        cache_invalidation_listener,
+        popularity_flusher,
+        recommendation_store_writer,
+        trace_export,
+    ]
+    for task in background:
+        task.cancel()
+    # The writer and the exporter drain their queues; the exporter still needs the HTTP clients
+    await asyncio.gather(*background, return_exceptions=True)
+    await close_http_clients()
 
 # Create FastAPI app
 app = FastAPI(
@@ -63,9 +113,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Trace each request through the pipeline stages (Server-Timing header, slow-request log, export)
+app.add_middleware(TracingMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics of this worker process
+    """
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 async def root():
     """
@@ -0,0 +1,72 @@
+import os
+
+# Settings are read at import time, point them at throwaway services
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("ADMIN_PASSWORD", "test")
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import pytest_asyncio
+
+@pytest_asyncio.fixture
+async def redis_client():
+    """
+    In-memory Redis (with Lua) installed as the application's Redis clients
+    and behind the application cache
+    """
+    from app.core import cache
+
+    server = fakeredis.FakeServer()
+    client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    binary_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=False)
+    previous = (cache.redis_client, cache.binary_redis_client, cache.app_cache)
+    cache.redis_client = client
+    cache.binary_redis_client = binary_client
+    cache.app_cache = cache.TieredCache(
+        cache.LocalCache("test", 1024 * 1024),
+        cache.RedisCache(binary_client),
+        cache.BinaryCodec(),
+        local_ttl=30.0,
+    )
+    try:
+        yield client
+    finally:
+        cache.redis_client, cache.binary_redis_client, cache.app_cache = previous
+        await client.aclose()
+        await binary_client.aclose()
+
+@pytest.fixture
+def top3_config():
+    from app.utils.config_loader import build_config_snapshot
+
+    return build_config_snapshot({"LLM_MODEL_NAME": "test-model"})
+
+@pytest_asyncio.fixture
+async def top3_api(redis_client, top3_config, monkeypatch):
+    """
+    HTTP client for the top3 router, serving top3_config and without a database
+    """
+    import httpx
+    from fastapi import FastAPI
+
+    from app.api.api_v1.endpoints import top3
+    from app.core.config import settings
+    from app.core.database import get_db
+
+    async def get_config_snapshot(db, cache_client):
+        return top3_config
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(top3, "get_config_snapshot", get_config_snapshot)
+    monkeypatch.setattr(settings, "RECOMMENDATION_STORE_ENABLED", False)
+
+    app = FastAPI()
+    app.include_router(top3.router, prefix="/top3")
+    app.dependency_overrides[get_db] = no_db
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
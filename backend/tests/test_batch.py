@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import recommendation
+from app.services.recommendation import build_cache_key, store_recommendations
+
+def product(name: str) -> dict:
+    return {"rank": 1, "product_name": name, "description": f"{name} description", "source_link": f"https://example.com/{name}"}
+
+def read_ndjson(response) -> dict:
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    return {line["keyword"]: line for line in lines}
+
+@pytest.mark.asyncio
+async def test_batch_streams_one_line_per_normalized_keyword(top3_api, top3_config, monkeypatch):
+    await store_recommendations(build_cache_key("keyboard", top3_config), [product("keyboard")])
+
+    computed = []
+
+    async def compute(keyword, config, cache_client):
+        computed.append(keyword)
+        return [product(keyword)]
+
+    monkeypatch.setattr(recommendation, "get_or_compute_recommendations", compute)
+
+    response = await top3_api.post("/top3/batch", json={"keywords": ["keyboard", "Keyboard!!", "mouse", "!!!"]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = read_ndjson(response)
+
+    assert results["keyboard"]["inputs"] == ["keyboard", "Keyboard!!"]
+    assert results["keyboard"]["cached"] is True
+    assert results["keyboard"]["data"][0]["product_name"] == "keyboard"
+    assert results["mouse"]["cached"] is False
+    assert results["mouse"]["data"][0]["product_name"] == "mouse"
+    assert results["!!!"]["status"] == "error"
+    # Duplicates and cache hits never reach the pipeline
+    assert computed == ["mouse"]
+
+@pytest.mark.asyncio
+async def test_batch_reports_failures_per_keyword(top3_api, monkeypatch):
+    async def compute(keyword, config, cache_client):
+        if keyword == "broken":
+            raise RuntimeError("upstream down")
+        await asyncio.sleep(0)
+        return [product(keyword)]
+
+    monkeypatch.setattr(recommendation, "get_or_compute_recommendations", compute)
+
+    response = await top3_api.post("/top3/batch", json={"keywords": ["broken", "monitor"]})
+    results = read_ndjson(response)
+
+    assert results["broken"]["status"] == "error"
+    assert "upstream down" in results["broken"]["detail"]
+    assert results["monitor"]["status"] == "success"
+
+@pytest.mark.asyncio
+async def test_batch_size_is_limited(top3_api, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "BATCH_MAX_KEYWORDS", 2)
+
+    response = await top3_api.post("/top3/batch", json={"keywords": ["a", "b", "c"]})
+    assert response.status_code == 413
@@ -0,0 +1,83 @@
+import json
+import zlib
+
+import orjson
+import pytest
+
+from app.core import cache
+from app.core.cache import (
+    FORMAT_ORJSON,
+    FORMAT_ORJSON_ZLIB,
+    FORMAT_ORJSON_ZSTD,
+    BinaryCodec,
+    LocalCache,
+    local_entry_size,
+)
+
+SMALL = {"body": '{"status":"success","data":[]}', "etag": '"abc"', "fresh_until": 1700000000.5}
+LARGE = {
+    "body": json.dumps({"status": "success", "data": [
+        {"rank": i, "product_name": f"Product {i}", "description": "A long description " * 20, "source_link": f"https://example.com/{i}"}
+        for i in range(1, 4)
+    ]}),
+    "etag": '"def"',
+    "fresh_until": 1700000000.5,
+}
+
+def test_small_values_are_stored_uncompressed():
+    codec = BinaryCodec(compress_min_bytes=1024)
+    raw = codec.encode(SMALL)
+
+    assert raw[:1] == FORMAT_ORJSON
+    assert codec.decode(raw) == SMALL
+
+def test_large_values_are_compressed():
+    codec = BinaryCodec(compress_min_bytes=1024)
+    raw = codec.encode(LARGE)
+
+    assert raw[:1] in (FORMAT_ORJSON_ZSTD, FORMAT_ORJSON_ZLIB)
+    assert len(raw) < len(orjson.dumps(LARGE))
+    assert codec.decode(raw) == LARGE
+
+def test_zlib_fallback_round_trips(monkeypatch):
+    monkeypatch.setattr(cache, "zstandard", None)
+    codec = BinaryCodec(compress_min_bytes=1024)
+    raw = codec.encode(LARGE)
+
+    assert raw[:1] == FORMAT_ORJSON_ZLIB
+    assert codec.decode(raw) == LARGE
+    assert BinaryCodec().decode(FORMAT_ORJSON_ZLIB + zlib.compress(orjson.dumps(SMALL))) == SMALL
+
+@pytest.mark.parametrize("legacy", [json.dumps(SMALL), json.dumps(SMALL).encode("utf-8")])
+def test_legacy_json_values_still_decode(legacy):
+    assert BinaryCodec().decode(legacy) == SMALL
+
+def test_non_ascii_text_round_trips():
+    value = {"body": '{"data":[{"product_name":"无线耳机"}]}', "etag": '"x"', "fresh_until": 1.0}
+    codec = BinaryCodec(compress_min_bytes=0)
+
+    assert codec.decode(codec.encode(value)) == value
+
+def test_local_cache_counts_the_decoded_body():
+    # Compression must not let more entries into LocalCache than its budget holds
+    size = local_entry_size(LARGE)
+    assert size >= len(LARGE["body"])
+    assert size > len(BinaryCodec(compress_min_bytes=0).encode(LARGE))
+
+    local = LocalCache("test", max_bytes=size * 2)
+    for i in range(3):
+        local.set_nowait(f"key{i}", LARGE, size=size)
+
+    assert len(local) == 2
+    assert local.get_nowait("key0") is None
+
+@pytest.mark.asyncio
+async def test_tiered_cache_round_trips_through_redis(redis_client):
+    tiered = cache.get_cache()
+    await tiered.set("key", LARGE, ttl=60)
+    assert tiered.local.size_bytes == local_entry_size(LARGE)
+
+    # Another worker: empty local tier, same Redis
+    other = cache.TieredCache(LocalCache("other", 1024 * 1024), tiered.remote, BinaryCodec(), local_ttl=30.0)
+    assert await other.get("key") == LARGE
+    assert other.local.size_bytes == local_entry_size(LARGE)
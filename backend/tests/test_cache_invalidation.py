@@ -0,0 +1,92 @@
+import pytest
+
+from app.core.cache import bump_generation
+from app.services.recommendation import (
+    build_cache_key,
+    get_cached_recommendations,
+    get_rollover_recommendations,
+    store_recommendations,
+)
+from app.utils.config_loader import (
+    apply_config_update,
+    build_config_snapshot,
+    config_store,
+    preview_config_update,
+)
+
+ITEM = {"rank": 1, "product_name": "Keyboard A", "description": "Quiet switches", "source_link": "https://example.com/a"}
+
+async def load_snapshot(redis_client, config: dict):
+    """
+    Build the snapshot a worker would see after the update
+    """
+    return build_config_snapshot(config, *await config_store._read_generations(redis_client))
+
+@pytest.mark.asyncio
+async def test_query_generation_bump_orphans_recommendations(redis_client):
+    config = {"LLM_MODEL_NAME": "model-a"}
+    before = await load_snapshot(redis_client, config)
+    await store_recommendations(build_cache_key("keyboard", before), [ITEM])
+
+    await bump_generation(redis_client, "config")
+    unchanged = await load_snapshot(redis_client, config)
+    assert build_cache_key("keyboard", unchanged) == build_cache_key("keyboard", before)
+
+    await bump_generation(redis_client, "query")
+    after = await load_snapshot(redis_client, config)
+    assert build_cache_key("keyboard", after) != build_cache_key("keyboard", before)
+    assert await get_cached_recommendations(build_cache_key("keyboard", after)) is None
+
+@pytest.mark.asyncio
+async def test_preview_only_lists_affected_namespaces(redis_client):
+    current = await load_snapshot(redis_client, {"LLM_MODEL_NAME": "model-a", "SEARCH_LOCALE": "us-en"})
+
+    config_only = preview_config_update(current, {"SERPER_API_KEY": "new-key"})
+    assert config_only["namespaces"] == ["config"]
+    assert not config_only["recommendations_affected"]
+
+    model_change = preview_config_update(current, {"LLM_MODEL_NAME": "model-b"})
+    assert model_change["namespaces"] == ["config", "query"]
+    assert model_change["new_version"] != current.version
+
+@pytest.mark.asyncio
+async def test_gradual_rollover_serves_every_recent_version(redis_client):
+    config_a = {"LLM_MODEL_NAME": "model-a"}
+    snapshot_a = await load_snapshot(redis_client, config_a)
+    await store_recommendations(build_cache_key("keyboard", snapshot_a), [ITEM])
+
+    # A -> B -> C before "keyboard" is computed under B or C
+    config_b = {**config_a, "LLM_MODEL_NAME": "model-b"}
+    await apply_config_update(redis_client, snapshot_a, {"LLM_MODEL_NAME": "model-b"})
+    snapshot_b = await load_snapshot(redis_client, config_b)
+    assert snapshot_b.previous_versions == (snapshot_a.version,)
+
+    config_c = {**config_b, "LLM_MODEL_NAME": "model-c"}
+    await apply_config_update(redis_client, snapshot_b, {"LLM_MODEL_NAME": "model-c"})
+    snapshot_c = await load_snapshot(redis_client, config_c)
+    assert snapshot_c.previous_versions == (snapshot_b.version, snapshot_a.version)
+
+    rollover = await get_rollover_recommendations("keyboard", snapshot_c, redis_client)
+    assert rollover is not None
+    assert rollover.data[0]["product_name"] == "Keyboard A"
+    # Served as stale so the keyword is refreshed under the new version
+    assert rollover.stale
+
+    # Going back to A serves A's own entries, not a rollover
+    await apply_config_update(redis_client, snapshot_c, {"LLM_MODEL_NAME": "model-a"})
+    snapshot_back = await load_snapshot(redis_client, config_a)
+    assert snapshot_back.version == snapshot_a.version
+    assert snapshot_back.previous_versions == (snapshot_c.version, snapshot_b.version)
+
+@pytest.mark.asyncio
+async def test_immediate_rollover_drops_previous_versions(redis_client):
+    config_a = {"LLM_MODEL_NAME": "model-a"}
+    snapshot_a = await load_snapshot(redis_client, config_a)
+    await store_recommendations(build_cache_key("keyboard", snapshot_a), [ITEM])
+
+    updates = {"LLM_MODEL_NAME": "model-b", "CACHE_ROLLOVER_MODE": "immediate"}
+    await apply_config_update(redis_client, snapshot_a, updates)
+    snapshot_b = await load_snapshot(redis_client, {**config_a, **updates})
+
+    assert snapshot_b.previous_versions == ()
+    assert await get_rollover_recommendations("keyboard", snapshot_b, redis_client) is None
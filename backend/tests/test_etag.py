@@ -0,0 +1,60 @@
+import pytest
+
+from app.api.api_v1.endpoints import top3
+from app.services.recommendation import CachedRecommendations, build_cache_key, store_recommendations
+
+ITEMS = [{"rank": 1, "product_name": "Monitor", "description": "27 inch", "source_link": "https://example.com/monitor"}]
+
+def test_etag_depends_on_the_body_only():
+    first = CachedRecommendations.from_data(ITEMS, fresh_until=1)
+    second = CachedRecommendations.from_data(ITEMS, fresh_until=2)
+    changed = CachedRecommendations.from_data([{**ITEMS[0], "description": "32 inch"}], fresh_until=1)
+
+    assert first.etag == second.etag
+    assert first.etag != changed.etag
+    assert first.etag.startswith('"') and first.etag.endswith('"')
+
+@pytest.mark.asyncio
+async def test_cache_hit_returns_stored_body_with_etag(top3_api, top3_config):
+    cached = await store_recommendations(build_cache_key("monitor", top3_config), ITEMS)
+
+    response = await top3_api.post("/top3/", json={"keyword": "Monitor"})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] == cached.etag
+    assert response.content == cached.body.encode("utf-8")
+    assert response.json()["data"][0]["product_name"] == "Monitor"
+
+@pytest.mark.asyncio
+async def test_matching_if_none_match_returns_304(top3_api, top3_config):
+    cached = await store_recommendations(build_cache_key("monitor", top3_config), ITEMS)
+
+    response = await top3_api.post(
+        "/top3/", json={"keyword": "monitor"}, headers={"If-None-Match": f'"other", {cached.etag}'}
+    )
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == cached.etag
+    assert response.content == b""
+
+@pytest.mark.asyncio
+async def test_stale_etag_gets_the_full_body(top3_api, top3_config):
+    await store_recommendations(build_cache_key("monitor", top3_config), ITEMS)
+
+    response = await top3_api.post("/top3/", json={"keyword": "monitor"}, headers={"If-None-Match": '"outdated"'})
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "success"
+
+@pytest.mark.asyncio
+async def test_computed_response_matches_the_cached_body(top3_api, top3_config, monkeypatch):
+    async def compute(keyword, config, cache_client):
+        await store_recommendations(build_cache_key(keyword, config), ITEMS)
+        return ITEMS
+
+    monkeypatch.setattr(top3, "get_or_compute_recommendations", compute)
+
+    computed = await top3_api.post("/top3/", json={"keyword": "monitor"})
+    cached = await top3_api.post("/top3/", json={"keyword": "monitor"})
+
+    assert computed.json() == cached.json()
@@ -0,0 +1,82 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core.config import settings
+from app.services import jobs
+from app.services.jobs import FAILED, SUCCEEDED, JobWorker, load_job, stream_key, submit_job
+
+ITEMS = [{"rank": 1, "product_name": "Chair", "description": "Mesh back", "source_link": "https://example.com/chair"}]
+
+@pytest.fixture
+def worker_env(top3_config, monkeypatch):
+    """
+    Run JobWorker._process without a database, with a stubbed pipeline
+    """
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    async def get_config_snapshot(db, cache_client):
+        return top3_config
+
+    monkeypatch.setattr(jobs, "get_session_factory", lambda: session)
+    monkeypatch.setattr(jobs, "get_config_snapshot", get_config_snapshot)
+
+    def use_pipeline(compute):
+        monkeypatch.setattr(jobs, "get_or_compute_recommendations", compute)
+
+    return use_pipeline
+
+async def process_next(redis_client, priority: str = "normal"):
+    entry_id, fields = (await redis_client.xrange(stream_key(priority)))[-1]
+    await JobWorker(redis_client)._process(priority, entry_id, fields["job_id"])
+
+@pytest.mark.asyncio
+async def test_concurrent_submissions_create_one_job(redis_client, top3_config):
+    results = await asyncio.gather(*(
+        submit_job("office chair", "normal", top3_config, redis_client) for _ in range(20)
+    ))
+
+    created = [job for job, was_created in results if was_created]
+    assert len(created) == 1
+    assert {job.job_id for job, _ in results} == {created[0].job_id}
+    assert await redis_client.xlen(stream_key("normal")) == 1
+    # The losing submissions removed their own job hashes
+    assert len([key async for key in redis_client.scan_iter("job:*") if key.count(":") == 1]) == 1
+
+@pytest.mark.asyncio
+async def test_finished_job_allows_a_new_submission(redis_client, top3_config, worker_env):
+    async def compute(keyword, config, cache_client):
+        return ITEMS
+
+    worker_env(compute)
+    first, _ = await submit_job("office chair", "normal", top3_config, redis_client)
+    await process_next(redis_client)
+
+    finished = await load_job(redis_client, first.job_id)
+    assert finished.status == SUCCEEDED
+    assert finished.data == ITEMS
+
+    second, created = await submit_job("office chair", "normal", top3_config, redis_client)
+    assert created
+    assert second.job_id != first.job_id
+
+@pytest.mark.asyncio
+async def test_job_without_result_fails(redis_client, top3_config, worker_env, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 1)
+
+    async def compute(keyword, config, cache_client):
+        return None
+
+    worker_env(compute)
+    job, _ = await submit_job("office chair", "normal", top3_config, redis_client)
+    await process_next(redis_client)
+
+    failed = await load_job(redis_client, job.job_id)
+    assert failed.status == FAILED
+    assert failed.error == "Pipeline returned no recommendations"
+    # The dedup entry is released so the keyword can be submitted again
+    _, created = await submit_job("office chair", "normal", top3_config, redis_client)
+    assert created
@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException
+
+from app.api.api_v1.endpoints.top3 import require_keyword
+from app.services.recommendation import build_cache_key
+from app.utils.config_loader import build_config_snapshot
+from app.utils.keyword import normalize_keyword, parse_keyword_aliases
+
+@pytest.mark.parametrize("raw, expected", [
+    ("  Wireless   Earbuds ", "wireless earbuds"),
+    ("WIRELESS-EARBUDS!!", "wireless earbuds"),
+    ("ｉＰｈｏｎｅ　１５", "iphone 15"),
+    ("c++ books", "c++ books"),
+    ("usb 2.5 hub.", "usb 2.5 hub"),
+    ("无线 耳机", "无线耳机"),
+    ("Straße", "strasse"),
+])
+def test_normalize_keyword(raw, expected):
+    assert normalize_keyword(raw) == expected
+
+def test_aliases_apply_to_the_normalized_form():
+    aliases = parse_keyword_aliases('{"AirPods Pro": "apple earbuds", "Ear Buds": "EARBUDS"}')
+
+    assert aliases == {"airpods pro": "apple earbuds", "ear buds": "earbuds"}
+    assert normalize_keyword("airpods   PRO!", aliases) == "apple earbuds"
+    assert normalize_keyword("airpods max", aliases) == "airpods max"
+
+def test_invalid_aliases_are_ignored():
+    assert parse_keyword_aliases("not json") == {}
+    assert parse_keyword_aliases('["a", "b"]') == {}
+
+def test_variants_share_one_cache_key():
+    config = build_config_snapshot({"LLM_MODEL_NAME": "model-a"})
+
+    keys = {build_cache_key(require_keyword(raw, config), config) for raw in ("Gaming Mouse", "gaming  mouse!", "ＧＡＭＩＮＧ mouse")}
+    assert len(keys) == 1
+
+def test_cache_key_changes_with_the_config_version():
+    first = build_config_snapshot({"LLM_MODEL_NAME": "model-a"})
+    second = build_config_snapshot({"LLM_MODEL_NAME": "model-b"})
+
+    assert build_cache_key("gaming mouse", first) != build_cache_key("gaming mouse", second)
+
+@pytest.mark.parametrize("raw", ["!!!", "   ", "？？"])
+def test_keyword_empty_after_normalization_is_rejected(raw):
+    config = build_config_snapshot({})
+
+    with pytest.raises(HTTPException) as excinfo:
+        require_keyword(raw, config)
+
+    assert excinfo.value.status_code == 422
+    assert excinfo.value.detail == "Keyword is empty after normalization"
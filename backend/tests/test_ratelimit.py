@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.core import ratelimit
+from app.core.ratelimit import UpstreamGate, UpstreamOverloadedError, get_upstream_gate, parse_rate_limits
+from app.services import llm_gateway
+from app.utils.config_loader import build_config_snapshot
+
+def test_unconfigured_upstreams_are_unlimited():
+    assert get_upstream_gate("anthropic:model", {}) is None
+    assert get_upstream_gate("anthropic:model", parse_rate_limits("not json")) is None
+    assert get_upstream_gate("serper", {"serper": {"burst": 5}}) is None
+
+def test_model_limits_fall_back_to_the_provider():
+    limits = {"anthropic": {"rate": 5, "burst": 5}, "anthropic:big": {"rate": 1, "burst": 1}}
+
+    assert get_upstream_gate("anthropic:small", limits).rate == 5
+    assert get_upstream_gate("anthropic:big", limits).rate == 1
+
+@pytest.mark.asyncio
+async def test_token_bucket_admits_a_burst_then_sheds(redis_client):
+    gate = UpstreamGate("test-burst", rate=1, burst=3, concurrency=0, max_queue=10)
+
+    for _ in range(3):
+        async with gate.admit(timeout=0):
+            pass
+
+    with pytest.raises(UpstreamOverloadedError) as excinfo:
+        async with gate.admit(timeout=0.1):
+            pass
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after > 0.1
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_when_a_token_comes_in_time(redis_client):
+    gate = UpstreamGate("test-wait", rate=20, burst=1, concurrency=0, max_queue=10)
+
+    async with gate.admit(timeout=0):
+        pass
+    started = asyncio.get_running_loop().time()
+    async with gate.admit(timeout=1.0):
+        pass
+
+    assert asyncio.get_running_loop().time() - started >= 0.03
+
+@pytest.mark.asyncio
+async def test_bucket_is_shared_by_every_worker(redis_client):
+    # Two gates with the same name stand for two worker processes
+    first = UpstreamGate("test-shared", rate=1, burst=2, concurrency=0, max_queue=10)
+    second = UpstreamGate("test-shared", rate=1, burst=2, concurrency=0, max_queue=10)
+
+    async with first.admit(timeout=0):
+        pass
+    async with second.admit(timeout=0):
+        pass
+    with pytest.raises(UpstreamOverloadedError):
+        async with first.admit(timeout=0):
+            pass
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_with_503(redis_client):
+    gate = UpstreamGate("test-queue", rate=0, burst=1, concurrency=1, max_queue=0)
+
+    async with gate.admit(timeout=1.0):
+        with pytest.raises(UpstreamOverloadedError) as excinfo:
+            async with gate.admit(timeout=1.0):
+                pass
+    assert excinfo.value.status_code == 503
+
+    # The slot is free again
+    async with gate.admit(timeout=0):
+        pass
+
+@pytest.mark.asyncio
+async def test_local_bucket_when_redis_is_unavailable(redis_client, monkeypatch):
+    def unavailable():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(ratelimit, "get_redis_client", unavailable)
+    gate = UpstreamGate("test-local", rate=1, burst=1, concurrency=0, max_queue=10)
+
+    async with gate.admit(timeout=0.5):
+        pass
+    with pytest.raises(UpstreamOverloadedError) as excinfo:
+        async with gate.admit(timeout=0.05):
+            pass
+    assert excinfo.value.status_code == 429
+
+@pytest.mark.asyncio
+async def test_stream_releases_admission_before_the_client_reads_it(redis_client, monkeypatch):
+    async def stream_llm_api(**request):
+        for fragment in ("a", "b", "c"):
+            yield fragment
+
+    monkeypatch.setattr(llm_gateway, "stream_llm_api", stream_llm_api)
+    config = build_config_snapshot({
+        "PROVIDER_RATE_LIMITS": '{"anthropic": {"concurrency": 1, "queue": 0}}',
+    })
+    request = {"provider": "anthropic", "model": "test-stream", "api_key": "key"}
+
+    stream = llm_gateway.stream_llm_with_failover(request, config)
+    assert await stream.__anext__() == "a"
+    await asyncio.sleep(0.01)
+
+    # The upstream is fully read, so a slow client no longer holds the slot
+    async with get_upstream_gate("anthropic:test-stream", config.rate_limits).admit(timeout=0):
+        pass
+    assert [fragment async for fragment in stream] == ["b", "c"]
@@ -0,0 +1,40 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.services.recommendation_store import KEYWORD_MAX_LENGTH, RecommendationWriter, StoredResult
+
+ITEM = {"rank": 1, "product_name": "Desk A", "description": "Oak top", "source_link": "https://example.com/a"}
+
+def stored_result(keyword: str) -> StoredResult:
+    return StoredResult(result_id=keyword, keyword=keyword, config_version="v1", created_at=datetime.utcnow(), data=[ITEM])
+
+@pytest.mark.asyncio
+async def test_failing_result_does_not_lose_the_batch(monkeypatch):
+    writer = RecommendationWriter()
+    stored = []
+
+    async def insert(batch):
+        if any(result.keyword == "broken" for result in batch):
+            raise ValueError("value too long for column")
+        stored.extend(result.keyword for result in batch)
+
+    monkeypatch.setattr(writer, "_insert", insert)
+
+    await writer._write([stored_result("desk"), stored_result("broken"), stored_result("chair")])
+
+    assert stored == ["desk", "chair"]
+
+def test_overlong_keyword_is_not_queued(monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "RECOMMENDATION_STORE_ENABLED", True)
+    writer = RecommendationWriter()
+    writer._queue = asyncio.Queue()
+
+    writer.enqueue("x" * (KEYWORD_MAX_LENGTH + 1), "v1", [ITEM])
+    writer.enqueue("desk", "v1", [ITEM])
+
+    assert writer._queue.qsize() == 1
+    assert writer._queue.get_nowait().keyword == "desk"
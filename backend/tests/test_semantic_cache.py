@@ -0,0 +1,59 @@
+import pytest
+
+from app.services.semantic_cache import (
+    add_keyword,
+    canonical_key,
+    find_similar_keyword,
+    remove_keyword,
+)
+
+@pytest.mark.parametrize("first, second", [
+    ("best budget mechanical keyboard", "cheap mechanical keyboard"),
+    ("affordable mechanical keyboards", "budget mechanical keyboard"),
+    ("noise canceling headphones", "noise cancelling headphone"),
+    ("wireless earbuds for running", "running wireless earbuds"),
+    ("top rated robot vacuum", "robot vacuums rated"),
+    ("便宜 耳机", "cheap 耳机"),
+])
+def test_variants_share_a_canonical_key(first, second):
+    assert canonical_key(first) == canonical_key(second)
+
+@pytest.mark.parametrize("first, second", [
+    ("gaming laptop bag", "gaming laptop"),
+    ("iphone 15", "iphone 14"),
+    ("wireless mouse", "wireless keyboard"),
+    ("usb c hub", "usb c cable"),
+    ("glass", "glasses case"),
+])
+def test_different_products_do_not_match(first, second):
+    assert canonical_key(first) != canonical_key(second)
+
+def test_stopword_only_keyword_has_no_key():
+    assert canonical_key("the best of the best") == ""
+
+def test_aliases_apply_before_canonicalization():
+    aliases = {"airpods": "apple earbuds"}
+    assert canonical_key("airpods for running", aliases) == canonical_key("running apple earbuds")
+
+@pytest.mark.asyncio
+async def test_lookup_finds_near_duplicate(redis_client):
+    await add_keyword(redis_client, "v1", "cheap mechanical keyboard")
+
+    assert await find_similar_keyword(redis_client, "v1", "best budget mechanical keyboards") == "cheap mechanical keyboard"
+    assert await find_similar_keyword(redis_client, "v1", "mechanical keyboard") is None
+    # The keyword itself is an exact hit, not a near duplicate
+    assert await find_similar_keyword(redis_client, "v1", "cheap mechanical keyboard") is None
+    # Other config versions have their own keywords
+    assert await find_similar_keyword(redis_client, "v2", "budget mechanical keyboard") is None
+
+@pytest.mark.asyncio
+async def test_remove_only_drops_its_own_mapping(redis_client):
+    await add_keyword(redis_client, "v1", "noise canceling headphones")
+    await add_keyword(redis_client, "v1", "noise cancelling headphones")
+
+    # The older keyword expired, but the key now maps to the newer one
+    await remove_keyword(redis_client, "v1", "noise canceling headphones")
+    assert await find_similar_keyword(redis_client, "v1", "headphones noise canceling") == "noise cancelling headphones"
+
+    await remove_keyword(redis_client, "v1", "noise cancelling headphones")
+    assert await find_similar_keyword(redis_client, "v1", "headphones noise canceling") is None
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight, redis_singleflight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return ["result"]
+
+    results = await asyncio.gather(*(flight.do("key", compute) for _ in range(10)))
+
+    assert calls == 1
+    assert all(result == ["result"] for result in results)
+    assert not flight.inflight("key")
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(flight.do("key", compute))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(flight.do("key", compute))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == "done"
+    assert calls == 1
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller_and_are_not_cached():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def succeed():
+        return "ok"
+
+    assert await flight.do("key", succeed) == "ok"
+
+@pytest.mark.asyncio
+async def test_redis_lock_coalesces_across_workers(redis_client):
+    published = {}
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        published["key"] = "result"
+        return "result"
+
+    async def read_result():
+        return published.get("key")
+
+    # Each call stands for a different worker: no shared in-process state
+    results = await asyncio.gather(*(
+        redis_singleflight(
+            redis_client, "key", compute, read_result,
+            lock_ttl=5, wait_timeout=2.0, poll_interval=0.01
+        )
+        for _ in range(3)
+    ))
+
+    assert calls == 1
+    assert results == ["result"] * 3
+    assert not await redis_client.exists("lock:key")
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_holder_ends_without_result(redis_client):
+    attempts = 0
+
+    async def compute():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.02)
+        if attempts == 1:
+            raise RuntimeError("first holder failed")
+        return "recovered"
+
+    async def read_result():
+        return None
+
+    results = await asyncio.gather(
+        redis_singleflight(redis_client, "key", compute, read_result, lock_ttl=5, wait_timeout=2.0, poll_interval=0.01),
+        redis_singleflight(redis_client, "key", compute, read_result, lock_ttl=5, wait_timeout=2.0, poll_interval=0.01),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[0], RuntimeError)
+    assert results[1] == "recovered"
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.services import recommendation
+from app.services.recommendation import (
+    build_cache_key,
+    get_fresh_recommendations,
+    get_or_compute_recommendations,
+    store_recommendations,
+    stream_top3_recommendations,
+)
+
+ITEMS = [
+    {"rank": 1, "product_name": "Lamp A", "description": "Warm light", "source_link": "https://example.com/a"},
+    {"rank": 2, "product_name": "Lamp B", "description": "Cold light", "source_link": "https://example.com/b"},
+]
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """
+    Stub pipeline publishing progress like compute_top3_recommendations,
+    paced by the test through the returned release event
+    """
+    state = {"calls": 0, "release": asyncio.Event()}
+
+    async def compute(keyword, config, cache_client, usage=None, progress=None):
+        state["calls"] += 1
+        if progress is not None:
+            progress.publish("search", {"results": 5})
+        await state["release"].wait()
+        for item in ITEMS:
+            if progress is not None:
+                progress.publish("recommendation", item)
+        await store_recommendations(build_cache_key(keyword, config), ITEMS)
+        return ITEMS
+
+    monkeypatch.setattr(recommendation, "compute_top3_recommendations", compute)
+    return state
+
+async def collect(stream) -> list:
+    return [event async for event in stream]
+
+@pytest.mark.asyncio
+async def test_streams_and_requests_share_one_run(redis_client, top3_config, pipeline):
+    first = asyncio.create_task(collect(stream_top3_recommendations("lamp", top3_config, redis_client)))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(collect(stream_top3_recommendations("lamp", top3_config, redis_client)))
+    plain = asyncio.create_task(get_or_compute_recommendations("lamp", top3_config, redis_client))
+    await asyncio.sleep(0.01)
+    pipeline["release"].set()
+
+    first_events, second_events, data = await asyncio.gather(first, second, plain)
+
+    assert pipeline["calls"] == 1
+    assert data == ITEMS
+    # A late follower replays the events it missed
+    for events in (first_events, second_events):
+        assert [event for event, _ in events] == ["search", "recommendation", "recommendation", "done"]
+        assert events[-1][1] == ITEMS
+
+@pytest.mark.asyncio
+async def test_disconnect_does_not_cancel_the_run(redis_client, top3_config, pipeline):
+    stream = stream_top3_recommendations("lamp", top3_config, redis_client)
+    assert (await stream.__anext__())[0] == "search"
+
+    # The client goes away while the LLM is still running
+    await stream.aclose()
+    pipeline["release"].set()
+    await asyncio.sleep(0.05)
+
+    assert pipeline["calls"] == 1
+    assert await get_fresh_recommendations(build_cache_key("lamp", top3_config)) == ITEMS
+
+@pytest.mark.asyncio
+async def test_stream_sends_results_computed_elsewhere(redis_client, top3_config, pipeline):
+    # Another worker holds the lock and publishes the result
+    cache_key = build_cache_key("lamp", top3_config)
+    await redis_client.set(f"lock:{cache_key}", "other-worker", ex=30)
+
+    async def other_worker():
+        await asyncio.sleep(0.05)
+        await store_recommendations(cache_key, ITEMS)
+        await redis_client.delete(f"lock:{cache_key}")
+
+    asyncio.create_task(other_worker())
+    events = await collect(stream_top3_recommendations("lamp", top3_config, redis_client))
+
+    assert pipeline["calls"] == 0
+    assert [event for event, _ in events] == ["recommendation", "recommendation", "done"]